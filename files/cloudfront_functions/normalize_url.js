@@ -0,0 +1,43 @@
+// Viewer request: canonical URI and query string so trivial variations share one cache entry.
+// CONFIG is filled in by RimCloudFrontStack, see DEFAULT_URL_NORMALIZATION.
+var CONFIG = __CONFIG__;
+
+function stripped(name) {
+    for (var i = 0; i < CONFIG.strip_query_params.length; i++) {
+        var pattern = CONFIG.strip_query_params[i];
+        if (pattern.charAt(pattern.length - 1) === '*' ? name.indexOf(pattern.slice(0, -1)) === 0 : name === pattern) {
+            return true;
+        }
+    }
+    return false;
+}
+
+function normalizeUri(uri) {
+    uri = uri.replace(/\/{2,}/g, '/');
+    if (CONFIG.lowercase_paths) {
+        uri = uri.toLowerCase();
+    }
+    // "/", "/index.html", "/docs/" and "/docs/index.html" all become the explicit index object
+    if (uri.charAt(uri.length - 1) === '/') {
+        uri += CONFIG.directory_index;
+    }
+    return uri;
+}
+
+function normalizeQuerystring(querystring) {
+    var names = Object.keys(querystring).filter(function (name) {
+        return !stripped(name.toLowerCase());
+    }).sort();
+    var result = {};
+    for (var i = 0; i < names.length; i++) {
+        result[names[i]] = querystring[names[i]];
+    }
+    return result;
+}
+
+function handler(event) {
+    var request = event.request;
+    request.uri = normalizeUri(request.uri);
+    request.querystring = normalizeQuerystring(request.querystring);
+    return request;
+}
@@ -0,0 +1,70 @@
+import json
+import os
+import posixpath
+import shlex
+from urllib.parse import unquote_plus
+
+ASG_NAME = os.environ.get('ASG_NAME')
+DOCROOT = os.environ.get('DOCROOT', '/var/www/html')
+KEYS_PER_COMMAND = 100
+# deployment state written by the incremental asset deployment, never content
+UNSYNCED_KEYS = {'.rim-manifest.json'}
+
+
+def change_set(records):
+    """Reduce S3 event records to the last operation per key, ordered by the S3 sequencer."""
+    changes = {}
+    for record in records:
+        key = unquote_plus(record['s3']['object']['key'])
+        sequencer = record['s3']['object'].get('sequencer', '')
+        operation = 'delete' if record['eventName'].startswith('ObjectRemoved') else 'put'
+        previous = changes.get(key)
+        # sequencers are hex strings that only compare correctly when padded to the same length
+        if previous is None or sequencer.rjust(32, '0') >= previous[1].rjust(32, '0'):
+            changes[key] = (operation, sequencer, record['s3']['bucket']['name'])
+    return {key: (operation, bucket) for key, (operation, sequencer, bucket) in changes.items()}
+
+
+def commands(changes, docroot=DOCROOT, region=None):
+    """Shell commands applying the change set to the docroot, keys escaping it and UNSYNCED_KEYS are skipped.
+
+    ``region`` pins the regional S3 endpoint, instances in isolated subnets only reach that one.
+    """
+    copy = 'aws s3 cp --region %s'%shlex.quote(region) if region else 'aws s3 cp'
+    result = []
+    for key, (operation, bucket) in sorted(changes.items()):
+        if key in UNSYNCED_KEYS:
+            continue
+        path = posixpath.normpath(posixpath.join(docroot, key))
+        if not path.startswith(docroot.rstrip('/')+'/'):
+            continue
+        if operation == 'delete':
+            result.append('rm -f %s'%shlex.quote(path))
+        else:
+            result.append('%s %s %s'%(copy, shlex.quote('s3://%s/%s'%(bucket, key)), shlex.quote(path)))
+    return result
+
+
+def s3_records(event):
+    for message in event['Records']:
+        body = json.loads(message['body'])
+        for record in body.get('Records', []):
+            if record.get('eventSource') == 'aws:s3':
+                yield record
+
+
+def handler(event, context):
+    # provided by the Lambda runtime, imported here so the change set logic has no AWS dependency
+    import boto3
+    ssm = boto3.client('ssm')
+    command_list = commands(change_set(s3_records(event)), region=os.environ.get('AWS_REGION'))
+    for start in range(0, len(command_list), KEYS_PER_COMMAND):
+        ssm.send_command(
+            DocumentName = 'AWS-RunShellScript',
+            Targets = [{'Key': 'tag:aws:autoscaling:groupName', 'Values': [ASG_NAME]}],
+            Parameters = {'commands': command_list[start:start+KEYS_PER_COMMAND]},
+            MaxConcurrency = '100%',
+            MaxErrors = '100%',
+            Comment = 'Incremental content sync'
+        )
+    return {'commands': len(command_list)}
@@ -0,0 +1,115 @@
+import json
+import mimetypes
+import os
+import time
+import zipfile
+
+MANIFEST_KEY = '.rim-manifest.json'
+VARIANT_SUFFIXES = ('.gz', '.br')
+# CloudFront allows 3000 paths in progress, beyond that one wildcard is cheaper anyway
+MAX_INVALIDATION_PATHS = int(os.environ.get('MAX_INVALIDATION_PATHS', '1000'))
+WORK_DIR = os.environ.get('WORK_DIR', '/tmp')
+
+
+def diff(old, new):
+    """Keys to upload and keys to delete, old keys of unpruned entries are kept."""
+    changed = sorted(key for key, entry in new.items() if old.get(key) != entry)
+    removed = sorted(key for key, entry in old.items() if key not in new and entry.get('prune', True))
+    return changed, removed
+
+
+def invalidation_paths(changed, removed, default_root_object='index.html'):
+    """Edge paths whose cached responses are stale, variants map to the URL they are served for.
+
+    Keys that are new to the bucket are included too, CloudFront caches the 404
+    answered for them before. A directory index also invalidates the directory
+    URL, e.g. docs/index.html invalidates /docs/ as well.
+    """
+    paths = set()
+    for key in changed+removed:
+        if key.endswith(VARIANT_SUFFIXES):
+            key = key[:-3]
+        paths.add('/'+key)
+        if key == default_root_object or key.endswith('/'+default_root_object):
+            paths.add('/'+key[:-len(default_root_object)])
+    if len(paths) > MAX_INVALIDATION_PATHS:
+        return ['/*']
+    return sorted(paths)
+
+
+def put_args(entry, key):
+    args = {
+        'CacheControl': entry['cache_control'],
+        'ContentType': entry.get('content_type') or mimetypes.guess_type(key)[0] or 'application/octet-stream',
+    }
+    if entry.get('content_encoding'):
+        args['ContentEncoding'] = entry['content_encoding']
+    return args
+
+
+def read_manifest(s3, bucket):
+    try:
+        return json.loads(s3.get_object(Bucket=bucket, Key=MANIFEST_KEY)['Body'].read())
+    except s3.exceptions.NoSuchKey:
+        return {}
+
+
+def distribution_id(props):
+    import boto3
+    if props.get('DistributionId'):
+        return props['DistributionId']
+    if props.get('DistributionIdParameter'):
+        ssm = boto3.client('ssm', region_name=props.get('DistributionIdParameterRegion'))
+        try:
+            return ssm.get_parameter(Name=props['DistributionIdParameter'])['Parameter']['Value']
+        except ssm.exceptions.ParameterNotFound:
+            # the distribution is not deployed yet, so nothing is cached either
+            return None
+    return None
+
+
+def deploy(props):
+    # provided by the Lambda runtime, imported here so the diff logic has no AWS dependency
+    import boto3
+    s3 = boto3.client('s3')
+    bucket = props['DestinationBucket']
+    archive = os.path.join(WORK_DIR, 'assets.zip')
+    s3.download_file(props['SourceBucket'], props['SourceKey'], archive)
+
+    with zipfile.ZipFile(archive) as assets:
+        new = json.loads(assets.read(MANIFEST_KEY))
+        old = read_manifest(s3, bucket)
+        changed, removed = diff(old, new)
+        for key in changed:
+            with assets.open(key) as body:
+                s3.upload_fileobj(body, bucket, key, ExtraArgs=put_args(new[key], key))
+    for start in range(0, len(removed), 1000):
+        s3.delete_objects(Bucket=bucket, Delete={
+            'Objects': [{'Key': key} for key in removed[start:start+1000]],
+            'Quiet': True
+        })
+    os.remove(archive)
+    # written last, a failed deployment is retried against the previous manifest
+    s3.put_object(Bucket=bucket, Key=MANIFEST_KEY, Body=json.dumps(new, sort_keys=True).encode('utf-8'), ContentType='application/json')
+
+    paths = invalidation_paths(changed, removed)
+    distribution = distribution_id(props)
+    if paths and distribution:
+        boto3.client('cloudfront').create_invalidation(
+            DistributionId = distribution,
+            InvalidationBatch = {
+                'Paths': {'Quantity': len(paths), 'Items': paths},
+                'CallerReference': '%s-%d'%(props['SourceKey'], time.time())
+            }
+        )
+    return {'Changed': len(changed), 'Removed': len(removed), 'Invalidated': len(paths) if distribution else 0}
+
+
+def handler(event, context):
+    props = event['ResourceProperties']
+    if event['RequestType'] == 'Delete':
+        # like BucketDeployment, the content outlives the deployment
+        return {'PhysicalResourceId': event['PhysicalResourceId']}
+    result = deploy(props)
+    print(json.dumps(result))
+    return {'PhysicalResourceId': props['DestinationBucket'], 'Data': result}
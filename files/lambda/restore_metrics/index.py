@@ -0,0 +1,34 @@
+import os
+
+NAMESPACE = os.environ.get('METRIC_NAMESPACE', 'Rim/Backup')
+
+
+def restore_duration(job):
+    """Seconds between the creation and the completion of a DescribeRestoreJob response."""
+    return (job['CompletionDate']-job['CreationDate']).total_seconds()
+
+
+def metric_data(job):
+    dimensions = [{'Name': 'ResourceType', 'Value': job.get('ResourceType', 'Unknown')}]
+    return [{
+        'MetricName': 'RestoreDuration',
+        'Dimensions': dimensions,
+        'Value': restore_duration(job),
+        'Unit': 'Seconds',
+    }, {
+        'MetricName': 'RestoredBytes',
+        'Dimensions': dimensions,
+        'Value': job.get('BackupSizeInBytes', 0),
+        'Unit': 'Bytes',
+    }]
+
+
+def handler(event, context):
+    # provided by the Lambda runtime, imported here so the metric logic has no AWS dependency
+    import boto3
+    job = boto3.client('backup').describe_restore_job(RestoreJobId=event['detail']['restoreJobId'])
+    if job['Status'] != 'COMPLETED':
+        return {'published': 0}
+    data = metric_data(job)
+    boto3.client('cloudwatch').put_metric_data(Namespace=NAMESPACE, MetricData=data)
+    return {'published': len(data)}
@@ -0,0 +1,242 @@
+from jinja2 import Template
+
+# vCPUs and memory (MiB) of the instance types the web fleet can run on
+INSTANCE_SIZES = {
+    't3a.nano': (2, 512), 't3a.micro': (2, 1024), 't3a.small': (2, 2048), 't3a.medium': (2, 4096), 't3a.large': (2, 8192),
+    't3.nano': (2, 512), 't3.micro': (2, 1024), 't3.small': (2, 2048), 't3.medium': (2, 4096), 't3.large': (2, 8192),
+    't4g.nano': (2, 512), 't4g.micro': (2, 1024), 't4g.small': (2, 2048), 't4g.medium': (2, 4096), 't4g.large': (2, 8192),
+    'c7g.medium': (1, 2048), 'c7g.large': (2, 4096), 'c7g.xlarge': (4, 8192),
+    'c6g.medium': (1, 2048), 'c6g.large': (2, 4096), 'c6g.xlarge': (4, 8192),
+}
+
+# memory kept for the OS, the SSM agent and awscli, and the footprint of one event MPM child
+RESERVED_MIB = 200
+THREADS_PER_CHILD = 25
+MIB_PER_CHILD = 30
+
+# bucket keys that are deployment state rather than content, see rim_stacks.asset_build.MANIFEST_KEY
+SYNC_EXCLUDES = ['.rim-manifest.json']
+
+# on disk, so the health check answers without touching the RAM docroot
+HEALTH_CHECK_DIR = '/var/www/rim-health'
+
+# on disk content baked into the golden AMI, it seeds the docroot before the sync from the bucket
+CONTENT_CACHE_DIR = '/var/cache/rim-content'
+
+# hex digits of the <name>.<hash>.<extension> asset names rim_stacks.asset_build writes,
+# only those names change with their content and are cached as immutable
+CONTENT_HASH_LENGTH = 10
+
+# extensions rim_stacks.asset_build precompresses, with the type their variants are served as
+PRECOMPRESSED_TYPES = {
+    'html': 'text/html', 'css': 'text/css', 'js': 'application/javascript', 'svg': 'image/svg+xml',
+    'json': 'application/json', 'txt': 'text/plain', 'xml': 'application/xml',
+}
+
+APACHE_CONF = Template("""# Generated by rim_stacks.apache_config for {{ instance_type_name }}
+<IfModule mpm_event_module>
+    ServerLimit             {{ server_limit }}
+    StartServers            {{ start_servers }}
+    ThreadsPerChild         {{ threads_per_child }}
+    ThreadLimit             {{ threads_per_child }}
+    MinSpareThreads         {{ threads_per_child }}
+    MaxSpareThreads         {{ max_spare_threads }}
+    MaxRequestWorkers       {{ max_request_workers }}
+    MaxConnectionsPerChild  0
+</IfModule>
+
+KeepAlive On
+MaxKeepAliveRequests {{ max_keepalive_requests }}
+KeepAliveTimeout {{ keepalive_timeout }}
+
+<IfModule mod_deflate.c>
+    AddOutputFilterByType DEFLATE text/html text/plain text/css text/xml application/javascript application/json image/svg+xml
+</IfModule>
+
+<IfModule mod_expires.c>
+    ExpiresActive On
+    ExpiresDefault "access plus {{ html_max_age }} seconds"
+</IfModule>
+
+<IfModule mod_headers.c>
+    Header set Cache-Control "public, max-age={{ html_max_age }}"
+    <FilesMatch "\\.[0-9a-f]{{ '{' ~ content_hash_length ~ '}' }}\\.({{ asset_extensions | join('|') }})(\\.gz|\\.br)?$">
+        Header set Cache-Control "public, max-age={{ asset_max_age }}, immutable"
+    </FilesMatch>
+</IfModule>
+
+<Directory {{ docroot }}>
+    Options -Indexes
+    AllowOverride None
+    # serve the .br/.gz variants rim_stacks.asset_build writes next to each text file
+    <IfModule mod_rewrite.c>
+        RewriteEngine On
+{% for suffix, encoding in [('br', 'br'), ('gz', 'gzip')] %}        RewriteCond "%{HTTP:Accept-Encoding}" "{{ encoding }}"
+        RewriteCond "%{REQUEST_FILENAME}.{{ suffix }}" -f
+        RewriteRule "^(.+)\\.({{ precompressed_types | join('|') }})$" "$1.$2.{{ suffix }}" [QSA]
+{% endfor %}{% for extension, content_type in precompressed_types.items() %}        RewriteRule "\\.{{ extension }}\\.(br|gz)$" "-" [T={{ content_type }},E=no-gzip:1]
+{% endfor %}    </IfModule>
+</Directory>
+
+<IfModule mod_headers.c>
+    <FilesMatch "\\.br$">
+        Header set Content-Encoding br
+        Header append Vary Accept-Encoding
+    </FilesMatch>
+    <FilesMatch "\\.gz$">
+        Header set Content-Encoding gzip
+        Header append Vary Accept-Encoding
+    </FilesMatch>
+</IfModule>
+
+# load balancer health check, a static file outside the docroot
+Alias "{{ health_check_path }}" "{{ health_check_dir }}/healthz"
+<Directory {{ health_check_dir }}>
+    Require all granted
+    ForceType text/plain
+    <IfModule mod_headers.c>
+        Header always set Cache-Control "no-store"
+    </IfModule>
+    <IfModule mod_rewrite.c>
+        RewriteEngine On
+        # out of rotation until the docroot has been filled from the bucket
+        RewriteCond "{{ docroot }}/index.html" !-f
+        RewriteRule "^" "-" [R=503,L]
+    </IfModule>
+</Directory>
+
+EnableSendfile On
+FileETag MTime Size
+""", keep_trailing_newline=True)
+
+DOCROOT_UNIT = Template("""[Unit]
+After=network-online.target
+Wants=network-online.target
+RequiresMountsFor={{ docroot }}
+
+[Service]
+# cp -p keeps the bake times, so the sync only downloads what changed since the bake
+ExecStartPre=-/bin/sh -c 'test -d {{ content_cache_dir }} && cp -rpu {{ content_cache_dir }}/. {{ docroot }}/'
+{% if region %}# the S3 gateway endpoint only serves the regional S3 endpoint
+Environment=AWS_DEFAULT_REGION={{ region }}
+{% endif %}ExecStartPre=-/usr/bin/aws s3 sync --only-show-errors{% for exclude in excludes %} --exclude '{{ exclude }}'{% endfor %} s3://{{ bucket_name }}/ {{ docroot }}/
+""", keep_trailing_newline=True)
+
+# Completes the launch lifecycle hook once the health check answers. It runs on every
+# move the group makes (launch into the warm pool, resume, launch into service), as
+# cloud-init does not run the user data again on an instance resumed from the pool.
+LIFECYCLE_HOOK_SCRIPT = Template("""#!/bin/bash
+imds() {
+    token=$(curl -sf -X PUT -H 'X-aws-ec2-metadata-token-ttl-seconds: 60' http://169.254.169.254/latest/api/token)
+    curl -sf -H "X-aws-ec2-metadata-token: $token" http://169.254.169.254/latest/meta-data/$1
+}
+{% if region %}export AWS_DEFAULT_REGION={{ region }}
+{% endif %}completed=
+while true; do
+    state=$(imds autoscaling/target-lifecycle-state)
+    if [ -n "$state" ] && [ "$state" != "$completed" ] && curl -sf -o /dev/null http://localhost{{ health_check_path }}; then
+        instance_id=$(imds instance-id)
+        group=$(aws autoscaling describe-auto-scaling-instances --instance-ids $instance_id --query 'AutoScalingInstances[0].AutoScalingGroupName' --output text)
+        # fails when no action is pending, e.g. after a reboot in service
+        aws autoscaling complete-lifecycle-action --lifecycle-hook-name {{ hook_name }} --auto-scaling-group-name $group --instance-id $instance_id --lifecycle-action-result CONTINUE
+        completed=$state
+    fi
+    sleep 5
+done
+""", keep_trailing_newline=True)
+
+USER_DATA = Template("""{% if docroot_tmpfs_mib %}grep -q ' {{ docroot }} tmpfs ' /etc/fstab || echo 'tmpfs {{ docroot }} tmpfs size={{ docroot_tmpfs_mib }}m,mode=0755 0 0' >> /etc/fstab
+mountpoint -q {{ docroot }} || mount {{ docroot }}
+{% endif %}mkdir -p {{ health_check_dir }}
+echo ok > {{ health_check_dir }}/healthz
+mkdir -p /etc/systemd/system/apache2.service.d
+cat > /etc/systemd/system/apache2.service.d/rim-docroot.conf <<'RIM_EOF'
+{{ docroot_unit }}RIM_EOF
+cat > /etc/apache2/conf-available/rim-tuning.conf <<'RIM_EOF'
+{{ apache_conf }}RIM_EOF
+a2dismod -q mpm_prefork || true
+a2enmod -q mpm_event deflate expires headers rewrite
+a2enconf -q rim-tuning
+systemctl daemon-reload
+{% if lifecycle_hook_script %}cat > /usr/local/bin/rim-lifecycle-hook <<'RIM_EOF'
+{{ lifecycle_hook_script }}RIM_EOF
+chmod 755 /usr/local/bin/rim-lifecycle-hook
+cat > /etc/systemd/system/rim-lifecycle-hook.service <<'RIM_EOF'
+[Unit]
+After=apache2.service
+
+[Service]
+ExecStart=/usr/local/bin/rim-lifecycle-hook
+Restart=always
+
+[Install]
+WantedBy=multi-user.target
+RIM_EOF
+systemctl enable --now rim-lifecycle-hook
+{% endif %}""", keep_trailing_newline=True)
+
+
+def mpm_settings(instance_type_name: str, docroot_tmpfs_mib: int = 64) -> dict:
+    """Event MPM sizing that keeps every worker process in RAM next to the tmpfs docroot."""
+    if instance_type_name not in INSTANCE_SIZES:
+        raise ValueError('no sizing known for instance type %s'%instance_type_name)
+    vcpus, memory_mib = INSTANCE_SIZES[instance_type_name]
+    server_limit = max(2, min(16*vcpus, (memory_mib-RESERVED_MIB-docroot_tmpfs_mib)//MIB_PER_CHILD))
+    return {
+        'server_limit': server_limit,
+        'start_servers': max(2, vcpus),
+        'threads_per_child': THREADS_PER_CHILD,
+        'max_spare_threads': THREADS_PER_CHILD*max(3, vcpus*2),
+        'max_request_workers': server_limit*THREADS_PER_CHILD,
+    }
+
+
+def smallest_instance_type(instance_type_names: list) -> str:
+    """The type with the least memory, the config has to fit on every instance of a mixed fleet."""
+    for instance_type_name in instance_type_names:
+        mpm_settings(instance_type_name)
+    return min(instance_type_names, key=lambda instance_type_name: INSTANCE_SIZES[instance_type_name][1])
+
+
+def render_apache_config(instance_type_name: str, html_max_age: int = 60, asset_max_age: int = 31536000, keepalive_timeout: int = 80, max_keepalive_requests: int = 1000, docroot: str = '/var/www/html', docroot_tmpfs_mib: int = 64, asset_extensions: list = None, health_check_path: str = '/healthz') -> str:
+    """Render the apache tuning config for ``instance_type_name``.
+
+    ``keepalive_timeout`` has to stay above the ALB idle timeout, otherwise apache
+    closes connections the load balancer is about to reuse. ``asset_max_age`` and
+    ``immutable`` only apply to content hashed asset names, other files keep
+    ``html_max_age``. ``health_check_path`` answers 200 once the docroot holds
+    an index.html, 503 before.
+    """
+    return APACHE_CONF.render(
+        instance_type_name = instance_type_name,
+        html_max_age = html_max_age,
+        asset_max_age = asset_max_age,
+        keepalive_timeout = keepalive_timeout,
+        max_keepalive_requests = max_keepalive_requests,
+        docroot = docroot,
+        asset_extensions = asset_extensions or ['css', 'js', 'png', 'jpe?g', 'gif', 'svg', 'ico', 'woff2?'],
+        content_hash_length = CONTENT_HASH_LENGTH,
+        precompressed_types = PRECOMPRESSED_TYPES,
+        health_check_path = health_check_path,
+        health_check_dir = HEALTH_CHECK_DIR,
+        **mpm_settings(instance_type_name, docroot_tmpfs_mib)
+    )
+
+
+def render_user_data(instance_type_name: str, bucket_name: str, docroot: str = '/var/www/html', docroot_tmpfs_mib: int = 64, region: str = None, health_check_path: str = '/healthz', lifecycle_hook_name: str = None, **kwargs) -> str:
+    """Shell commands installing the apache config and the RAM-backed docroot.
+
+    The docroot is refilled whenever apache starts, so instances resumed from a
+    warm pool come back with their content: first from the golden AMI content
+    cache, if any, then with a sync of what changed in the bucket since. With
+    ``lifecycle_hook_name`` a service completes that launch lifecycle hook once
+    ``health_check_path`` answers.
+    """
+    return USER_DATA.render(
+        docroot = docroot,
+        docroot_tmpfs_mib = docroot_tmpfs_mib,
+        health_check_dir = HEALTH_CHECK_DIR,
+        docroot_unit = DOCROOT_UNIT.render(docroot=docroot, bucket_name=bucket_name, region=region, excludes=SYNC_EXCLUDES, content_cache_dir=CONTENT_CACHE_DIR),
+        apache_conf = render_apache_config(instance_type_name, docroot=docroot, docroot_tmpfs_mib=docroot_tmpfs_mib, health_check_path=health_check_path, **kwargs),
+        lifecycle_hook_script = LIFECYCLE_HOOK_SCRIPT.render(hook_name=lifecycle_hook_name, region=region, health_check_path=health_check_path) if lifecycle_hook_name else None
+    )
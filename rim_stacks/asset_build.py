@@ -0,0 +1,292 @@
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+
+from aws_cdk import (
+    CustomResource,
+    Duration,
+    Size,
+    Stack,
+    Stage,
+    aws_ec2 as ec2,
+    aws_iam as iam,
+    aws_lambda as lambda_,
+    aws_s3 as s3,
+    aws_s3_assets as s3_assets,
+    aws_s3_deployment as s3_deployment,
+    custom_resources as cr,
+)
+from constructs import Construct
+
+from rim_stacks.apache_config import CONTENT_HASH_LENGTH, PRECOMPRESSED_TYPES
+from rim_stacks.cloudfront_metrics import CLOUDFRONT_METRICS_REGION
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# assets only ever referenced from HTML or CSS, safe to rename
+HASHED_EXTENSIONS = ('.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.avif', '.woff', '.woff2')
+COMPRESSED_EXTENSIONS = tuple('.'+extension for extension in PRECOMPRESSED_TYPES)
+ENCODINGS = {'.gz': 'gzip', '.br': 'br'}
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# read by files/lambda/incremental_deploy, never uploaded as content, kept
+# out of the docroot by apache_config.SYNC_EXCLUDES and content sync
+MANIFEST_KEY = '.rim-manifest.json'
+# "AssetDeployment" context, see RimAssetDeployment
+DEFAULT_ASSET_DEPLOYMENT = {
+    "incremental": False,
+    "memory_limit_mib": 128,
+    "ephemeral_storage_mib": 512,
+    "use_efs": False
+}
+# CloudFront does not compress smaller objects either
+MIN_COMPRESSED_BYTES = 1000
+
+REFERENCE = re.compile(r'''((?:href|src)\s*=\s*["']|url\(\s*["']?)([^"')\s]+)''')
+
+
+def content_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()[:CONTENT_HASH_LENGTH]
+
+
+def hashed_name(path: str, body: bytes) -> str:
+    root, extension = posixpath.splitext(path)
+    return '%s.%s%s'%(root, content_hash(body), extension)
+
+
+def rewrite_references(body: bytes, path: str, renamed: dict) -> bytes:
+    """Point href, src and url() references of ``path`` at the renamed assets."""
+    directory = posixpath.dirname(path)
+
+    def replace(match):
+        prefix, reference = match.groups()
+        if reference.startswith(('#', '//', 'data:')) or ':' in reference.split('/')[0]:
+            return match.group(0)
+        target = reference.split('?')[0].split('#')[0]
+        resolved = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join(directory, target))
+        if resolved not in renamed:
+            return match.group(0)
+        return prefix+posixpath.join(posixpath.dirname(target), posixpath.basename(renamed[resolved]))+reference[len(target):]
+
+    return REFERENCE.sub(replace, body.decode('utf-8')).encode('utf-8')
+
+
+def compressed_variants(body: bytes) -> dict:
+    """gzip and Brotli bodies of ``body``, only those actually smaller than it."""
+    variants = {'.gz': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(body, quality=11)
+    return {suffix: variant for suffix, variant in variants.items() if len(variant) < len(body)}
+
+
+def build_assets(source_dir: str, out_dir: str, precompress: bool = True) -> dict:
+    """Copies ``source_dir`` to ``out_dir`` with hashed asset names and precompressed variants.
+
+    CSS is renamed after its own references are rewritten, so its hash covers the
+    images it points at. Returns the source to output path of every renamed file.
+    """
+    files = {}
+    for directory, _, file_names in os.walk(source_dir):
+        for file_name in file_names:
+            full_name = os.path.join(directory, file_name)
+            with open(full_name, 'rb') as source:
+                files[os.path.relpath(full_name, source_dir).replace(os.sep, '/')] = source.read()
+
+    renamed = {}
+    for path in sorted(files, key=lambda path: path.endswith('.css')):
+        if path.endswith('.css'):
+            files[path] = rewrite_references(files[path], path, renamed)
+        if path.endswith(HASHED_EXTENSIONS):
+            renamed[path] = hashed_name(path, files[path])
+    for path in files:
+        if path.endswith('.html'):
+            files[path] = rewrite_references(files[path], path, renamed)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    for path, body in files.items():
+        outputs = {renamed.get(path, path): body}
+        if precompress and path.endswith(COMPRESSED_EXTENSIONS) and len(body) >= MIN_COMPRESSED_BYTES:
+            outputs.update({renamed.get(path, path)+suffix: variant for suffix, variant in compressed_variants(body).items()})
+        for output_path, output_body in outputs.items():
+            full_name = os.path.join(out_dir, output_path)
+            os.makedirs(os.path.dirname(full_name), exist_ok=True)
+            with open(full_name, 'wb') as output:
+                output.write(output_body)
+    return renamed
+
+
+def build_dir(scope: Construct, source_dir: str) -> str:
+    """Build output of ``source_dir`` for ``scope``, inside the app's cloud assembly directory.
+
+    Keyed on the source path and the construct path, so parallel synths and
+    sources sharing a directory name never build into the same place.
+    """
+    key = hashlib.sha256((os.path.abspath(source_dir)+'\0'+scope.node.path).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(Stage.of(scope).outdir, 'rim-assets', '%s-%s'%(os.path.basename(os.path.normpath(source_dir)), key))
+
+
+def file_metadata(path: str, html_max_age: int = 60) -> tuple:
+    """Include pattern, cache control, content type and content encoding of built file ``path``."""
+    original, suffix = posixpath.splitext(path)
+    encoding = ENCODINGS.get(suffix)
+    if encoding is None:
+        original, suffix = path, ''
+    extension = posixpath.splitext(original)[1]
+    return (
+        '*'+extension+suffix if extension else path,
+        IMMUTABLE_CACHE_CONTROL if extension in HASHED_EXTENSIONS else 'public, max-age=%d'%html_max_age,
+        PRECOMPRESSED_TYPES[extension[1:]] if encoding else None,
+        encoding
+    )
+
+
+def built_files(out_dir: str) -> list:
+    return sorted(
+        os.path.relpath(os.path.join(directory, file_name), out_dir).replace(os.sep, '/')
+        for directory, _, file_names in os.walk(out_dir) for file_name in file_names
+        if file_name != MANIFEST_KEY
+    )
+
+
+def deployment_groups(out_dir: str, html_max_age: int = 60) -> dict:
+    """Include pattern -> (cache control, content type, content encoding) of the built files."""
+    groups = {}
+    for path in built_files(out_dir):
+        pattern, cache_control, content_type, content_encoding = file_metadata(path, html_max_age)
+        groups[pattern] = (cache_control, content_type, content_encoding)
+    return dict(sorted(groups.items()))
+
+
+def write_manifest(out_dir: str, html_max_age: int = 60) -> dict:
+    """Writes the content hash and metadata of every built file, the incremental deployment diffs it."""
+    manifest = {}
+    for path in built_files(out_dir):
+        with open(os.path.join(out_dir, path), 'rb') as built:
+            body = built.read()
+        _, cache_control, content_type, content_encoding = file_metadata(path, html_max_age)
+        manifest[path] = {
+            'sha256': hashlib.sha256(body).hexdigest(),
+            'cache_control': cache_control,
+            'content_type': content_type,
+            'content_encoding': content_encoding,
+            'prune': cache_control != IMMUTABLE_CACHE_CONTROL,
+        }
+    with open(os.path.join(out_dir, MANIFEST_KEY), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+    return manifest
+
+
+def hide_manifest(bucket: s3.IBucket) -> None:
+    """Keeps the deployment manifest of ``bucket`` away from the CloudFront S3 origin.
+
+    Only CloudFront is denied, AWS Backup, restore testing and replication still
+    copy the manifest along with the content.
+    """
+    bucket.add_to_resource_policy(iam.PolicyStatement(
+        effect = iam.Effect.DENY,
+        actions = ['s3:GetObject'],
+        resources = [bucket.arn_for_objects(MANIFEST_KEY)],
+        principals = [iam.ServicePrincipal('cloudfront.amazonaws.com')]
+    ))
+
+
+class RimAssetDeployment(Construct):
+    """Builds ``source_dir`` and uploads it with per file type Cache-Control and Content-Encoding.
+
+    By default each file type gets its own BucketDeployment of the same asset,
+    filtered with include patterns. With ``incremental`` a single function diffs
+    the build manifest against the one left in the bucket by the previous
+    deployment, uploads and deletes only what changed and invalidates exactly
+    those paths on the distribution given by ``distribution_id`` or by the
+    ``distribution_id_parameter_name`` SSM parameter in us-east-1.
+
+    Hashed assets are never pruned, so pages cached before a release keep finding
+    the assets they reference. Only the Apache rewrite rules serve the .br/.gz
+    variants, buckets read by the CloudFront S3 origin alone are built with
+    ``precompress`` off.
+    """
+
+    def __init__(self, scope: Construct, construct_id: str, owner: str, bucket: s3.IBucket, source_dir: str, html_max_age: int = 60,
+            incremental: bool = False, memory_limit_mib: int = 128, ephemeral_storage_mib: int = 512, use_efs: bool = False, vpc: ec2.IVpc = None,
+            distribution_id: str = None, distribution_id_parameter_name: str = None, precompress: bool = True, **kwargs) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        if use_efs and (incremental or vpc is None):
+            raise ValueError('use_efs needs a vpc and the BucketDeployment mode, the incremental mode sizes ephemeral_storage_mib instead')
+
+        out_dir = self.out_dir = build_dir(self, source_dir)
+        build_assets(source_dir, out_dir, precompress)
+
+        self.deployments = []
+        if incremental:
+            self._incremental_deployment(owner, bucket, out_dir, html_max_age, memory_limit_mib, ephemeral_storage_mib, distribution_id, distribution_id_parameter_name)
+            return
+
+        source = s3_deployment.Source.asset(out_dir)
+        for pattern, (cache_control, content_type, content_encoding) in deployment_groups(out_dir, html_max_age).items():
+            self.deployments.append(s3_deployment.BucketDeployment(self, owner+'-assets-'+pattern,
+                destination_bucket = bucket,
+                sources = [source],
+                exclude = ['*'],
+                include = [pattern],
+                prune = cache_control != IMMUTABLE_CACHE_CONTROL,
+                cache_control = [s3_deployment.CacheControl.from_string(cache_control)],
+                content_type = content_type,
+                content_encoding = content_encoding,
+                memory_limit = memory_limit_mib,
+                ephemeral_storage_size = Size.mebibytes(ephemeral_storage_mib),
+                use_efs = use_efs or None,
+                vpc = vpc if use_efs else None
+            ))
+
+    def _incremental_deployment(self, owner: str, bucket: s3.IBucket, out_dir: str, html_max_age: int, memory_limit_mib: int, ephemeral_storage_mib: int, distribution_id: str, distribution_id_parameter_name: str) -> None:
+        stack = Stack.of(self)
+        write_manifest(out_dir, html_max_age)
+        asset = s3_assets.Asset(self, owner+'-assets',
+            path = out_dir
+        )
+
+        function = lambda_.Function(self, owner+'-incremental-deploy-function',
+            runtime = lambda_.Runtime.PYTHON_3_9,
+            handler = 'index.handler',
+            code = lambda_.Code.from_asset('files/lambda/incremental_deploy'),
+            timeout = Duration.minutes(15),
+            memory_size = memory_limit_mib,
+            ephemeral_storage_size = Size.mebibytes(ephemeral_storage_mib)
+        )
+        asset.grant_read(function)
+        bucket.grant_read_write(function)
+        bucket.grant_delete(function)
+        hide_manifest(bucket)
+        function.add_to_role_policy(iam.PolicyStatement(
+            actions = ['cloudfront:CreateInvalidation'],
+            resources = [stack.format_arn(service='cloudfront', region='', resource='distribution', resource_name=distribution_id or '*')]
+        ))
+        if distribution_id_parameter_name:
+            function.add_to_role_policy(iam.PolicyStatement(
+                actions = ['ssm:GetParameter'],
+                resources = [stack.format_arn(service='ssm', region=CLOUDFRONT_METRICS_REGION, resource='parameter', resource_name=distribution_id_parameter_name.lstrip('/'))]
+            ))
+
+        provider = cr.Provider(self, owner+'-incremental-deploy-provider',
+            on_event_handler = function
+        )
+
+        self.deployments.append(CustomResource(self, owner+'-incremental-deployment',
+            service_token = provider.service_token,
+            resource_type = 'Custom::RimIncrementalDeployment',
+            properties = {
+                'SourceBucket': asset.s3_bucket_name,
+                'SourceKey': asset.s3_object_key,
+                'DestinationBucket': bucket.bucket_name,
+                'DistributionId': distribution_id or '',
+                'DistributionIdParameter': distribution_id_parameter_name or '',
+                'DistributionIdParameterRegion': CLOUDFRONT_METRICS_REGION,
+            }
+        ))
@@ -1,4 +1,7 @@
+import re
+
 from aws_cdk import (
+    CfnResource,
     Duration,
     Stack,
     aws_ec2 as ec2,    
@@ -7,14 +10,52 @@ from aws_cdk import (
     RemovalPolicy,
     aws_iam as iam,   
     aws_events as events,      
+    aws_events_targets as events_targets,
+    aws_lambda as lambda_,
+    aws_sns as sns,
+    aws_cloudwatch as cloudwatch,
+    aws_cloudwatch_actions as cloudwatch_actions,
 )
 from constructs import Construct
 
+# Overridden window by window and key by key with the "BackupWindows" context, times are UTC.
+# AWS Backup needs the completion window to end at least an hour after the start window.
+DEFAULT_BACKUP_WINDOWS = {
+    "ec2": {"hour": "4", "minute": "10", "start_window_hours": 1, "completion_window_hours": 4},
+    "s3": {"hour": "5", "minute": "0", "start_window_hours": 1, "completion_window_hours": 4},
+    "restore_testing": {"week_day": "SUN", "hour": "2", "minute": "30", "start_window_hours": 1}
+}
+
+# Overridden key by key with the "RestoreTesting" context. The restore time objectives are
+# per AWS Backup resource type and alarm on the RestoreDuration metric.
+DEFAULT_RESTORE_TESTING = {
+    "enabled": True,
+    "selection_window_days": 7,
+    "validation_window_hours": 1,
+    "restore_time_objective_minutes": {"EC2": 30, "S3": 60}
+}
+
+RESTORE_METRICS_NAMESPACE = 'Rim/Backup'
+
+def backup_windows(overrides: dict = None) -> dict:
+    windows = {name: {**window, **((overrides or {}).get(name) or {})} for name, window in DEFAULT_BACKUP_WINDOWS.items()}
+    for name, window in windows.items():
+        if 'completion_window_hours' in window and window['completion_window_hours'] < window['start_window_hours']+1:
+            raise ValueError('%s backup completion window has to end at least an hour after the start window'%name)
+    return windows
+
+def restore_testing_name(owner: str) -> str:
+    """Restore testing plan and selection names only allow letters, digits and underscores."""
+    return re.sub(r'[^A-Za-z0-9_]', '_', owner)+'_restore_testing'
+
 class RimBackupStack(Stack):
 
-    def __init__(self, scope: Construct, construct_id: str, owner: str, bastion_host: ec2.Instance, bucket: s3.Bucket,  **kwargs) -> None:
+    def __init__(self, scope: Construct, construct_id: str, owner: str, bastion_host: ec2.Instance, bucket: s3.Bucket, email: str = None, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        windows = backup_windows(self.node.try_get_context("BackupWindows"))
+        restore_testing = {**DEFAULT_RESTORE_TESTING, **(self.node.try_get_context("RestoreTesting") or {})}
+
         backup_vault = backup.BackupVault(self, owner+'-backup-vault',
             backup_vault_name = owner+'-backup-vault',
             removal_policy = RemovalPolicy.DESTROY,
@@ -59,11 +100,11 @@ class RimBackupStack(Stack):
                 backup.BackupPlanRule(
                     rule_name = owner+'-backup-rule01',
                     schedule_expression = events.Schedule.cron(
-                        hour = '4',
-                        minute = '10'
+                        hour = windows['ec2']['hour'],
+                        minute = windows['ec2']['minute']
                     ),                    
-                    start_window = Duration.hours(1),
-                    completion_window = Duration.hours(4),
+                    start_window = Duration.hours(windows['ec2']['start_window_hours']),
+                    completion_window = Duration.hours(windows['ec2']['completion_window_hours']),
                     move_to_cold_storage_after = Duration.days(30),
                     delete_after = Duration.days(120),
                 )
@@ -84,8 +125,13 @@ class RimBackupStack(Stack):
             backup_plan_rules = [
                 backup.BackupPlanRule(
                     rule_name = owner+'-s3-backup-rule01',
-                    start_window = Duration.hours(1),
-                    completion_window = Duration.hours(4),
+                    # the snapshot schedule of the continuous backup, 05:00 UTC is the AWS Backup default
+                    schedule_expression = events.Schedule.cron(
+                        hour = windows['s3']['hour'],
+                        minute = windows['s3']['minute']
+                    ),
+                    start_window = Duration.hours(windows['s3']['start_window_hours']),
+                    completion_window = Duration.hours(windows['s3']['completion_window_hours']),
                     delete_after = Duration.days(30),
                     enable_continuous_backup = True,
                 )
@@ -98,5 +144,102 @@ class RimBackupStack(Stack):
             resources = [
                 backup.BackupResource.from_arn(bucket.bucket_arn)            
             ]            
-        )             
+        )
+
+        if not restore_testing['enabled']:
+            return
+
+        # the aws_backup module has no restore testing constructs yet
+        restore_testing_plan = CfnResource(self, owner+'-restore-testing-plan',
+            type = 'AWS::Backup::RestoreTestingPlan',
+            properties = {
+                'RestoreTestingPlanName': restore_testing_name(owner),
+                'ScheduleExpression': 'cron(%s %s ? * %s *)'%(
+                    windows['restore_testing']['minute'], windows['restore_testing']['hour'], windows['restore_testing']['week_day']),
+                'StartWindowHours': windows['restore_testing']['start_window_hours'],
+                'RecoveryPointSelection': {
+                    'Algorithm': 'LATEST_WITHIN_WINDOW',
+                    'IncludeVaults': [backup_vault.backup_vault_arn],
+                    'RecoveryPointTypes': ['CONTINUOUS', 'SNAPSHOT'],
+                    'SelectionWindowDays': restore_testing['selection_window_days']
+                }
+            }
+        )
 
+        for resource_type, protected_resource_arn in (
+            ('EC2', self.format_arn(service='ec2', resource='instance', resource_name=bastion_host.instance_id)),
+            ('S3', bucket.bucket_arn),
+        ):
+            restore_testing_selection = CfnResource(self, owner+'-restore-testing-selection-'+resource_type.lower(),
+                type = 'AWS::Backup::RestoreTestingSelection',
+                properties = {
+                    'RestoreTestingPlanName': restore_testing_name(owner),
+                    'RestoreTestingSelectionName': restore_testing_name(owner)+'_'+resource_type.lower(),
+                    'ProtectedResourceType': resource_type,
+                    'ProtectedResourceArns': [protected_resource_arn],
+                    'IamRoleArn': restore_iam_role.role_arn,
+                    'ValidationWindowHours': restore_testing['validation_window_hours']
+                }
+            )
+            restore_testing_selection.add_depends_on(restore_testing_plan)
+
+        # AWS Backup only counts restore jobs, the duration is published from the job state change events
+        restore_metrics_function = lambda_.Function(self, owner+'-restore-metrics-function',
+            runtime = lambda_.Runtime.PYTHON_3_9,
+            handler = 'index.handler',
+            code = lambda_.Code.from_asset('files/lambda/restore_metrics'),
+            timeout = Duration.seconds(30),
+            environment = {
+                'METRIC_NAMESPACE': RESTORE_METRICS_NAMESPACE
+            }
+        )
+
+        restore_metrics_function.add_to_role_policy(iam.PolicyStatement(
+            actions = ['backup:DescribeRestoreJob'],
+            resources = ['*']
+        ))
+        restore_metrics_function.add_to_role_policy(iam.PolicyStatement(
+            actions = ['cloudwatch:PutMetricData'],
+            resources = ['*'],
+            conditions = {
+                'StringEquals': {'cloudwatch:namespace': RESTORE_METRICS_NAMESPACE}
+            }
+        ))
+
+        events.Rule(self, owner+'-restore-job-rule',
+            event_pattern = events.EventPattern(
+                source = ['aws.backup'],
+                detail_type = ['Restore Job State Change'],
+                detail = {'status': ['COMPLETED']}
+            ),
+            targets = [events_targets.LambdaFunction(restore_metrics_function)]
+        )
+
+        backup_topic = sns.Topic(self, owner+"BackupTopic",
+            topic_name = owner+"BackupTopic",
+            display_name = owner+"BackupTopic"
+        )
+
+        if email:
+            sns.Subscription(self, owner+"BackupSubscription",
+                topic = backup_topic,
+                protocol = sns.SubscriptionProtocol.EMAIL,
+                endpoint = email,
+            )
+
+        for resource_type, objective_minutes in restore_testing['restore_time_objective_minutes'].items():
+            restore_duration_alarm = cloudwatch.Alarm(self, owner+"restore_duration_alarm_"+resource_type.lower(),
+                alarm_name = owner+"restore_duration_alarm_"+resource_type.lower(),
+                metric = cloudwatch.Metric(
+                    namespace = RESTORE_METRICS_NAMESPACE,
+                    metric_name = 'RestoreDuration',
+                    dimensions_map = {'ResourceType': resource_type},
+                    statistic = 'Maximum',
+                    period = Duration.days(1)
+                ),
+                comparison_operator = cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+                threshold = objective_minutes*60,
+                evaluation_periods = 1,
+                treat_missing_data = cloudwatch.TreatMissingData.NOT_BREACHING
+            )
+            restore_duration_alarm.add_alarm_action(cloudwatch_actions.SnsAction(backup_topic))
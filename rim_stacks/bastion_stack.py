@@ -7,6 +7,8 @@ from aws_cdk import (
 )
 from constructs import Construct
 
+from rim_stacks.lookups import RimLookups
+
 class RimBastionStack(Stack):
 
     def __init__(self, scope: Construct, construct_id: str, owner: str, vpc: ec2.Vpc, bastion_sec_grp: ec2.SecurityGroup, **kwargs) -> None:
@@ -19,7 +21,7 @@ class RimBastionStack(Stack):
 
         instance_name = owner+'-bastion-host'
         ami_name      = 'ubuntu/images/hvm-ssd/ubuntu-jammy-22.04-amd64-server-20220420'     
-        ami_image     = ec2.MachineImage().lookup(name=ami_name)
+        ami_image     = RimLookups.of(self).machine_image(self, ami_name)
         instance_type = ec2.InstanceType(instance_type_name)        
 
         iam_role = iam.Role(self, owner+'-bastion-role',
@@ -0,0 +1,26 @@
+from aws_cdk import (
+    Duration,
+    aws_cloudwatch as cloudwatch,
+)
+
+# CloudFront publishes its metrics to us-east-1 only, whatever region reads them
+CLOUDFRONT_METRICS_REGION = 'us-east-1'
+
+def distribution_id_parameter_name(owner: str) -> str:
+    """SSM parameter in us-east-1 holding the distribution id for stacks in other regions."""
+    return '/'+owner.lower()+'/cloudfront/distribution-id'
+
+def cloudfront_metric(distribution_id: str, metric_name: str, statistic: str = 'Average', period: Duration = Duration.minutes(1), **kwargs) -> cloudwatch.Metric:
+    """Metric of the distribution, ``CacheHitRate`` and ``OriginLatency`` need the monitoring subscription."""
+    return cloudwatch.Metric(
+        namespace = 'AWS/CloudFront',
+        metric_name = metric_name,
+        dimensions_map = {
+            'DistributionId': distribution_id,
+            'Region': 'Global'
+        },
+        region = CLOUDFRONT_METRICS_REGION,
+        statistic = statistic,
+        period = period,
+        **kwargs
+    )
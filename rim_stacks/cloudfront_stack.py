@@ -1,5 +1,8 @@
+import json
+
 from aws_cdk import (
-    # Duration,
+    CfnResource,
+    Duration,
     Stack,
     aws_ec2 as ec2,  
     aws_route53 as route53,
@@ -8,20 +11,102 @@ from aws_cdk import (
     aws_cloudfront as cloudfront,
     aws_cloudfront_origins as origins,    
     aws_s3 as s3,
-    aws_s3_deployment as s3_deployment,
     RemovalPolicy,
-    aws_wafv2 as wafv2      
+    aws_wafv2 as wafv2,
+    aws_ssm as ssm,
+    aws_sns as sns,
+    aws_cloudwatch as cloudwatch,
+    aws_cloudwatch_actions as cloudwatch_actions,
+    aws_iam as iam,
+    custom_resources as cr,
 )
 from constructs import Construct
 
+from rim_stacks.asset_build import DEFAULT_ASSET_DEPLOYMENT, RimAssetDeployment
+from rim_stacks.cloudfront_metrics import cloudfront_metric, distribution_id_parameter_name
+from rim_stacks.elb_app_stack import content_bucket_name, standby_bucket_name
+from rim_stacks.lookups import RimLookups
+from rim_stacks.waf_rules import DEFAULT_WAF_RULES, build_waf_rules
+
+# Overridden key by key with the "CloudFrontAlarmThresholds" context, rates are percentages and latency is in ms.
+DEFAULT_ALARM_THRESHOLDS = {
+    "cache_hit_rate": 70,
+    "origin_latency_p90": 1000,
+    "error_rate_4xx": 5,
+    "error_rate_5xx": 1
+}
+
+# Overridden key by key with the "CloudFrontUrlNormalization" context. Lowercasing assumes
+# every object key is lowercase, S3 keys are case sensitive.
+DEFAULT_URL_NORMALIZATION = {
+    "enabled": True,
+    "lowercase_paths": True,
+    "directory_index": "index.html",
+    "strip_query_params": ["utm_*", "fbclid", "gclid", "msclkid", "mc_cid", "mc_eid"]
+}
+
+def render_url_normalization(config: dict) -> str:
+    """Source of the viewer request function in files/cloudfront_functions with ``config`` baked in."""
+    with open('files/cloudfront_functions/normalize_url.js') as source:
+        return source.read().replace('__CONFIG__', json.dumps({key: value for key, value in config.items() if key != 'enabled'}, sort_keys=True))
+
+def origin_render_order(behavior_origins: list, origin_groups: list) -> list:
+    """Origins in the order the Distribution renders them, for property overrides that address origins by index.
+
+    ``behavior_origins`` are the origins of the default and then the additional
+    behaviors. Each origin is rendered when a behavior first uses it, an origin
+    group as its primary followed by its fallback; ``origin_groups`` lists the
+    (group, primary, fallback) of every group in use.
+    """
+    used = []
+    rendered = []
+    for origin in behavior_origins:
+        if any(origin is seen for seen in used):
+            continue
+        used.append(origin)
+        rendered += next(([primary, fallback] for group, primary, fallback in origin_groups if group is origin), [origin])
+    return rendered
+
+def origin_index(rendered_origins: list, origin) -> int:
+    return next(index for index, rendered in enumerate(rendered_origins) if rendered is origin)
+
 class RimCloudFrontStack(Stack):
 
-    def __init__(self, scope: Construct, construct_id: str, owner: str, webapp_token: str, rim_hosted_zone_name: str, **kwargs) -> None:
+    def __init__(self, scope: Construct, construct_id: str, owner: str, webapp_token: str, rim_hosted_zone_name: str, origin_region: str = None, multi_region: bool = False, email: str = None, parameter_regions: list = None, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
-        my_zone = route53.HostedZone.from_lookup(self, owner+'-dns-zone',
-            domain_name = rim_hosted_zone_name
-        )         
+        static_path_patterns = self.node.try_get_context("CloudFrontStaticPathPatterns") or [
+            '*.css', '*.js', '*.png', '*.jpg', '*.jpeg', '*.gif', '*.svg', '*.ico', '*.woff', '*.woff2'
+        ]
+        static_ttl_days = self.node.try_get_context("CloudFrontStaticTtlDays") or 365
+        html_ttl_seconds = self.node.try_get_context("CloudFrontHtmlTtlSeconds") or 60
+        html_max_ttl_seconds = self.node.try_get_context("CloudFrontHtmlMaxTtlSeconds") or 300
+        cache_query_strings = self.node.try_get_context("CloudFrontCacheQueryStrings") or []
+        alarm_thresholds = {**DEFAULT_ALARM_THRESHOLDS, **(self.node.try_get_context("CloudFrontAlarmThresholds") or {})}
+        waf_config = {**DEFAULT_WAF_RULES, **(self.node.try_get_context("WafRules") or {})}
+        url_normalization = {**DEFAULT_URL_NORMALIZATION, **(self.node.try_get_context("CloudFrontUrlNormalization") or {})}
+        # paths served straight from the RimElbAppStack bucket, "*" moves the default behavior there too
+        s3_path_patterns = self.node.try_get_context("CloudFrontS3PathPatterns") or []
+        if s3_path_patterns and not origin_region:
+            raise ValueError('CloudFrontS3PathPatterns needs the origin_region of the content bucket')
+        # the replicated copy of RimElbAppStack serves the S3 paths when the content bucket fails
+        content_standby = self.node.try_get_context("WebAppContentStandby") or False
+
+        # a single shield region would funnel every miss to the origin closest to it,
+        # so multi-region setups leave latency routing to pick the origin per edge
+        origin_shield_region = self.node.try_get_context("CloudFrontOriginShieldRegion")
+        if origin_shield_region is None and not multi_region:
+            origin_shield_region = origin_region
+        origin_keepalive_seconds = self.node.try_get_context("CloudFrontOriginKeepaliveSeconds") or 60
+        origin_read_timeout_seconds = self.node.try_get_context("CloudFrontOriginReadTimeoutSeconds") or 30
+        origin_connection_attempts = self.node.try_get_context("CloudFrontOriginConnectionAttempts") or 2
+        origin_connection_timeout_seconds = self.node.try_get_context("CloudFrontOriginConnectionTimeoutSeconds") or 5
+        # standard logs for rim_stacks.log_analyzer
+        access_logs = self.node.try_get_context("AccessLogs") or False
+        access_logs_retention_days = self.node.try_get_context("AccessLogsRetentionDays") or 30
+        asset_deployment = {**DEFAULT_ASSET_DEPLOYMENT, **(self.node.try_get_context("AssetDeployment") or {})}
+
+        my_zone = RimLookups.of(self).hosted_zone(self, owner+'-dns-zone', rim_hosted_zone_name)         
         
         cert_cloudfront = acm.Certificate(self, owner+'-cloudfront-cert',
             domain_name = owner.lower()+'.app.aws.'+rim_hosted_zone_name,
@@ -37,69 +122,10 @@ class RimCloudFrontStack(Stack):
             removal_policy = RemovalPolicy.DESTROY
         )        
 
-        bucket_alt_deployment = s3_deployment.BucketDeployment(self,  owner+'-s3-alt-deployment',
-            destination_bucket = bucket_alt,
-            sources = [s3_deployment.Source.asset('files/s3_alt')]
-        )      
-        
 
-        waf_rule_rate = wafv2.CfnWebACL.RuleProperty(
-            name = owner+'-waf-acl-rate-rule',
-            priority=0,
-            statement = wafv2.CfnWebACL.StatementProperty(
-                rate_based_statement = wafv2.CfnWebACL.RateBasedStatementProperty(
-                    aggregate_key_type = 'IP',
-                    limit = 100,
-                    # forwarded_ip_config =
-                )
-            ),
-            action = wafv2.CfnWebACL.RuleActionProperty(
-                block = wafv2.CfnWebACL.BlockActionProperty(
-                    custom_response=wafv2.CfnWebACL.CustomResponseProperty(
-                        response_code=403
-                    )
-                ),
-            ),
-            visibility_config = wafv2.CfnWebACL.VisibilityConfigProperty(
-                cloud_watch_metrics_enabled=True,
-                metric_name=owner+'-waf-acl-rate-rule',
-                sampled_requests_enabled=True
-            )                        
-        )
-        
-        waf_rule_bot = wafv2.CfnWebACL.RuleProperty(
-            name = owner+'-waf-acl-bot-rule',
-            priority=1,
-            statement = wafv2.CfnWebACL.StatementProperty(
-                managed_rule_group_statement = wafv2.CfnWebACL.ManagedRuleGroupStatementProperty(
-                    name = 'AWSManagedRulesBotControlRuleSet',
-                    vendor_name = 'AWS'
-                )
-            ),
-            override_action=wafv2.CfnWebACL.OverrideActionProperty(none={}),
-            visibility_config = wafv2.CfnWebACL.VisibilityConfigProperty(
-                cloud_watch_metrics_enabled=True,
-                metric_name=owner+'-waf-acl-bot-rule',
-                sampled_requests_enabled=True
-            )                        
-        )
-        
-        waf_rule_aws_common = wafv2.CfnWebACL.RuleProperty(
-            name = owner+'-waf-acl-aws-common-rule',
-            priority=2,
-            statement = wafv2.CfnWebACL.StatementProperty(
-                managed_rule_group_statement = wafv2.CfnWebACL.ManagedRuleGroupStatementProperty(
-                    name = 'AWSManagedRulesCommonRuleSet',
-                    vendor_name = 'AWS'
-                )
-            ),
-            override_action=wafv2.CfnWebACL.OverrideActionProperty(none={}),
-            visibility_config = wafv2.CfnWebACL.VisibilityConfigProperty(
-                cloud_watch_metrics_enabled=True,
-                metric_name=owner+'-waf-acl-aws-common-rule',
-                sampled_requests_enabled=True
-            )                        
-        )
+        # every path with its own behavior serves files, the WAF classes them all as static
+        additional_path_patterns = static_path_patterns + [p for p in s3_path_patterns if p not in static_path_patterns and p != '*']
+        waf_rules, self.waf_capacity = build_waf_rules(owner, waf_config, additional_path_patterns)
 
         waf_acl = wafv2.CfnWebACL(self, owner+'-waf-acl',
             default_action=wafv2.CfnWebACL.DefaultActionProperty(allow={}),
@@ -110,9 +136,129 @@ class RimCloudFrontStack(Stack):
                 sampled_requests_enabled=True
             ),            
             name = owner+'-waf-acl',
-            rules = [ waf_rule_rate, waf_rule_bot, waf_rule_aws_common ]
+            rules = waf_rules
         )
         
+        static_cache_policy = cloudfront.CachePolicy(self, owner+'-static-cache-policy',
+            cache_policy_name = owner+'-static-cache-policy',
+            comment = 'Long-lived immutable static assets',
+            default_ttl = Duration.days(static_ttl_days),
+            min_ttl = Duration.days(1),
+            max_ttl = Duration.days(static_ttl_days),
+            header_behavior = cloudfront.CacheHeaderBehavior.none(),
+            cookie_behavior = cloudfront.CacheCookieBehavior.none(),
+            query_string_behavior = cloudfront.CacheQueryStringBehavior.none(),
+            enable_accept_encoding_gzip = True,
+            enable_accept_encoding_brotli = True
+        )
+
+        html_cache_policy = cloudfront.CachePolicy(self, owner+'-html-cache-policy',
+            cache_policy_name = owner+'-html-cache-policy',
+            comment = 'Short-lived HTML pages',
+            default_ttl = Duration.seconds(html_ttl_seconds),
+            min_ttl = Duration.seconds(0),
+            max_ttl = Duration.seconds(html_max_ttl_seconds),
+            header_behavior = cloudfront.CacheHeaderBehavior.none(),
+            cookie_behavior = cloudfront.CacheCookieBehavior.none(),
+            query_string_behavior = cloudfront.CacheQueryStringBehavior.allow_list(*cache_query_strings) if cache_query_strings else cloudfront.CacheQueryStringBehavior.none(),
+            enable_accept_encoding_gzip = True,
+            enable_accept_encoding_brotli = True
+        )
+
+        alb_origin = origins.HttpOrigin(
+            domain_name = owner.lower()+'.elb.aws.'+rim_hosted_zone_name,
+            custom_headers={
+                "X-Custom-Header": webapp_token
+            },
+            keepalive_timeout = Duration.seconds(origin_keepalive_seconds),
+            read_timeout = Duration.seconds(origin_read_timeout_seconds),
+            connection_attempts = origin_connection_attempts,
+            connection_timeout = Duration.seconds(origin_connection_timeout_seconds),
+            origin_shield_region = origin_shield_region or None
+        )
+        alt_origin = origins.S3Origin(
+            bucket = bucket_alt,
+            origin_access_identity = oai,
+            connection_attempts = origin_connection_attempts,
+            connection_timeout = Duration.seconds(origin_connection_timeout_seconds),
+            origin_shield_region = origin_shield_region or None
+        )
+        origin_group = origins.OriginGroup(
+            primary_origin = alb_origin,
+            fallback_origin = alt_origin,
+            fallback_status_codes=[500, 502, 503, 504]
+        )
+        origin_groups = [(origin_group, alb_origin, alt_origin)]
+
+        if s3_path_patterns:
+            oac = CfnResource(self, owner+'-oac',
+                type = 'AWS::CloudFront::OriginAccessControl',
+                properties = {
+                    'OriginAccessControlConfig': {
+                        'Name': owner+'-oac',
+                        'OriginAccessControlOriginType': 's3',
+                        'SigningBehavior': 'always',
+                        'SigningProtocol': 'sigv4'
+                    }
+                }
+            )
+
+            content_buckets = [s3.Bucket.from_bucket_attributes(self, owner+'-content-bucket',
+                bucket_name = content_bucket_name(owner, self.account, origin_region),
+                region = origin_region
+            )]
+            if content_standby:
+                content_buckets.append(s3.Bucket.from_bucket_attributes(self, owner+'-standby-bucket',
+                    bucket_name = standby_bucket_name(owner, self.account, origin_region),
+                    region = origin_region
+                ))
+
+            # the shared OAI only keeps S3Origin from creating its own, OAC replaces it below
+            content_origins = [origins.S3Origin(
+                bucket = bucket,
+                origin_access_identity = oai,
+                connection_attempts = origin_connection_attempts,
+                connection_timeout = Duration.seconds(origin_connection_timeout_seconds),
+                origin_shield_region = origin_shield_region or None
+            ) for bucket in content_buckets]
+            s3_origin = content_origins[0]
+            if content_standby:
+                s3_origin = origins.OriginGroup(
+                    primary_origin = content_origins[0],
+                    fallback_origin = content_origins[1],
+                    fallback_status_codes=[500, 502, 503, 504]
+                )
+                origin_groups.append((s3_origin, content_origins[0], content_origins[1]))
+
+        log_bucket = None
+        if access_logs:
+            # CloudFront writes standard logs through bucket ACLs
+            log_bucket = s3.Bucket(self, owner+'-cloudfront-logs',
+                encryption = s3.BucketEncryption.S3_MANAGED,
+                object_ownership = s3.ObjectOwnership.BUCKET_OWNER_PREFERRED,
+                block_public_access = s3.BlockPublicAccess.BLOCK_ALL,
+                lifecycle_rules = [
+                    s3.LifecycleRule(expiration = Duration.days(access_logs_retention_days))
+                ],
+                auto_delete_objects = True,
+                removal_policy = RemovalPolicy.DESTROY
+            )
+
+        function_associations = []
+        if url_normalization['enabled']:
+            normalize_url_function = cloudfront.Function(self, owner+'-normalize-url-function',
+                function_name = owner+'-normalize-url',
+                comment = 'Canonical URI and query string for a better cache hit ratio',
+                code = cloudfront.FunctionCode.from_inline(render_url_normalization(url_normalization))
+            )
+            function_associations.append(cloudfront.FunctionAssociation(
+                function = normalize_url_function,
+                event_type = cloudfront.FunctionEventType.VIEWER_REQUEST
+            ))
+
+        def behavior_origin(path_pattern):
+            return s3_origin if path_pattern in s3_path_patterns else origin_group
+
         cf = cloudfront.Distribution(self, owner+'-distribution',
             certificate = cert_cloudfront,
             default_root_object = 'index.html',
@@ -120,21 +266,23 @@ class RimCloudFrontStack(Stack):
             price_class = cloudfront.PriceClass.PRICE_CLASS_100,
             geo_restriction=cloudfront.GeoRestriction.allowlist("PL", "DE", "NL", "LU"),
             web_acl_id = waf_acl.attr_arn,
+            enable_logging = access_logs,
+            log_bucket = log_bucket,
+            log_file_prefix = 'cloudfront/' if access_logs else None,
             default_behavior=cloudfront.BehaviorOptions(
-                origin=origins.OriginGroup(
-                    primary_origin = origins.HttpOrigin(
-                        domain_name = owner.lower()+'.elb.aws.'+rim_hosted_zone_name,
-                        custom_headers={
-                            "X-Custom-Header": webapp_token
-                        },
-                    ),
-                    fallback_origin = origins.S3Origin(
-                        bucket = bucket_alt,
-                        origin_access_identity = oai
-                    ),
-                    fallback_status_codes=[500, 502, 503, 504]
-                )
+                origin = behavior_origin('*'),
+                cache_policy = html_cache_policy,
+                compress = True,
+                function_associations = function_associations
             ),
+            additional_behaviors = {
+                path_pattern: cloudfront.BehaviorOptions(
+                    origin = behavior_origin(path_pattern),
+                    cache_policy = static_cache_policy if path_pattern in static_path_patterns else html_cache_policy,
+                    compress = True,
+                    function_associations = function_associations
+                ) for path_pattern in additional_path_patterns
+            },
             error_responses = [
                 cloudfront.ErrorResponse(
                     http_status=404,
@@ -149,8 +297,129 @@ class RimCloudFrontStack(Stack):
             ]
         )   
 
+        if s3_path_patterns:
+            cf_cfn = cf.node.default_child
+            rendered_origins = origin_render_order([behavior_origin(path_pattern) for path_pattern in ['*']+additional_path_patterns], origin_groups)
+            for content_origin in content_origins:
+                s3_origin_index = origin_index(rendered_origins, content_origin)
+                cf_cfn.add_property_override('DistributionConfig.Origins.%d.S3OriginConfig.OriginAccessIdentity'%s3_origin_index, '')
+                cf_cfn.add_property_override('DistributionConfig.Origins.%d.OriginAccessControlId'%s3_origin_index, oac.get_att('Id'))
+
         cf_dns = route53.ARecord(self, owner+'-cf-dns-record',
             zone = my_zone,
             record_name = owner.lower()+'.app.aws.'+rim_hosted_zone_name,
             target = route53.RecordTarget.from_alias(route53_targets.CloudFrontTarget(cf)),            
-        )           
\ No newline at end of file
+        )
+
+        # CacheHitRate and OriginLatency are only published with the additional metrics subscription
+        CfnResource(self, owner+'-cf-monitoring-subscription',
+            type = 'AWS::CloudFront::MonitoringSubscription',
+            properties = {
+                'DistributionId': cf.distribution_id,
+                'MonitoringSubscription': {
+                    'RealtimeMetricsSubscriptionConfig': {
+                        'RealtimeMetricsSubscriptionStatus': 'Enabled'
+                    }
+                }
+            }
+        )
+
+        ssm.StringParameter(self, owner+'-cf-distribution-id',
+            parameter_name = distribution_id_parameter_name(owner),
+            string_value = cf.distribution_id
+        )
+
+        # RimMonitoringStack and the content bucket policies of RimElbAppStack resolve the parameter in
+        # their own region on every deployment, the copies are rewritten whenever a replacement changes the distribution id
+        for region in parameter_regions or list(filter(None, [origin_region])):
+            if region == self.region:
+                continue
+            put_distribution_id = cr.AwsSdkCall(
+                service = 'SSM',
+                action = 'putParameter',
+                parameters = {
+                    'Name': distribution_id_parameter_name(owner),
+                    'Value': cf.distribution_id,
+                    'Type': 'String',
+                    'Overwrite': True
+                },
+                region = region,
+                physical_resource_id = cr.PhysicalResourceId.of(distribution_id_parameter_name(owner))
+            )
+            cr.AwsCustomResource(self, owner+'-cf-distribution-id-copy'+('' if region == origin_region else '-'+region),
+                on_create = put_distribution_id,
+                on_update = put_distribution_id,
+                on_delete = cr.AwsSdkCall(
+                    service = 'SSM',
+                    action = 'deleteParameter',
+                    parameters = {'Name': distribution_id_parameter_name(owner)},
+                    region = region
+                ),
+                policy = cr.AwsCustomResourcePolicy.from_statements([iam.PolicyStatement(
+                    actions = ['ssm:PutParameter', 'ssm:DeleteParameter'],
+                    resources = [self.format_arn(service='ssm', region=region, resource='parameter', resource_name=distribution_id_parameter_name(owner).lstrip('/'))]
+                )])
+            )
+
+        bucket_alt_deployment = RimAssetDeployment(self,  owner+'-s3-alt-deployment',
+            owner = owner,
+            bucket = bucket_alt,
+            source_dir = 'files/s3_alt',
+            html_max_age = html_ttl_seconds,
+            distribution_id = cf.distribution_id,
+            # only served through the S3 origin, which has no way to pick a variant
+            precompress = False,
+            **asset_deployment
+        )
+
+        # alarms have to live next to the CloudFront metrics in us-east-1, so does their topic
+        edge_topic = sns.Topic(self, owner+"CdnEdgeTopic",
+            topic_name = owner+"CdnEdgeTopic",
+            display_name = owner+"CdnEdgeTopic"
+        )
+
+        if email:
+            sns.Subscription(self, owner+"CdnEdgeSubscription",
+                topic = edge_topic,
+                protocol = sns.SubscriptionProtocol.EMAIL,
+                endpoint = email,
+            )
+
+        cf_cache_hit_rate_alarm = cloudwatch.Alarm(self, owner+"cf_cache_hit_rate_alarm",
+            alarm_name = owner+"cf_cache_hit_rate_alarm",
+            metric = cloudfront_metric(cf.distribution_id, 'CacheHitRate', period = Duration.minutes(5)),
+            comparison_operator = cloudwatch.ComparisonOperator.LESS_THAN_THRESHOLD,
+            threshold = alarm_thresholds['cache_hit_rate'],
+            evaluation_periods = 3,
+            treat_missing_data = cloudwatch.TreatMissingData.NOT_BREACHING
+        )
+
+        cf_origin_latency_alarm = cloudwatch.Alarm(self, owner+"cf_origin_latency_alarm",
+            alarm_name = owner+"cf_origin_latency_alarm",
+            metric = cloudfront_metric(cf.distribution_id, 'OriginLatency', statistic = 'p90', period = Duration.minutes(5)),
+            comparison_operator = cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+            threshold = alarm_thresholds['origin_latency_p90'],
+            evaluation_periods = 3,
+            treat_missing_data = cloudwatch.TreatMissingData.NOT_BREACHING
+        )
+
+        cf_4xx_error_rate_alarm = cloudwatch.Alarm(self, owner+"cf_4xx_error_rate_alarm",
+            alarm_name = owner+"cf_4xx_error_rate_alarm",
+            metric = cloudfront_metric(cf.distribution_id, '4xxErrorRate', period = Duration.minutes(5)),
+            comparison_operator = cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+            threshold = alarm_thresholds['error_rate_4xx'],
+            evaluation_periods = 3,
+            treat_missing_data = cloudwatch.TreatMissingData.NOT_BREACHING
+        )
+
+        cf_5xx_error_rate_alarm = cloudwatch.Alarm(self, owner+"cf_5xx_error_rate_alarm",
+            alarm_name = owner+"cf_5xx_error_rate_alarm",
+            metric = cloudfront_metric(cf.distribution_id, '5xxErrorRate', period = Duration.minutes(5)),
+            comparison_operator = cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+            threshold = alarm_thresholds['error_rate_5xx'],
+            evaluation_periods = 2,
+            treat_missing_data = cloudwatch.TreatMissingData.NOT_BREACHING
+        )
+
+        for alarm in [cf_cache_hit_rate_alarm, cf_origin_latency_alarm, cf_4xx_error_rate_alarm, cf_5xx_error_rate_alarm]:
+            alarm.add_alarm_action(cloudwatch_actions.SnsAction(edge_topic))
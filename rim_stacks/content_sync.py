@@ -0,0 +1,55 @@
+from aws_cdk import (
+    Duration,
+    Stack,
+    aws_autoscaling as autoscaling,
+    aws_iam as iam,
+    aws_lambda as lambda_,
+    aws_lambda_event_sources as lambda_event_sources,
+    aws_s3 as s3,
+    aws_s3_notifications as s3n,
+    aws_sqs as sqs,
+)
+from constructs import Construct
+
+class RimContentSync(Construct):
+    """Pushes changed bucket keys to the running web instances with SSM Run Command.
+
+    S3 notifications are buffered in SQS so a whole BucketDeployment lands in a few
+    Lambda invocations, each sending one targeted command per batch of keys.
+    """
+
+    def __init__(self, scope: Construct, construct_id: str, owner: str, bucket: s3.Bucket, asg: autoscaling.AutoScalingGroup, docroot: str = '/var/www/html', batching_window: Duration = Duration.seconds(10), **kwargs) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        stack = Stack.of(self)
+
+        queue = sqs.Queue(self, owner+'-content-sync-queue',
+            visibility_timeout = Duration.minutes(6)
+        )
+
+        bucket.add_event_notification(s3.EventType.OBJECT_CREATED, s3n.SqsDestination(queue))
+        bucket.add_event_notification(s3.EventType.OBJECT_REMOVED, s3n.SqsDestination(queue))
+
+        function = lambda_.Function(self, owner+'-content-sync-function',
+            runtime = lambda_.Runtime.PYTHON_3_9,
+            handler = 'index.handler',
+            code = lambda_.Code.from_asset('files/lambda/content_sync'),
+            timeout = Duration.minutes(1),
+            environment = {
+                'ASG_NAME': asg.auto_scaling_group_name,
+                'DOCROOT': docroot
+            }
+        )
+
+        function.add_event_source(lambda_event_sources.SqsEventSource(queue,
+            batch_size = 100,
+            max_batching_window = batching_window
+        ))
+
+        function.add_to_role_policy(iam.PolicyStatement(
+            actions = ['ssm:SendCommand'],
+            resources = [
+                stack.format_arn(service='ssm', account='', resource='document', resource_name='AWS-RunShellScript'),
+                stack.format_arn(service='ec2', resource='instance', resource_name='*')
+            ]
+        ))
@@ -1,43 +1,140 @@
 from aws_cdk import (
+    ArnFormat,
+    CfnOutput,
     Duration,
     Stack,
     aws_ec2 as ec2,    
     aws_elasticloadbalancingv2 as elbv2,    
     aws_iam as iam,
     aws_s3 as s3,    
+    aws_ssm as ssm,
     RemovalPolicy,
-    aws_s3_deployment as s3_deployment,
     aws_autoscaling as autoscaling,
     aws_route53 as route53,    
     aws_certificatemanager as acm, 
     aws_route53_targets as route53_targets,   
+    aws_cloudwatch as cloudwatch,
 )
 from constructs import Construct
 
+from rim_stacks.apache_config import render_user_data, smallest_instance_type
+from rim_stacks.asset_build import DEFAULT_ASSET_DEPLOYMENT, RimAssetDeployment, hide_manifest
+from rim_stacks.cloudfront_metrics import distribution_id_parameter_name
+from rim_stacks.content_sync import RimContentSync
+from rim_stacks.golden_ami import RimGoldenAmi
+from rim_stacks.lookups import RimLookups
+from rim_stacks.scaling_policies import DEFAULT_SCALING_POLICIES, add_scaling_policies
+from rim_stacks.update_policy import DEFAULT_UPDATE_POLICY, add_update_policy
+
+# Overridden key by key with the "WebAppLoadBalancerProfile" context.
+# The idle timeout stays above the CloudFront origin keepalive so the ALB never closes a connection CloudFront is reusing.
+DEFAULT_LOAD_BALANCER_PROFILE = {
+    "algorithm": "LEAST_OUTSTANDING_REQUESTS",
+    "slow_start_seconds": 0,
+    "deregistration_delay_seconds": 30,
+    "http2_enabled": True,
+    "idle_timeout_seconds": 75,
+    "ssl_policy": "TLS13_RES"
+}
+
+# Overridden key by key with the "WebAppHealthCheck" context. Two failed checks 10 seconds apart take an
+# instance out of rotation, the ASG then replaces it; grace_seconds defaults to the instance warmup.
+DEFAULT_HEALTH_CHECK = {
+    "path": "/healthz",
+    "interval_seconds": 10,
+    "timeout_seconds": 5,
+    "healthy_threshold": 2,
+    "unhealthy_threshold": 2,
+    "grace_seconds": None
+}
+
+# a boot-time install has to finish within this, or the launch is abandoned
+LAUNCH_HOOK_TIMEOUT_SECONDS = 600
+
+# Fills in the "WebAppMixedInstances" context, the update policy starts instance refreshes with the same distribution.
+DEFAULT_INSTANCES_DISTRIBUTION = {
+    "on_demand_base_capacity": 1,
+    "on_demand_percentage_above_base_capacity": 0,
+    "spot_allocation_strategy": "CAPACITY_OPTIMIZED"
+}
+
+def content_bucket_name(owner: str, account: str, region: str) -> str:
+    """Deterministic name of the content bucket, so stacks in other regions can import it."""
+    return owner.lower()+'-webapp-content-'+account+'-'+region
+
+def standby_bucket_name(owner: str, account: str, region: str) -> str:
+    """Deterministic name of the content standby bucket, the fallback S3 origin of RimCloudFrontStack."""
+    return owner.lower()+'-webapp-standby-'+account+'-'+region
+
 class RimElbAppStack(Stack):
 
-    def __init__(self, scope: Construct, construct_id: str, owner: str, vpc: ec2.Vpc, web_srv_sec_grp: ec2.SecurityGroup, alb_sec_grp: ec2.SecurityGroup, webapp_token: str, rim_hosted_zone_name: str, **kwargs) -> None:
+    def __init__(self, scope: Construct, construct_id: str, owner: str, vpc: ec2.Vpc, web_srv_sec_grp: ec2.SecurityGroup, alb_sec_grp: ec2.SecurityGroup, webapp_token: str, rim_hosted_zone_name: str, latency_routing: bool = False, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
         
-        instance_type_name = 't3a.nano'
+        instance_type_name = self.node.try_get_context("WebAppInstanceType") or 't3a.nano'
         volume_size = 8
-        subnet_type=ec2.SubnetType.PUBLIC
-        min_capacity = 1
-        max_capacity = 4 
-        target_utilization_percent = 30         
+        # isolated instances have no route to the internet, only to the RimVpcStack endpoints
+        web_app_isolated = self.node.try_get_context("WebAppIsolatedSubnets") or False
+        subnet_type=ec2.SubnetType.PRIVATE_ISOLATED if web_app_isolated else ec2.SubnetType.PUBLIC
+        min_capacity = self.node.try_get_context("WebAppMinCapacity") or 1
+        max_capacity = self.node.try_get_context("WebAppMaxCapacity") or 4
+        if min_capacity > max_capacity:
+            raise ValueError('WebAppMinCapacity %d is above WebAppMaxCapacity %d'%(min_capacity, max_capacity))
+        scaling_policies = self.node.try_get_context("WebAppScalingPolicies") or DEFAULT_SCALING_POLICIES
+        s3_path_patterns = self.node.try_get_context("CloudFrontS3PathPatterns") or []
+        lb_profile = {**DEFAULT_LOAD_BALANCER_PROFILE, **(self.node.try_get_context("WebAppLoadBalancerProfile") or {})}
+        if lb_profile['slow_start_seconds'] and lb_profile['algorithm'] == 'LEAST_OUTSTANDING_REQUESTS':
+            raise ValueError('slow start cannot be combined with the LEAST_OUTSTANDING_REQUESTS algorithm')
+        apache_config = self.node.try_get_context("WebAppApacheConfig") or {}
+        update_policy = {**DEFAULT_UPDATE_POLICY, **(self.node.try_get_context("WebAppUpdatePolicy") or {})}
+        health_check_config = {**DEFAULT_HEALTH_CHECK, **(self.node.try_get_context("WebAppHealthCheck") or {})}
+        if health_check_config['timeout_seconds'] >= health_check_config['interval_seconds']:
+            raise ValueError('the health check timeout has to be shorter than its interval')
+        content_sync = self.node.try_get_context("WebAppContentSync")
+        if content_sync is None:
+            content_sync = True
+        golden_ami = self.node.try_get_context("WebAppGoldenAmi")
+        if golden_ami is None:
+            golden_ami = True
+        golden_ami_version = self.node.try_get_context("WebAppGoldenAmiVersion") or '1.1.0'
+        # e.g. {"min_size": 1, "max_group_prepared_capacity": 2, "pool_state": "STOPPED", "reuse_on_scale_in": true}
+        warm_pool = self.node.try_get_context("WebAppWarmPool")
+        warm_pool_state = autoscaling.PoolState[warm_pool.get('pool_state', 'STOPPED')] if warm_pool else None
+        hibernated = warm_pool_state == autoscaling.PoolState.HIBERNATED
+        # e.g. {"instance_types": {"t4g.small": 1, "c7g.medium": 2}, "on_demand_base_capacity": 1, "on_demand_percentage_above_base_capacity": 0}
+        # with weights other than 1 the ASG capacities count weight units rather than instances
+        mixed_instances = self.node.try_get_context("WebAppMixedInstances")
+        if mixed_instances:
+            mixed_instances = {**DEFAULT_INSTANCES_DISTRIBUTION, **mixed_instances}
+        # access logs for rim_stacks.log_analyzer
+        access_logs = self.node.try_get_context("AccessLogs") or False
+        access_logs_retention_days = self.node.try_get_context("AccessLogsRetentionDays") or 30
+        # e.g. {"incremental": true, "memory_limit_mib": 512, "ephemeral_storage_mib": 4096}
+        asset_deployment = {**DEFAULT_ASSET_DEPLOYMENT, **(self.node.try_get_context("AssetDeployment") or {})}
+        # hot standby copy of the content bucket, replicated within 15 minutes (S3 Replication Time Control)
+        # and the fallback origin of the CloudFrontS3PathPatterns
+        content_standby = self.node.try_get_context("WebAppContentStandby") or False
+        instance_type_names = list(mixed_instances['instance_types']) if mixed_instances else [instance_type_name]
+        architectures = set(ec2.InstanceType(name).architecture for name in instance_type_names)
+        if len(architectures) > 1:
+            raise ValueError('mixed instance types must share one architecture: %s'%', '.join(instance_type_names))
+        architecture = architectures.pop()
+        if mixed_instances and warm_pool:
+            raise ValueError('warm pools cannot be used with a mixed instances policy')
+        if web_app_isolated and not golden_ami:
+            raise ValueError('isolated subnets need the golden AMI, apt-get cannot reach the internet from there')
         health_check = elbv2.HealthCheck(
-            healthy_threshold_count = 2,
-            unhealthy_threshold_count = 2,
-            timeout = Duration.seconds(5),
-            interval = Duration.seconds(10),
+            path = health_check_config['path'],
+            healthy_threshold_count = health_check_config['healthy_threshold'],
+            unhealthy_threshold_count = health_check_config['unhealthy_threshold'],
+            timeout = Duration.seconds(health_check_config['timeout_seconds']),
+            interval = Duration.seconds(health_check_config['interval_seconds']),
             healthy_http_codes = "200"
         )          
 
 
         instance_name = owner+'-webapp-instance'
-        ami_name      = 'ubuntu/images/hvm-ssd/ubuntu-jammy-22.04-amd64-server-20220420'     
-        ami_image     = ec2.MachineImage.lookup(name=ami_name)
-        instance_type = ec2.InstanceType(instance_type_name)        
+        instance_type = ec2.InstanceType(instance_type_names[0])        
 
         iam_role = iam.Role(self, owner+'-webapp-role',
             assumed_by=iam.ServicePrincipal('ec2.amazonaws.com'),
@@ -49,24 +146,85 @@ class RimElbAppStack(Stack):
         )            
 
         self.bucket = s3.Bucket(self, owner+'-bucket',
+            bucket_name = content_bucket_name(owner, self.account, self.region) if s3_path_patterns else None,
             versioned = True,
             encryption=s3.BucketEncryption.S3_MANAGED,
             auto_delete_objects = True,
             removal_policy = RemovalPolicy.DESTROY
         )
 
-        bucket_deployment = s3_deployment.BucketDeployment(self, owner+'s3-deployment',
-            destination_bucket = self.bucket,
-            sources = [s3_deployment.Source.asset('files/s3')]
+        self.standby_bucket = None
+        if content_standby:
+            self._content_standby(owner, named=bool(s3_path_patterns))
+
+        if s3_path_patterns:
+            # RimCloudFrontStack lives in us-east-1 and copies the distribution id into this region
+            distribution_id = ssm.StringParameter.value_for_string_parameter(self, distribution_id_parameter_name(owner))
+            for bucket in filter(None, [self.bucket, self.standby_bucket]):
+                bucket.add_to_resource_policy(iam.PolicyStatement(
+                    actions = ['s3:GetObject'],
+                    resources = [bucket.arn_for_objects('*')],
+                    principals = [iam.ServicePrincipal('cloudfront.amazonaws.com')],
+                    conditions = {
+                        'StringEquals': {'AWS:SourceArn': self.format_arn(service='cloudfront', region='', resource='distribution', resource_name=distribution_id)}
+                    }
+                ))
+
+        bucket_deployment = RimAssetDeployment(self, owner+'s3-deployment',
+            owner = owner,
+            bucket = self.bucket,
+            source_dir = 'files/s3',
+            html_max_age = apache_config.get('html_max_age', 60),
+            vpc = vpc,
+            distribution_id_parameter_name = distribution_id_parameter_name(owner),
+            **asset_deployment
         )
         
-        user_data = ec2.UserData.custom("""#!/bin/bash
-            apt-get update
-            apt-get -y install apache2 awscli
-            aws s3 sync s3://%s/ /var/www/html/
-            systemctl restart apache2
-            systemctl enable apache2"""%self.bucket.bucket_name
-        )  
+        # warm pool instances must not be stopped before the user data has finished,
+        # an instance that never reports ready is abandoned and replaced
+        launch_hook_name = owner+'-launch-hook' if warm_pool else None
+        apache_user_data = render_user_data(smallest_instance_type(instance_type_names), self.bucket.bucket_name, region=self.region, health_check_path=health_check_config['path'], lifecycle_hook_name=launch_hook_name, **apache_config)
+        if launch_hook_name:
+            iam_role.add_to_policy(iam.PolicyStatement(
+                actions = ['autoscaling:DescribeAutoScalingInstances'],
+                resources = ['*']
+            ))
+            # the group name is generated from the stack name, naming the group itself would make the role wait for it
+            iam_role.add_to_policy(iam.PolicyStatement(
+                actions = ['autoscaling:CompleteLifecycleAction'],
+                resources = [self.format_arn(service='autoscaling', resource='autoScalingGroup', resource_name='*:autoScalingGroupName/%s-*'%self.stack_name, arn_format=ArnFormat.COLON_RESOURCE_NAME)]
+            ))
+
+        if golden_ami:
+            # apache and awscli are baked in, the content is pulled into the docroot whenever apache starts
+            rim_golden_ami = RimGoldenAmi(self, owner+'-golden-ami',
+                owner = owner,
+                vpc = vpc,
+                security_group = web_srv_sec_grp,
+                bucket = self.bucket,
+                architecture = architecture,
+                version = golden_ami_version
+            )
+            rim_golden_ami.node.add_dependency(bucket_deployment)
+            ami_image = rim_golden_ami.machine_image
+            estimated_instance_warmup = Duration.seconds(60)
+
+            user_data = ec2.UserData.custom("""#!/bin/bash
+%s
+systemctl restart apache2"""%apache_user_data
+            )
+        else:
+            ami_name      = 'ubuntu/images/hvm-ssd/ubuntu-jammy-22.04-%s-server-20220420'%('arm64' if architecture == ec2.InstanceArchitecture.ARM_64 else 'amd64')
+            ami_image     = RimLookups.of(self).machine_image(self, ami_name)
+            estimated_instance_warmup = Duration.seconds(240)
+
+            user_data = ec2.UserData.custom("""#!/bin/bash
+apt-get update
+apt-get -y install apache2 awscli
+%s
+systemctl restart apache2
+systemctl enable apache2"""%apache_user_data
+            )  
 
         lt = ec2.LaunchTemplate(self, owner+'-lt',
             instance_type=instance_type,
@@ -74,6 +232,7 @@ class RimElbAppStack(Stack):
             role=iam_role,            
             security_group=web_srv_sec_grp,        
             user_data=user_data,
+            hibernation_configured = hibernated or None,
             block_devices = [
                 ec2.BlockDevice(
                     device_name = '/dev/sda1',
@@ -81,6 +240,7 @@ class RimElbAppStack(Stack):
                     volume = ec2.BlockDeviceVolume.ebs(
                         volume_size = volume_size,
                         volume_type = ec2.EbsDeviceVolumeType.GP3,
+                        encrypted = hibernated or None,
                         iops = 3000
                     )
                 )
@@ -92,24 +252,73 @@ class RimElbAppStack(Stack):
 			vpc_subnets=ec2.SubnetSelection(
                 subnet_type=subnet_type
             ), 
-            launch_template = lt,
+            launch_template = None if mixed_instances else lt,
+            mixed_instances_policy = autoscaling.MixedInstancesPolicy(
+                launch_template = lt,
+                launch_template_overrides = [
+                    autoscaling.LaunchTemplateOverrides(
+                        instance_type = ec2.InstanceType(name),
+                        weighted_capacity = weight
+                    ) for name, weight in mixed_instances['instance_types'].items()
+                ],
+                instances_distribution = autoscaling.InstancesDistribution(
+                    on_demand_base_capacity = mixed_instances['on_demand_base_capacity'],
+                    on_demand_percentage_above_base_capacity = mixed_instances['on_demand_percentage_above_base_capacity'],
+                    spot_allocation_strategy = autoscaling.SpotAllocationStrategy[mixed_instances['spot_allocation_strategy']]
+                )
+            ) if mixed_instances else None,
 			min_capacity = min_capacity,
 			max_capacity = max_capacity,
+            # a wedged apache fails the target group check long before the instance status check
+            health_check = autoscaling.HealthCheck.elb(
+                grace = Duration.seconds(health_check_config['grace_seconds']) if health_check_config['grace_seconds'] else estimated_instance_warmup
+            ),
             group_metrics=[
                 autoscaling.GroupMetrics(autoscaling.GroupMetric.IN_SERVICE_INSTANCES)
             ]
 		)
 
-        self.asg.scale_on_cpu_utilization(owner+' Target Tracking Policy',
-            target_utilization_percent = target_utilization_percent,
-            estimated_instance_warmup = Duration.seconds(240)
-        )
+        if mixed_instances:
+            # replace Spot instances proactively when AWS signals an elevated interruption risk
+            self.asg.node.default_child.capacity_rebalance = True
+
+        if content_sync:
+            RimContentSync(self, owner+'-content-sync',
+                owner = owner,
+                bucket = self.bucket,
+                asg = self.asg
+            )
+
+        if warm_pool:
+            # part of the group itself, so the instances launched along with it wait for the hook too
+            self.asg.node.default_child.lifecycle_hook_specification_list = [
+                autoscaling.CfnAutoScalingGroup.LifecycleHookSpecificationProperty(
+                    lifecycle_hook_name = launch_hook_name,
+                    lifecycle_transition = 'autoscaling:EC2_INSTANCE_LAUNCHING',
+                    default_result = 'ABANDON',
+                    heartbeat_timeout = LAUNCH_HOOK_TIMEOUT_SECONDS
+                )
+            ]
+            self.asg.add_warm_pool(
+                min_size = warm_pool.get('min_size', 1),
+                max_group_prepared_capacity = warm_pool.get('max_group_prepared_capacity'),
+                pool_state = warm_pool_state,
+                reuse_on_scale_in = warm_pool.get('reuse_on_scale_in', True)
+            )
+            # warm instances have already run the user data and only need to resume, but cold launches
+            # with an empty pool and instance refresh replacements still take the full boot time
+            target_tracking_warmup = Duration.seconds(30)
+        else:
+            target_tracking_warmup = estimated_instance_warmup
 
         tg = elbv2.ApplicationTargetGroup(self, owner+'-tg',
             target_type = elbv2.TargetType.INSTANCE,
             vpc = vpc,
             port = 80,
-            health_check = health_check
+            health_check = health_check,
+            load_balancing_algorithm_type = elbv2.TargetGroupLoadBalancingAlgorithmType[lb_profile['algorithm']],
+            slow_start = Duration.seconds(lb_profile['slow_start_seconds']) if lb_profile['slow_start_seconds'] else None,
+            deregistration_delay = Duration.seconds(lb_profile['deregistration_delay_seconds'])
         )
 
         self.asg.attach_to_application_target_group(tg)        
@@ -121,8 +330,25 @@ class RimElbAppStack(Stack):
             ),            
             internet_facing=True,
             security_group=alb_sec_grp, 
+            idle_timeout = Duration.seconds(lb_profile['idle_timeout_seconds'])
         )        
 
+        # set explicitly, http2_enabled only renders the attribute when it is turned off
+        self.alb.set_attribute('routing.http2.enabled', str(lb_profile['http2_enabled']).lower())
+
+        if access_logs:
+            # ALB log delivery only supports SSE-S3
+            log_bucket = s3.Bucket(self, owner+'-alb-logs',
+                encryption = s3.BucketEncryption.S3_MANAGED,
+                block_public_access = s3.BlockPublicAccess.BLOCK_ALL,
+                lifecycle_rules = [
+                    s3.LifecycleRule(expiration = Duration.days(access_logs_retention_days))
+                ],
+                auto_delete_objects = True,
+                removal_policy = RemovalPolicy.DESTROY
+            )
+            self.alb.log_access_logs(log_bucket, 'alb')
+
         #listener_http = self.alb.add_listener("HTTP Listener", port=80)
 
         #listener_http.add_target_groups(owner+'-targets',
@@ -144,9 +370,7 @@ class RimElbAppStack(Stack):
         #    )
         #) 
         
-        my_zone = route53.HostedZone.from_lookup(self, owner+'-dns-zone',
-            domain_name = rim_hosted_zone_name
-        )           
+        my_zone = RimLookups.of(self).hosted_zone(self, owner+'-dns-zone', rim_hosted_zone_name)           
 
         cert_elb = acm.Certificate(self, owner+'-elb-cert',
             domain_name = owner.lower()+'.elb.aws.'+rim_hosted_zone_name,
@@ -155,7 +379,8 @@ class RimElbAppStack(Stack):
 
         listener_https = self.alb.add_listener("HTTPS Listener", 
             port=443,
-            certificates = [elbv2.ListenerCertificate(cert_elb.certificate_arn)]
+            certificates = [elbv2.ListenerCertificate(cert_elb.certificate_arn)],
+            ssl_policy = elbv2.SslPolicy[lb_profile['ssl_policy']]
         )        
 
         listener_https.add_target_groups(owner+' targets',
@@ -177,12 +402,126 @@ class RimElbAppStack(Stack):
             )
         )        
 
-        alb_dns = route53.ARecord(self, owner+'-alb-dns-record',
-            zone = my_zone,
-            target = route53.RecordTarget.from_alias(
-                route53_targets.LoadBalancerTarget(self.alb)
-            ),
-            record_name = owner.lower()+'.elb.aws.'+rim_hosted_zone_name
-        )        
-        
-        
+        add_scaling_policies(self, owner,
+            asg = self.asg,
+            alb = self.alb,
+            tg = tg,
+            policies = scaling_policies,
+            estimated_instance_warmup = estimated_instance_warmup,
+            target_tracking_warmup = target_tracking_warmup
+        )
+
+        add_update_policy(self, owner,
+            asg = self.asg,
+            lt = lt,
+            tg = tg,
+            policy = update_policy,
+            min_capacity = min_capacity,
+            max_capacity = max_capacity,
+            estimated_instance_warmup = estimated_instance_warmup,
+            mixed_instances = mixed_instances
+        )
+
+        if latency_routing:
+            # the listener only answers requests carrying the CloudFront token, so Route 53
+            # judges the region by the target group's healthy hosts instead of probing the ALB
+            healthy_hosts_alarm = cloudwatch.Alarm(self, owner+'-healthy-hosts-alarm',
+                metric = tg.metric_healthy_host_count(
+                    statistic = 'Minimum',
+                    period = Duration.minutes(1)
+                ),
+                comparison_operator = cloudwatch.ComparisonOperator.LESS_THAN_THRESHOLD,
+                threshold = 1,
+                evaluation_periods = 2,
+                treat_missing_data = cloudwatch.TreatMissingData.BREACHING
+            )
+
+            health_check = route53.CfnHealthCheck(self, owner+'-alb-health-check',
+                health_check_config = route53.CfnHealthCheck.HealthCheckConfigProperty(
+                    type = 'CLOUDWATCH_METRIC',
+                    alarm_identifier = route53.CfnHealthCheck.AlarmIdentifierProperty(
+                        name = healthy_hosts_alarm.alarm_name,
+                        region = self.region
+                    ),
+                    insufficient_data_health_status = 'LastKnownStatus'
+                )
+            )
+
+            alb_dns = route53.CfnRecordSet(self, owner+'-alb-latency-record',
+                hosted_zone_id = my_zone.hosted_zone_id,
+                name = owner.lower()+'.elb.aws.'+rim_hosted_zone_name,
+                type = 'A',
+                set_identifier = self.region,
+                region = self.region,
+                health_check_id = health_check.attr_health_check_id,
+                alias_target = route53.CfnRecordSet.AliasTargetProperty(
+                    dns_name = self.alb.load_balancer_dns_name,
+                    hosted_zone_id = self.alb.load_balancer_canonical_hosted_zone_id,
+                    evaluate_target_health = True
+                )
+            )
+        else:
+            alb_dns = route53.ARecord(self, owner+'-alb-dns-record',
+                zone = my_zone,
+                target = route53.RecordTarget.from_alias(
+                    route53_targets.LoadBalancerTarget(self.alb)
+                ),
+                record_name = owner.lower()+'.elb.aws.'+rim_hosted_zone_name
+            )
+
+    def _content_standby(self, owner: str, named: bool) -> None:
+        # replication is configured on the source bucket, so the standby lives in this stack
+        # rather than in RimBackupStack, which already depends on the content bucket
+        self.standby_bucket = s3.Bucket(self, owner+'-standby-bucket',
+            bucket_name = standby_bucket_name(owner, self.account, self.region) if named else None,
+            versioned = True,
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            auto_delete_objects = True,
+            removal_policy = RemovalPolicy.DESTROY
+        )
+
+        replication_role = iam.Role(self, owner+'-replication-role',
+            assumed_by=iam.ServicePrincipal('s3.amazonaws.com')
+        )
+        replication_role.add_to_policy(iam.PolicyStatement(
+            actions = ['s3:GetReplicationConfiguration', 's3:ListBucket'],
+            resources = [self.bucket.bucket_arn]
+        ))
+        replication_role.add_to_policy(iam.PolicyStatement(
+            actions = ['s3:GetObjectVersionForReplication', 's3:GetObjectVersionAcl', 's3:GetObjectVersionTagging'],
+            resources = [self.bucket.arn_for_objects('*')]
+        ))
+        replication_role.add_to_policy(iam.PolicyStatement(
+            actions = ['s3:ReplicateObject', 's3:ReplicateDelete', 's3:ReplicateTags'],
+            resources = [self.standby_bucket.arn_for_objects('*')]
+        ))
+
+        self.bucket.node.default_child.replication_configuration = s3.CfnBucket.ReplicationConfigurationProperty(
+            role = replication_role.role_arn,
+            rules = [s3.CfnBucket.ReplicationRuleProperty(
+                id = owner+'-standby',
+                status = 'Enabled',
+                priority = 0,
+                filter = s3.CfnBucket.ReplicationRuleFilterProperty(prefix=''),
+                # deletions are replicated too, the standby serves exactly what the primary serves
+                delete_marker_replication = s3.CfnBucket.DeleteMarkerReplicationProperty(status='Enabled'),
+                destination = s3.CfnBucket.ReplicationDestinationProperty(
+                    bucket = self.standby_bucket.bucket_arn,
+                    replication_time = s3.CfnBucket.ReplicationTimeProperty(
+                        status = 'Enabled',
+                        time = s3.CfnBucket.ReplicationTimeValueProperty(minutes=15)
+                    ),
+                    metrics = s3.CfnBucket.MetricsProperty(
+                        status = 'Enabled',
+                        event_threshold = s3.CfnBucket.ReplicationTimeValueProperty(minutes=15)
+                    )
+                )
+            )]
+        )
+        # the deployment manifest is replicated along with the content
+        hide_manifest(self.standby_bucket)
+
+        CfnOutput(self, owner+'-output-standby-bucket',
+            value = self.standby_bucket.bucket_name,
+            description = 'Content standby bucket, see "Content standby" in README.md'
+        )
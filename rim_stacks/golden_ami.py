@@ -0,0 +1,101 @@
+from aws_cdk import (
+    Stack,
+    aws_ec2 as ec2,
+    aws_iam as iam,
+    aws_s3 as s3,
+    aws_imagebuilder as imagebuilder,
+)
+from constructs import Construct
+
+from rim_stacks.apache_config import CONTENT_CACHE_DIR, SYNC_EXCLUDES
+
+class RimGoldenAmi(Construct):
+    """EC2 Image Builder pipeline baking apache, awscli and the site content into an AMI.
+
+    Image Builder recipes and components are immutable per name and version,
+    so ``version`` has to be bumped whenever the component below changes.
+    """
+
+    def __init__(self, scope: Construct, construct_id: str, owner: str, vpc: ec2.Vpc, security_group: ec2.SecurityGroup, bucket: s3.Bucket, architecture: ec2.InstanceArchitecture = ec2.InstanceArchitecture.X86_64, instance_type_name: str = None, version: str = '1.1.0', **kwargs) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        region = Stack.of(self).region
+        arm64 = architecture == ec2.InstanceArchitecture.ARM_64
+        # a separate name lets the x86 and arm64 recipes coexist while switching
+        name_suffix = '-arm64' if arm64 else ''
+        parent_image = 'arn:aws:imagebuilder:%s:aws:image/ubuntu-server-22-lts-%s/x.x.x'%(region, 'arm64' if arm64 else 'x86')
+        instance_type_name = instance_type_name or ('t4g.small' if arm64 else 't3a.small')
+
+        iam_role = iam.Role(self, owner+'-image-builder-role',
+            assumed_by=iam.ServicePrincipal('ec2.amazonaws.com'),
+            managed_policies = [
+                iam.ManagedPolicy.from_aws_managed_policy_name('AmazonSSMManagedInstanceCore'),
+                iam.ManagedPolicy.from_aws_managed_policy_name('EC2InstanceProfileForImageBuilder'),
+            ],
+        )
+        bucket.grant_read(iam_role)
+
+        instance_profile = iam.CfnInstanceProfile(self, owner+'-image-builder-profile',
+            roles = [iam_role.role_name]
+        )
+
+        component = imagebuilder.CfnComponent(self, owner+'-webapp-component',
+            name = owner+'-webapp-component',
+            platform = 'Linux',
+            version = version,
+            description = 'Apache, AWS CLI and site content for the web fleet',
+            data = """name: %s-webapp-component
+schemaVersion: 1.0
+phases:
+  - name: build
+    steps:
+      - name: InstallPackages
+        action: ExecuteBash
+        inputs:
+          commands:
+            - apt-get update
+            - DEBIAN_FRONTEND=noninteractive apt-get -y install apache2 awscli
+            - systemctl enable apache2
+      - name: SyncContent
+        action: ExecuteBash
+        inputs:
+          commands:
+            # the docroot may be a tmpfs, user data seeds it from here
+            - aws s3 sync --only-show-errors %s s3://%s/ %s/
+  - name: validate
+    steps:
+      - name: ApacheEnabled
+        action: ExecuteBash
+        inputs:
+          commands:
+            - systemctl is-enabled apache2
+"""%(owner, ' '.join("--exclude '%s'"%exclude for exclude in SYNC_EXCLUDES), bucket.bucket_name, CONTENT_CACHE_DIR)
+        )
+
+        recipe = imagebuilder.CfnImageRecipe(self, owner+'-webapp-recipe',
+            name = owner+'-webapp-recipe'+name_suffix,
+            version = version,
+            parent_image = parent_image,
+            components = [
+                imagebuilder.CfnImageRecipe.ComponentConfigurationProperty(
+                    component_arn = component.attr_arn
+                )
+            ]
+        )
+
+        infrastructure = imagebuilder.CfnInfrastructureConfiguration(self, owner+'-webapp-infrastructure',
+            name = owner+'-webapp-infrastructure'+name_suffix,
+            instance_profile_name = instance_profile.ref,
+            instance_types = [instance_type_name],
+            subnet_id = vpc.public_subnets[0].subnet_id,
+            security_group_ids = [security_group.security_group_id],
+            terminate_instance_on_failure = True
+        )
+
+        image = imagebuilder.CfnImage(self, owner+'-webapp-image',
+            image_recipe_arn = recipe.attr_arn,
+            infrastructure_configuration_arn = infrastructure.attr_arn
+        )
+
+        self.image_id = image.attr_image_id
+        self.machine_image = ec2.MachineImage.generic_linux({region: self.image_id})
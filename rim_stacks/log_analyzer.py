@@ -0,0 +1,250 @@
+"""Streaming analyzer for CloudFront standard logs and ALB access logs.
+
+Reads gzip (or plain) log files line by line, so memory stays bounded by the
+number of tracked paths rather than by the size of the logs::
+
+    aws s3 sync s3://<log-bucket>/ logs/
+    python -m rim_stacks.log_analyzer logs/ --top 20
+"""
+import argparse
+import gzip
+import json
+import math
+import os
+import re
+import sys
+from urllib.parse import urlsplit
+
+CLOUDFRONT_HIT_RESULTS = {'Hit', 'RefreshHit', 'OriginShieldHit'}
+OTHER_PATHS = '(other)'
+
+# type time elb client target request/target/response processing times, elb/target status, bytes in/out, "request"
+ALB_LINE = re.compile(r'^(\S+) (\S+) (\S+) (\S+) (\S+) (\S+) (\S+) (\S+) (\S+) (\S+) (\S+) (\S+) "(\S+) (\S+) ?(\S*)"')
+
+
+class LogHistogram:
+    """Fixed relative-error histogram, percentiles are accurate to ``growth`` - 1."""
+
+    def __init__(self, growth: float = 1.05, minimum: float = 0.0001):
+        self.log_growth = math.log(growth)
+        self.minimum = minimum
+        self.buckets = {}
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        index = int(math.log(max(value, self.minimum)/self.minimum)/self.log_growth)
+        self.buckets[index] = self.buckets.get(index, 0)+1
+        self.count += 1
+
+    def percentile(self, percent: float) -> float:
+        if not self.count:
+            return None
+        rank = math.ceil(self.count*percent/100)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return self.minimum*math.exp((index+0.5)*self.log_growth)
+
+
+class SpaceSaving:
+    """Approximate top-k counter holding at most ``capacity`` keys.
+
+    Keys are kept in buckets of equal count (the stream-summary structure), so
+    both increments and evictions take constant time.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts = {}
+        # count -> keys with that count, in the order they reached it
+        self.buckets = {}
+        self.min_count = 0
+
+    def _remove(self, key: str) -> int:
+        count = self.counts.pop(key)
+        bucket = self.buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[count]
+        return count
+
+    def _insert(self, key: str, count: int) -> None:
+        self.counts[key] = count
+        self.buckets.setdefault(count, {})[key] = None
+        # counts only grow by one, so an emptied minimum bucket leaves ``count`` as the new minimum
+        if count < self.min_count or self.min_count not in self.buckets:
+            self.min_count = count
+
+    def add(self, key: str) -> None:
+        if key in self.counts:
+            self._insert(key, self._remove(key)+1)
+        elif len(self.counts) < self.capacity:
+            self._insert(key, 1)
+        else:
+            # evict the oldest of the smallest counters and let the newcomer inherit its count as the error bound
+            evicted = next(iter(self.buckets[self.min_count]))
+            self._insert(key, self._remove(evicted)+1)
+
+    def top(self, k: int) -> list:
+        return sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+
+class PathStats:
+    """Edge counters come from CloudFront logs, origin time from ALB logs or, without them, CloudFront miss TTFB."""
+
+    def __init__(self):
+        self.edge_requests = 0
+        self.edge_hits = 0
+        self.miss_ttfb = LogHistogram()
+        self.origin_requests = 0
+        self.target_time = LogHistogram()
+
+    def hit_ratio(self) -> float:
+        return self.edge_hits/self.edge_requests if self.edge_requests else None
+
+    def origin_time(self) -> LogHistogram:
+        return self.target_time if self.target_time.count else self.miss_ttfb
+
+
+class AccessLogReport:
+    """Aggregates log records per path, new paths beyond ``max_paths`` are folded into ``(other)``."""
+
+    def __init__(self, max_paths: int = 10000, top_capacity: int = 1000):
+        self.max_paths = max_paths
+        self.paths = {}
+        self.uncached = SpaceSaving(top_capacity)
+        self.records = 0
+
+    def path_stats(self, path: str) -> PathStats:
+        if path not in self.paths and len(self.paths) >= self.max_paths:
+            path = OTHER_PATHS
+        if path not in self.paths:
+            self.paths[path] = PathStats()
+        return self.paths[path]
+
+    def add_cloudfront(self, path: str, result_type: str, time_to_first_byte: float) -> None:
+        stats = self.path_stats(path)
+        stats.edge_requests += 1
+        self.records += 1
+        if result_type in CLOUDFRONT_HIT_RESULTS:
+            stats.edge_hits += 1
+            return
+        self.uncached.add(path)
+        if time_to_first_byte is not None:
+            stats.miss_ttfb.add(time_to_first_byte)
+
+    def add_alb(self, path: str, target_processing_time: float) -> None:
+        stats = self.path_stats(path)
+        stats.origin_requests += 1
+        self.records += 1
+        # -1 means the request never reached a target
+        if target_processing_time >= 0:
+            stats.target_time.add(target_processing_time)
+
+    def summary(self, top: int = 20) -> dict:
+        def requests(stats):
+            return stats.edge_requests or stats.origin_requests
+        return {
+            'records': self.records,
+            'paths': {
+                path: {
+                    'requests': requests(stats),
+                    'hit_ratio': round(stats.hit_ratio(), 4) if stats.hit_ratio() is not None else None,
+                    'origin_time_p50': stats.origin_time().percentile(50),
+                    'origin_time_p90': stats.origin_time().percentile(90),
+                    'origin_time_p99': stats.origin_time().percentile(99),
+                } for path, stats in sorted(self.paths.items(), key=lambda item: -requests(item[1]))[:top]
+            },
+            'top_uncached': self.uncached.top(top),
+        }
+
+
+def open_log(file_name: str):
+    if file_name.endswith('.gz'):
+        return gzip.open(file_name, 'rt', encoding='utf-8', errors='replace')
+    return open(file_name, 'rt', encoding='utf-8', errors='replace')
+
+
+def read_cloudfront(lines, report: AccessLogReport) -> None:
+    fields = None
+    for line in lines:
+        if line.startswith('#Fields:'):
+            fields = {name: index for index, name in enumerate(line.split()[1:])}
+            continue
+        if line.startswith('#') or fields is None:
+            continue
+        values = line.rstrip('\n').split('\t')
+        if len(values) < len(fields):
+            continue
+        ttfb = values[fields['time-to-first-byte']] if 'time-to-first-byte' in fields else '-'
+        report.add_cloudfront(
+            values[fields['cs-uri-stem']],
+            values[fields['x-edge-result-type']],
+            float(ttfb) if ttfb != '-' else None
+        )
+
+
+def read_alb(lines, report: AccessLogReport) -> None:
+    for line in lines:
+        match = ALB_LINE.match(line)
+        if match is None:
+            continue
+        report.add_alb(urlsplit(match.group(14)).path or '/', float(match.group(7)))
+
+
+def read_file(file_name: str, report: AccessLogReport) -> None:
+    with open_log(file_name) as lines:
+        first = next(lines, '')
+        reader = read_cloudfront if first.startswith('#Version') else read_alb
+        reader([first], report)
+        reader(lines, report)
+
+
+def log_files(paths: list):
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, file_names in sorted(os.walk(path)):
+                for file_name in sorted(file_names):
+                    yield os.path.join(directory, file_name)
+        else:
+            yield path
+
+
+def format_seconds(value: float) -> str:
+    return '%8.1fms'%(value*1000) if value is not None else '%10s'%'-'
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='Per-path cache hit ratio and origin time percentiles from CloudFront/ALB access logs.')
+    parser.add_argument('paths', nargs='+', help='log files or directories, gzip or plain text')
+    parser.add_argument('--top', type=int, default=20, help='number of paths and uncached URLs to report')
+    parser.add_argument('--max-paths', type=int, default=10000, help='distinct paths tracked before folding into (other)')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    report = AccessLogReport(max_paths=args.max_paths, top_capacity=max(args.top*50, 1000))
+    for file_name in log_files(args.paths):
+        read_file(file_name, report)
+    summary = report.summary(args.top)
+
+    if args.json:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+        return 0
+
+    print('%d records'%summary['records'])
+    print('%-50s %9s %8s %10s %10s %10s'%('path', 'requests', 'hit%', 'p50', 'p90', 'p99'))
+    for path, stats in summary['paths'].items():
+        hit_ratio = '%7.1f%%'%(stats['hit_ratio']*100) if stats['hit_ratio'] is not None else '%8s'%'-'
+        print('%-50s %9d %s %s %s %s'%(path[:50], stats['requests'], hit_ratio,
+            format_seconds(stats['origin_time_p50']), format_seconds(stats['origin_time_p90']), format_seconds(stats['origin_time_p99'])))
+    print()
+    print('top uncached URLs (CloudFront logs)')
+    for path, count in summary['top_uncached']:
+        print('%9d %s'%(count, path))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
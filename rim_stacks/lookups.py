@@ -0,0 +1,51 @@
+import weakref
+
+from aws_cdk import (
+    Stack,
+    aws_ec2 as ec2,
+    aws_route53 as route53,
+)
+from constructs import Construct
+
+# one instance per app, so every stack shares what the first one resolved
+_LOOKUPS = weakref.WeakKeyDictionary()
+
+class RimLookups:
+    """Context lookups resolved once per app and shared between its stacks.
+
+    Values pre-seeded in the ``HostedZoneIds`` ({zone name: id}) and ``AmiIds``
+    ({ami name: {region: id}}) context are used as they are, so together with
+    ``AvailabilityZones`` a synth does not need AWS credentials at all.
+    """
+
+    def __init__(self, scope: Construct) -> None:
+        self.hosted_zone_ids = dict(scope.node.try_get_context("HostedZoneIds") or {})
+        self.ami_ids = {name: dict(ids) for name, ids in (scope.node.try_get_context("AmiIds") or {}).items()}
+
+    @classmethod
+    def of(cls, scope: Construct) -> 'RimLookups':
+        root = scope.node.root
+        if root not in _LOOKUPS:
+            _LOOKUPS[root] = cls(root)
+        return _LOOKUPS[root]
+
+    def hosted_zone(self, scope: Construct, construct_id: str, zone_name: str) -> route53.IHostedZone:
+        """Public zones are global, only the first stack asking for one runs the lookup."""
+        if zone_name not in self.hosted_zone_ids:
+            zone = route53.HostedZone.from_lookup(scope, construct_id,
+                domain_name = zone_name
+            )
+            self.hosted_zone_ids[zone_name] = zone.hosted_zone_id
+            return zone
+        return route53.HostedZone.from_hosted_zone_attributes(scope, construct_id,
+            hosted_zone_id = self.hosted_zone_ids[zone_name],
+            zone_name = zone_name
+        )
+
+    def machine_image(self, scope: Construct, ami_name: str) -> ec2.IMachineImage:
+        """AMI ``ami_name`` in the region of ``scope``, looked up once per region."""
+        region = Stack.of(scope).region
+        ids = self.ami_ids.setdefault(ami_name, {})
+        if region not in ids:
+            ids[region] = ec2.MachineImage.lookup(name=ami_name).get_image(scope).image_id
+        return ec2.MachineImage.generic_linux({region: ids[region]})
@@ -6,15 +6,32 @@ from aws_cdk import (
     aws_autoscaling as autoscaling,
     aws_cloudwatch as cloudwatch,
     aws_sns as sns,    
-    aws_cloudwatch_actions as cloudwatch_actions
+    aws_cloudwatch_actions as cloudwatch_actions,
+    aws_ssm as ssm,
 )
 from constructs import Construct
 
+from rim_stacks.cloudfront_metrics import cloudfront_metric, distribution_id_parameter_name
+
+# Overridden key by key with the "WebAppLatencySlo" context: share of requests answered within
+# threshold_seconds, and (long window, short window, burn rate) pairs that page when both windows burn
+DEFAULT_LATENCY_SLO = {
+    "threshold_seconds": 0.5,
+    "objective_percent": 99,
+    "burn_rate_windows": [
+        {"long_minutes": 60, "short_minutes": 5, "burn_rate": 14.4},
+        {"long_minutes": 360, "short_minutes": 30, "burn_rate": 6}
+    ],
+    "anomaly_band_width": 2
+}
+
 class RimMonitoringStack(Stack):
 
     def __init__(self, scope: Construct, construct_id: str, owner: str, alb: elbv2.ApplicationLoadBalancer, asg: autoscaling.AutoScalingGroup, email: str, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        latency_slo = {**DEFAULT_LATENCY_SLO, **(self.node.try_get_context("WebAppLatencySlo") or {})}
+
         dashboard = cloudwatch.Dashboard(self, owner+"CdnDashboard",
             dashboard_name=owner+"_CDN_Dashboard",
             end="end",
@@ -100,6 +117,63 @@ class RimMonitoringStack(Stack):
         dashboard.add_widgets(elb_text_widget)
         dashboard.add_widgets(elb_request_count_widget, elb_active_connection_widget, elb_fixed_responses_widget)
         dashboard.add_widgets(elb_http_codes_widget, elb_target_error_widget)
+
+        elb_target_response_time_widget = cloudwatch.GraphWidget(
+            title = "ALB Target Response Time",
+            left = [
+                alb.metric_target_response_time(statistic = "p50", label = "p50"),
+                alb.metric_target_response_time(statistic = "p90", label = "p90", color = "#ffbf00"),
+                alb.metric_target_response_time(statistic = "p99", label = "p99", color = cloudwatch.Color.RED)
+            ],
+            left_annotations = [
+                cloudwatch.HorizontalAnnotation(value = latency_slo['threshold_seconds'], label = "SLO threshold")
+            ],
+            legend_position = cloudwatch.LegendPosition.RIGHT,
+            width = 12
+        )
+
+        elb_request_rate_per_target_widget = cloudwatch.GraphWidget(
+            title = "ALB Requests per Target",
+            left = [
+                cloudwatch.MathExpression(
+                    expression = "requests / hosts",
+                    using_metrics = {
+                        "requests": alb.metric_request_count(statistic = "Sum"),
+                        "hosts": cloudwatch.Metric(
+                            namespace="AWS/AutoScaling",
+                            metric_name="GroupInServiceInstances",
+                            dimensions_map={
+                                "AutoScalingGroupName": asg.auto_scaling_group_name
+                            }
+                        )
+                    },
+                    label = "Requests per target",
+                    color = cloudwatch.Color.BLUE
+                )
+            ],
+            legend_position = cloudwatch.LegendPosition.RIGHT,
+            width = 6
+        )
+
+        elb_error_rate_widget = cloudwatch.GraphWidget(
+            title = "ALB Error Rate %",
+            left = [
+                cloudwatch.MathExpression(
+                    expression = "100 * (FILL(target5xx, 0) + FILL(elb5xx, 0)) / requests",
+                    using_metrics = {
+                        "target5xx": alb.metric_http_code_target(code = elbv2.HttpCodeTarget.TARGET_5XX_COUNT, statistic = "Sum"),
+                        "elb5xx": alb.metric_http_code_elb(code = elbv2.HttpCodeElb.ELB_5XX_COUNT, statistic = "Sum"),
+                        "requests": alb.metric_request_count(statistic = "Sum")
+                    },
+                    label = "5xx %",
+                    color = cloudwatch.Color.RED
+                )
+            ],
+            legend_position = cloudwatch.LegendPosition.RIGHT,
+            width = 6
+        )
+
+        dashboard.add_widgets(elb_target_response_time_widget, elb_request_rate_per_target_widget, elb_error_rate_widget)
         
         asg_text_widget = cloudwatch.TextWidget(
             markdown="# ASG Metrics",
@@ -142,6 +216,76 @@ class RimMonitoringStack(Stack):
         dashboard.add_widgets(asg_text_widget)
         dashboard.add_widgets(asg_ec2_cpu_avg_widget, asg_in_service_instances_widget)        
 
+        # the distribution lives in RimCloudFrontStack in us-east-1, which copies its id into this
+        # region; a parameter resolved on every deployment follows a replaced distribution
+        distribution_id = ssm.StringParameter.value_for_string_parameter(self, distribution_id_parameter_name(owner))
+
+        cf_text_widget = cloudwatch.TextWidget(
+            markdown="# CloudFront Metrics",
+            width = 24
+        )
+
+        cf_cache_hit_rate_widget = cloudwatch.GraphWidget(
+            title = "CloudFront Cache Hit Rate",
+            left = [
+                cloudfront_metric(distribution_id, 'CacheHitRate',
+                    label = "Cache hit rate %",
+                    color = cloudwatch.Color.GREEN
+                )
+            ],
+            left_y_axis = cloudwatch.YAxisProps(min = 0, max = 100),
+            legend_position = cloudwatch.LegendPosition.RIGHT,
+            width = 6
+        )
+
+        cf_origin_latency_widget = cloudwatch.GraphWidget(
+            title = "CloudFront Origin Latency",
+            left = [
+                cloudfront_metric(distribution_id, 'OriginLatency', statistic = 'p50', label = "p50"),
+                cloudfront_metric(distribution_id, 'OriginLatency', statistic = 'p90', label = "p90", color = "#ffbf00"),
+                cloudfront_metric(distribution_id, 'OriginLatency', statistic = 'p99', label = "p99", color = cloudwatch.Color.RED)
+            ],
+            legend_position = cloudwatch.LegendPosition.RIGHT,
+            width = 6
+        )
+
+        cf_error_rate_widget = cloudwatch.GraphWidget(
+            title = "CloudFront Error Rate",
+            left = [
+                cloudfront_metric(distribution_id, '4xxErrorRate',
+                    label = "4xx %",
+                    color = "#ffbf00"
+                ),
+                cloudfront_metric(distribution_id, '5xxErrorRate',
+                    label = "5xx %",
+                    color = cloudwatch.Color.RED
+                )
+            ],
+            legend_position = cloudwatch.LegendPosition.RIGHT,
+            width = 6
+        )
+
+        cf_bytes_downloaded_widget = cloudwatch.GraphWidget(
+            title = "CloudFront Bytes Downloaded",
+            left = [
+                cloudfront_metric(distribution_id, 'BytesDownloaded', statistic = 'Sum',
+                    label = "Bytes downloaded",
+                    color = cloudwatch.Color.BLUE
+                )
+            ],
+            right = [
+                cloudfront_metric(distribution_id, 'Requests', statistic = 'Sum',
+                    label = "Requests",
+                    color = cloudwatch.Color.PURPLE
+                )
+            ],
+            legend_position = cloudwatch.LegendPosition.RIGHT,
+            width = 6
+        )
+
+        dashboard.add_widgets(cf_text_widget)
+        dashboard.add_widgets(cf_cache_hit_rate_widget, cf_origin_latency_widget, cf_error_rate_widget, cf_bytes_downloaded_widget)
+
         sns_topic = sns.Topic(self, owner+"CdnTopic",
             topic_name = owner+"CdnTopic",
             display_name = owner+"CdnTopic"
@@ -153,16 +297,6 @@ class RimMonitoringStack(Stack):
             endpoint = email,            
         )        
 
-        asg_ec2_cpu_avg_alarm = cloudwatch.Alarm(self, owner+"asg_ec2_cpu_avg_alarm",
-            alarm_name = owner+"asg_ec2_cpu_avg_alarm",
-            metric=asg_ec2_cpu_avg_metric,
-            comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
-            threshold=70,
-            evaluation_periods=1,            
-        )        
-
-        asg_ec2_cpu_avg_alarm.add_alarm_action(cloudwatch_actions.SnsAction(sns_topic))
-
         asg_in_service_instances_alarm = cloudwatch.Alarm(self, owner+"asg_in_service_instances_alarm",
             alarm_name = owner+"asg_in_service_instances_alarm",
             metric = asg_in_service_instances_metric,
@@ -172,3 +306,69 @@ class RimMonitoringStack(Stack):
         )
 
         asg_in_service_instances_alarm.add_alarm_action(cloudwatch_actions.SnsAction(sns_topic))
+
+        target_response_time_metric = cloudwatch.CfnAlarm.MetricProperty(
+            namespace = "AWS/ApplicationELB",
+            metric_name = "TargetResponseTime",
+            dimensions = [
+                cloudwatch.CfnAlarm.DimensionProperty(name = "LoadBalancer", value = alb.load_balancer_full_name)
+            ]
+        )
+
+        # Alarm only understands the plain and pNN statistics in this CDK version, hence the L1 alarms
+        cloudwatch.CfnAlarm(self, owner+"alb_latency_anomaly_alarm",
+            alarm_name = owner+"alb_latency_anomaly_alarm",
+            comparison_operator = "GreaterThanUpperThreshold",
+            evaluation_periods = 3,
+            threshold_metric_id = "band",
+            treat_missing_data = "notBreaching",
+            metrics = [
+                cloudwatch.CfnAlarm.MetricDataQueryProperty(
+                    id = "latency",
+                    metric_stat = cloudwatch.CfnAlarm.MetricStatProperty(
+                        metric = target_response_time_metric,
+                        period = 300,
+                        stat = "p90"
+                    ),
+                    return_data = True
+                ),
+                cloudwatch.CfnAlarm.MetricDataQueryProperty(
+                    id = "band",
+                    expression = "ANOMALY_DETECTION_BAND(latency, %s)"%latency_slo['anomaly_band_width'],
+                    return_data = True
+                )
+            ],
+            alarm_actions = [sns_topic.topic_arn]
+        )
+
+        # PR(:threshold) is the share of requests within the threshold, a window burns the error
+        # budget burn_rate times too fast when that share drops below 100 - burn_rate * budget
+        error_budget_percent = 100 - latency_slo['objective_percent']
+        # pairs may share a window length with different burn rates, so names carry the pair number
+        for pair, window in enumerate(latency_slo['burn_rate_windows'], start=1):
+            window_alarms = []
+            for window_minutes in [window['long_minutes'], window['short_minutes']]:
+                window_alarms.append(cloudwatch.CfnAlarm(self, owner+"alb_latency_slo_%d_%dm_alarm"%(pair, window_minutes),
+                    alarm_name = owner+"alb_latency_slo_%d_%dm_alarm"%(pair, window_minutes),
+                    namespace = target_response_time_metric.namespace,
+                    metric_name = target_response_time_metric.metric_name,
+                    dimensions = target_response_time_metric.dimensions,
+                    extended_statistic = "PR(:%s)"%latency_slo['threshold_seconds'],
+                    period = window_minutes*60,
+                    evaluation_periods = 1,
+                    comparison_operator = "LessThanThreshold",
+                    threshold = 100 - window['burn_rate']*error_budget_percent,
+                    treat_missing_data = "notBreaching"
+                ))
+
+            burn_rate_alarm = cloudwatch.CompositeAlarm(self, owner+"alb_latency_burn_rate_%d_%dm_alarm"%(pair, window['long_minutes']),
+                composite_alarm_name = owner+"alb_latency_burn_rate_%d_%dm_alarm"%(pair, window['long_minutes']),
+                alarm_rule = cloudwatch.AlarmRule.all_of(*[
+                    cloudwatch.AlarmRule.from_alarm(
+                        cloudwatch.Alarm.from_alarm_arn(self, alarm.node.id+"Ref", alarm.attr_arn),
+                        cloudwatch.AlarmState.ALARM
+                    ) for alarm in window_alarms
+                ])
+            )
+
+            burn_rate_alarm.add_alarm_action(cloudwatch_actions.SnsAction(sns_topic))
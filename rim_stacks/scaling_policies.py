@@ -0,0 +1,82 @@
+from aws_cdk import (
+    Duration,
+    Fn,
+    aws_autoscaling as autoscaling,
+    aws_elasticloadbalancingv2 as elbv2,
+)
+from constructs import Construct
+
+# Used when the "WebAppScalingPolicies" context is not set, matches the original CPU-only behaviour.
+DEFAULT_SCALING_POLICIES = {
+    "cpu": {"target_utilization_percent": 30}
+}
+
+def add_scaling_policies(scope: Construct, owner: str, asg: autoscaling.AutoScalingGroup, alb: elbv2.ApplicationLoadBalancer, tg: elbv2.ApplicationTargetGroup, policies: dict, estimated_instance_warmup: Duration, target_tracking_warmup: Duration = None) -> None:
+    """Attach the scaling policies selected in ``policies`` to ``asg``.
+
+    Supported keys are ``cpu`` and ``request_count`` (target tracking), ``response_time``
+    (step scaling on TargetResponseTime), ``schedule`` (list of scheduled actions) and
+    ``predictive`` (predictive scaling on ALBRequestCount). ``tg`` has to be attached to
+    ``alb`` before this is called. ``target_tracking_warmup`` overrides
+    ``estimated_instance_warmup`` for the target tracking policies only.
+    """
+    target_tracking_warmup = target_tracking_warmup or estimated_instance_warmup
+
+    if 'cpu' in policies:
+        asg.scale_on_cpu_utilization(owner+' Target Tracking Policy',
+            target_utilization_percent = policies['cpu']['target_utilization_percent'],
+            estimated_instance_warmup = target_tracking_warmup
+        )
+
+    if 'request_count' in policies:
+        asg.scale_on_request_count(owner+' Request Count Policy',
+            target_requests_per_minute = policies['request_count']['target_requests_per_minute'],
+            estimated_instance_warmup = target_tracking_warmup
+        )
+
+    if 'response_time' in policies:
+        response_time = policies['response_time']
+        asg.scale_on_metric(owner+' Response Time Policy',
+            metric = tg.metric_target_response_time(
+                statistic = response_time.get('statistic', 'p90'),
+                period = Duration.minutes(1)
+            ),
+            scaling_steps = [
+                autoscaling.ScalingInterval(
+                    lower = step.get('lower'),
+                    upper = step.get('upper'),
+                    change = step['change']
+                ) for step in response_time['steps']
+            ],
+            adjustment_type = autoscaling.AdjustmentType.CHANGE_IN_CAPACITY,
+            estimated_instance_warmup = estimated_instance_warmup
+        )
+
+    for index, scheduled in enumerate(policies.get('schedule', [])):
+        asg.scale_on_schedule(owner+' Scheduled Action %d'%index,
+            schedule = autoscaling.Schedule.cron(**scheduled['cron']),
+            min_capacity = scheduled.get('min_capacity'),
+            max_capacity = scheduled.get('max_capacity'),
+            desired_capacity = scheduled.get('desired_capacity'),
+            time_zone = scheduled.get('time_zone')
+        )
+
+    if 'predictive' in policies:
+        predictive = policies['predictive']
+        autoscaling.CfnScalingPolicy(scope, owner+'-predictive-scaling-policy',
+            auto_scaling_group_name = asg.auto_scaling_group_name,
+            policy_type = 'PredictiveScaling',
+            predictive_scaling_configuration = autoscaling.CfnScalingPolicy.PredictiveScalingConfigurationProperty(
+                mode = predictive.get('mode', 'ForecastOnly'),
+                scheduling_buffer_time = predictive.get('scheduling_buffer_time', estimated_instance_warmup.to_seconds()),
+                metric_specifications = [
+                    autoscaling.CfnScalingPolicy.PredictiveScalingMetricSpecificationProperty(
+                        target_value = predictive['target_requests_per_target'],
+                        predefined_metric_pair_specification = autoscaling.CfnScalingPolicy.PredictiveScalingPredefinedMetricPairProperty(
+                            predefined_metric_type = 'ALBRequestCount',
+                            resource_label = Fn.join('/', [alb.load_balancer_full_name, tg.target_group_full_name])
+                        )
+                    )
+                ]
+            )
+        )
@@ -0,0 +1,17 @@
+# stacks app.py can build, in deployment order
+STACK_NAMES = ['vpc', 'elb', 'bastion', 'cloudfront', 'monitoring', 'backup']
+
+def parse_selection(selection) -> list:
+    """Stack names picked by the "Stacks" context or the RIM_STACKS variable.
+
+    Accepts a list or a comma separated string, nothing selected means every stack.
+    The stacks a selected one needs are built anyway, they just are not asked for.
+    """
+    if not selection:
+        return list(STACK_NAMES)
+    if isinstance(selection, str):
+        selection = [name.strip() for name in selection.split(',') if name.strip()]
+    unknown = [name for name in selection if name not in STACK_NAMES]
+    if unknown:
+        raise ValueError('unknown stacks %s, expected some of %s'%(', '.join(unknown), ', '.join(STACK_NAMES)))
+    return [name for name in STACK_NAMES if name in selection]
@@ -0,0 +1,112 @@
+import functools
+
+import aws_cdk as cdk
+
+from rim_stacks.vpc_stack import RimVpcStack
+from rim_stacks.elb_app_stack import RimElbAppStack
+from rim_stacks.bastion_stack import RimBastionStack
+from rim_stacks.cloudfront_stack import RimCloudFrontStack
+from rim_stacks.monitoring_stack import RimMonitoringStack
+from rim_stacks.backup_stack import RimBackupStack
+from rim_stacks.stack_selection import parse_selection
+
+def build_stack_set(app: cdk.App, owner: str, rim_hosted_zone_name: str, webapp_token: str, email: str, account: str, regions: list, selection: list = None, latency_routing: bool = False) -> dict:
+    """Builds one owner's ``<Owner>Rim*Stack`` set in ``app`` and returns the stacks by selection name.
+
+    Only the ``selection`` stacks and the stacks they need are built, stacks of
+    ``regions`` after the first one get the region as a name suffix.
+    """
+    selection = parse_selection(selection)
+
+    #dodam dwa tagi ktore beda dodawane do wszystkich resource w mojej aplikacji
+    cdk.Tags.of(app).add("Creator", app.node.try_get_context("Creator"))
+    cdk.Tags.of(app).add("Project", app.node.try_get_context("Project"))
+
+    def env(region):
+        return cdk.Environment(account=account, region=region)
+
+    def stack_suffix(region):
+        # the primary region keeps the original stack names
+        return '' if region == regions[0] else '-'+region
+
+    @functools.lru_cache(maxsize=None)
+    def rim_vpc(region):
+        # For more information on 'env', see https://docs.aws.amazon.com/cdk/latest/guide/environments.html
+        return RimVpcStack(app, owner.capitalize()+"RimVpcStack"+stack_suffix(region),
+            env=env(region),
+            owner=owner
+        )
+
+    @functools.lru_cache(maxsize=None)
+    def rim_elb_app(region):
+        rimElbApp = RimElbAppStack(app, owner.capitalize()+"RimElbAppStack"+stack_suffix(region),
+            env=env(region),
+            owner=owner,
+            vpc = rim_vpc(region).vpc,
+            web_srv_sec_grp = rim_vpc(region).web_srv_sec_grp,
+            alb_sec_grp = rim_vpc(region).alb_sec_grp,
+            webapp_token = webapp_token,
+            rim_hosted_zone_name = rim_hosted_zone_name,
+            latency_routing = latency_routing
+        )
+        # the content bucket policy only lets the distribution whose id RimCloudFrontStack copies into this region read
+        if 'cloudfront' in selection and app.node.try_get_context("CloudFrontS3PathPatterns"):
+            rimElbApp.add_dependency(rim_cloudfront())
+        return rimElbApp
+
+    @functools.lru_cache(maxsize=None)
+    def rim_bastion():
+        return RimBastionStack(app, owner.capitalize()+"RimBastionStack",
+            env=env(regions[0]),
+            owner=owner,
+            vpc = rim_vpc(regions[0]).vpc,
+            bastion_sec_grp = rim_vpc(regions[0]).bastion_sec_grp
+        )
+
+    @functools.lru_cache(maxsize=None)
+    def rim_cloudfront():
+        return RimCloudFrontStack(app, owner.capitalize()+"RimCloudFrontStack",
+            env=env('us-east-1'),
+            owner=owner,
+            webapp_token = webapp_token,
+            rim_hosted_zone_name = rim_hosted_zone_name,
+            origin_region = regions[0],
+            multi_region = len(regions) > 1,
+            email = email,
+            parameter_regions = regions
+        )
+
+    @functools.lru_cache(maxsize=None)
+    def rim_monitoring():
+        rimMonitoring = RimMonitoringStack(app, owner.capitalize()+"RimMonitoringStack",
+            env=env(regions[0]),
+            owner=owner,
+            alb = rim_elb_app(regions[0]).alb,
+            asg = rim_elb_app(regions[0]).asg,
+            email = email
+        )
+        # the dashboard reads the distribution id that RimCloudFrontStack copies into this region,
+        # the dependency only orders deployments, so it is left out when CloudFront is not selected
+        if 'cloudfront' in selection:
+            rimMonitoring.add_dependency(rim_cloudfront())
+        return rimMonitoring
+
+    @functools.lru_cache(maxsize=None)
+    def rim_backup():
+        return RimBackupStack(app, owner.capitalize()+"RimBackupStack",
+            env=env(regions[0]),
+            owner=owner,
+            bastion_host = rim_bastion().bastion_host,
+            bucket = rim_elb_app(regions[0]).bucket,
+            email = email
+        )
+
+    builders = {
+        'vpc': lambda: [rim_vpc(region) for region in regions],
+        'elb': lambda: [rim_elb_app(region) for region in regions],
+        'bastion': rim_bastion,
+        'cloudfront': rim_cloudfront,
+        'monitoring': rim_monitoring,
+        'backup': rim_backup,
+    }
+    return {name: builders[name]() for name in selection}
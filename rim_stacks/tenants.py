@@ -0,0 +1,153 @@
+"""Parallel synth of many owners' stack sets from a tenants file.
+
+Every tenant gets its own cloud assembly, synthesized in its own process, so
+the wall time grows with tenants per core rather than with tenants::
+
+    python -m rim_stacks.tenants tenants.json --jobs 8 --stacks elb,cloudfront
+    cdk deploy --app cdk.out/tenants/<owner> --all
+
+The tenants file is a JSON list of objects with the ``Tenant`` fields, e.g.::
+
+    [{"owner": "student03", "hosted_zone_name": "rimcademy.net", "region": "eu-west-1",
+      "email": "ops@example.com", "min_capacity": 1, "max_capacity": 4,
+      "context": {"WebAppInstanceType": "t4g.small"}}]
+"""
+import argparse
+import concurrent.futures
+import dataclasses
+import json
+import multiprocessing
+import os
+import sys
+import time
+import typing
+
+from dotenv import load_dotenv
+
+CONTEXT_FILES = ('cdk.json', 'cdk.context.json')
+
+
+@dataclasses.dataclass(frozen=True)
+class Tenant:
+    owner: str
+    hosted_zone_name: str
+    region: str
+    email: typing.Optional[str] = None
+    account: typing.Optional[str] = None
+    min_capacity: int = 1
+    max_capacity: int = 4
+    # environment variable holding the CloudFront to ALB origin token, kept out of the file
+    webapp_token_env: str = 'WEBAPP_TOKEN'
+    # extra context, overriding cdk.json for this tenant only
+    context: dict = dataclasses.field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, values: dict) -> 'Tenant':
+        fields = {field.name: field for field in dataclasses.fields(cls)}
+        hints = typing.get_type_hints(cls)
+        unknown = sorted(set(values)-set(fields))
+        if unknown:
+            raise ValueError('unknown tenant settings %s'%', '.join(unknown))
+        missing = sorted(name for name, field in fields.items()
+            if name not in values and field.default is dataclasses.MISSING and field.default_factory is dataclasses.MISSING)
+        if missing:
+            raise ValueError('tenant %s misses %s'%(values.get('owner', '?'), ', '.join(missing)))
+        for name, value in values.items():
+            expected = tuple(hint for hint in typing.get_args(hints[name]) or (hints[name],))
+            # bool is an int, a capacity of true is still a mistake
+            if not isinstance(value, expected) or (isinstance(value, bool) and bool not in expected):
+                raise ValueError('tenant %s setting %s should be %s, not %r'%(values.get('owner', '?'), name, hints[name], value))
+        tenant = cls(**values)
+        if tenant.min_capacity > tenant.max_capacity:
+            raise ValueError('tenant %s min_capacity is above max_capacity'%tenant.owner)
+        return tenant
+
+    def app_context(self, base_context: dict) -> dict:
+        return {
+            **base_context,
+            'WebAppMinCapacity': self.min_capacity,
+            'WebAppMaxCapacity': self.max_capacity,
+            **self.context
+        }
+
+
+def load_tenants(file_name: str) -> list:
+    with open(file_name) as tenants_file:
+        tenants = [Tenant.from_dict(values) for values in json.load(tenants_file)]
+    owners = [tenant.owner for tenant in tenants]
+    duplicates = sorted(set(owner for owner in owners if owners.count(owner) > 1))
+    if duplicates:
+        raise ValueError('duplicate tenants %s'%', '.join(duplicates))
+    return tenants
+
+
+def base_context(directory: str = '.') -> dict:
+    """The context the cdk CLI would pass: cdk.json, then the cached lookups of cdk.context.json."""
+    context = {}
+    for file_name in CONTEXT_FILES:
+        path = os.path.join(directory, file_name)
+        if os.path.exists(path):
+            with open(path) as context_file:
+                values = json.load(context_file)
+            context.update(values.get('context', {}) if file_name == 'cdk.json' else values)
+    return context
+
+
+def synth_tenant(tenant: Tenant, context: dict, out_dir: str, selection: str = None) -> tuple:
+    """Synthesizes ``tenant``'s stack set into ``out_dir``, returns the owner, stack names and seconds taken."""
+    # imported in the worker, every process runs its own jsii runtime
+    import aws_cdk as cdk
+    from rim_stacks.stack_set import build_stack_set
+
+    webapp_token = os.getenv(tenant.webapp_token_env)
+    if not webapp_token:
+        raise ValueError('%s, the origin token of tenant %s, is not set'%(tenant.webapp_token_env, tenant.owner))
+
+    started = time.perf_counter()
+    context = tenant.app_context(context)
+    app = cdk.App(outdir=out_dir, context=context)
+    regions = context.get("WebAppRegions") or [tenant.region]
+    build_stack_set(app, tenant.owner, tenant.hosted_zone_name, webapp_token, tenant.email,
+        account = tenant.account or os.getenv('CDK_DEFAULT_ACCOUNT'),
+        regions = regions,
+        selection = selection or context.get("Stacks"),
+        latency_routing = context.get("WebAppRegions") is not None
+    )
+    assembly = app.synth()
+    return tenant.owner, sorted(stack.stack_name for stack in assembly.stacks), time.perf_counter()-started
+
+
+def synth_tenants(tenants: list, context: dict, out_dir: str, jobs: int = None, selection: str = None) -> list:
+    """Synthesizes every tenant into ``out_dir``/<owner>, ``jobs`` at a time, in tenants order."""
+    # spawned rather than forked, a forked worker would share the parent's jsii pipes
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [
+            pool.submit(synth_tenant, tenant, context, os.path.join(out_dir, tenant.owner), selection)
+            for tenant in tenants
+        ]
+        return [future.result() for future in futures]
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='Synthesize the Rim stack set of every tenant into its own cloud assembly.')
+    parser.add_argument('tenants', help='JSON list of tenants')
+    parser.add_argument('--out', default=os.path.join('cdk.out', 'tenants'), help='directory of the per tenant cloud assemblies')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='tenants synthesized at once')
+    parser.add_argument('--stacks', help='comma separated stacks to build, like the Stacks context')
+    parser.add_argument('--only', help='comma separated owners to synthesize')
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    tenants = load_tenants(args.tenants)
+    if args.only:
+        tenants = [tenant for tenant in tenants if tenant.owner in args.only.split(',')]
+
+    started = time.perf_counter()
+    for owner, stack_names, seconds in synth_tenants(tenants, base_context(), args.out, args.jobs, args.stacks):
+        print('%-20s %6.1fs %s'%(owner, seconds, ' '.join(stack_names)))
+    print('%d tenants in %.1fs'%(len(tenants), time.perf_counter()-started))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+import math
+
+from aws_cdk import (
+    CfnAutoScalingReplacingUpdate,
+    CfnAutoScalingRollingUpdate,
+    CfnAutoScalingScheduledAction,
+    CfnUpdatePolicy,
+    Duration,
+    Stack,
+    aws_autoscaling as autoscaling,
+    aws_cloudwatch as cloudwatch,
+    aws_ec2 as ec2,
+    aws_elasticloadbalancingv2 as elbv2,
+    aws_iam as iam,
+    custom_resources as cr,
+)
+from constructs import Construct
+
+# Overridden key by key with the "WebAppUpdatePolicy" context. With a minimum of 100% healthy capacity
+# replacements are launched and warmed up before the instances they replace are terminated.
+DEFAULT_UPDATE_POLICY = {
+    "type": "instance_refresh",
+    "min_healthy_percentage": 100,
+    "max_healthy_percentage": 200,
+    "max_batch_size": 1,
+    "pause_seconds": None,
+    "checkpoint_percentages": [50, 100],
+    "auto_rollback": True,
+    "rollback_5xx_threshold": 10
+}
+UPDATE_POLICY_TYPES = ('instance_refresh', 'rolling', 'replacing', 'none')
+# suspended while a rolling update replaces instances, as in the CDK rolling update default
+ROLLING_UPDATE_SUSPENDED_PROCESSES = [
+    autoscaling.ScalingProcess.HEALTH_CHECK,
+    autoscaling.ScalingProcess.REPLACE_UNHEALTHY,
+    autoscaling.ScalingProcess.AZ_REBALANCE,
+    autoscaling.ScalingProcess.ALARM_NOTIFICATION,
+    autoscaling.ScalingProcess.SCHEDULED_ACTIONS
+]
+
+def validate_update_policy(policy: dict) -> None:
+    if policy['type'] not in UPDATE_POLICY_TYPES:
+        raise ValueError('unknown update policy type %s, expected one of %s'%(policy['type'], ', '.join(UPDATE_POLICY_TYPES)))
+    if not 0 <= policy['min_healthy_percentage'] <= 100 or not 100 <= policy['max_healthy_percentage'] <= 200:
+        raise ValueError('healthy percentages have to be within 0-100 (minimum) and 100-200 (maximum)')
+    if policy['min_healthy_percentage'] == 100 and policy['max_healthy_percentage'] == 100:
+        raise ValueError('with 100% minimum healthy capacity the maximum has to leave room for replacements')
+    # only instance refreshes launch above the group's capacity
+    if policy['type'] == 'instance_refresh' and policy['max_healthy_percentage']-policy['min_healthy_percentage'] > 100:
+        raise ValueError('minimum and maximum healthy percentage can be at most 100 apart')
+    checkpoints = policy['checkpoint_percentages']
+    if checkpoints and (checkpoints != sorted(checkpoints) or checkpoints[-1] != 100):
+        raise ValueError('checkpoint percentages have to ascend and end with 100')
+    if policy['type'] == 'rolling' and policy['min_healthy_percentage'] == 100:
+        # the rolling update keeps a share of min_capacity in service, not of the running capacity
+        raise ValueError('rolling updates cannot keep 100% of the running capacity healthy, use instance_refresh or a lower min_healthy_percentage')
+
+def desired_configuration(lt: ec2.LaunchTemplate, mixed_instances: dict = None) -> dict:
+    """DesiredConfiguration of StartInstanceRefresh matching the group's launch template.
+
+    ``mixed_instances`` is the "WebAppMixedInstances" context merged with
+    ``rim_stacks.elb_app_stack.DEFAULT_INSTANCES_DISTRIBUTION``.
+    """
+    launch_template = {
+        'LaunchTemplateId': lt.launch_template_id,
+        'Version': lt.latest_version_number
+    }
+    if not mixed_instances:
+        return {'LaunchTemplate': launch_template}
+    return {
+        'MixedInstancesPolicy': {
+            'LaunchTemplate': {
+                'LaunchTemplateSpecification': launch_template,
+                'Overrides': [
+                    {'InstanceType': name, 'WeightedCapacity': str(weight)}
+                    for name, weight in mixed_instances['instance_types'].items()
+                ]
+            },
+            'InstancesDistribution': {
+                'OnDemandBaseCapacity': mixed_instances['on_demand_base_capacity'],
+                'OnDemandPercentageAboveBaseCapacity': mixed_instances['on_demand_percentage_above_base_capacity'],
+                # the API takes the CloudFormation spelling, e.g. capacity-optimized
+                'SpotAllocationStrategy': mixed_instances['spot_allocation_strategy'].lower().replace('_', '-')
+            }
+        }
+    }
+
+def add_update_policy(scope: Construct, owner: str, asg: autoscaling.AutoScalingGroup, lt: ec2.LaunchTemplate, tg: elbv2.ApplicationTargetGroup, policy: dict,
+        min_capacity: int, max_capacity: int, estimated_instance_warmup: Duration, mixed_instances: dict = None) -> list:
+    """Rolls out launch template changes to the running instances of ``asg``.
+
+    ``instance_refresh`` starts an instance refresh with checkpoints whenever the
+    launch template version changes, rolled back when one of the returned alarms
+    fires. ``rolling`` and ``replacing`` are the CloudFormation update policies,
+    which have neither checkpoints nor alarms. ``pause_seconds`` defaults to
+    ``estimated_instance_warmup``.
+
+    ``rolling`` keeps ``min_healthy_percentage`` of ``min_capacity`` in service,
+    so a group scaled out at peak can drop well below its running capacity;
+    only ``instance_refresh`` works from the running capacity.
+
+    The deployment only starts the instance refresh, whether the rollout
+    succeeds or is rolled back is not reported to the stack. A deployment while
+    a refresh is still in progress leaves that refresh running and skips the
+    new one, the launch template change then needs a refresh started by hand.
+    """
+    validate_update_policy(policy)
+    pause = Duration.seconds(policy['pause_seconds']) if policy['pause_seconds'] else estimated_instance_warmup
+    cfn_asg = asg.node.default_child
+
+    if policy['type'] == 'rolling':
+        cfn_asg.cfn_options.update_policy = CfnUpdatePolicy(
+            auto_scaling_rolling_update = CfnAutoScalingRollingUpdate(
+                max_batch_size = policy['max_batch_size'],
+                # CloudFormation launches extra instances rather than going below this
+                min_instances_in_service = min(math.ceil(min_capacity*policy['min_healthy_percentage']/100), max_capacity-1),
+                pause_time = pause.to_iso_string(),
+                suspend_processes = [process.value for process in ROLLING_UPDATE_SUSPENDED_PROCESSES]
+            ),
+            # scheduled scaling actions own the group sizes, not the template
+            auto_scaling_scheduled_action = CfnAutoScalingScheduledAction(ignore_unmodified_group_size_properties=True)
+        )
+        return []
+    if policy['type'] == 'replacing':
+        # a new group is created and filled before the old one is deleted
+        cfn_asg.cfn_options.update_policy = CfnUpdatePolicy(
+            auto_scaling_replacing_update = CfnAutoScalingReplacingUpdate(will_replace=True)
+        )
+        return []
+    if policy['type'] == 'none':
+        return []
+
+    alarms = []
+    if policy['auto_rollback']:
+        alarms = [
+            cloudwatch.Alarm(scope, owner+'-rollout-unhealthy-hosts-alarm',
+                metric = tg.metric_unhealthy_host_count(
+                    statistic = 'Maximum',
+                    period = Duration.minutes(1)
+                ),
+                comparison_operator = cloudwatch.ComparisonOperator.GREATER_THAN_OR_EQUAL_TO_THRESHOLD,
+                threshold = 1,
+                evaluation_periods = 2,
+                treat_missing_data = cloudwatch.TreatMissingData.NOT_BREACHING
+            ),
+            cloudwatch.Alarm(scope, owner+'-rollout-5xx-alarm',
+                metric = tg.metric_http_code_target(elbv2.HttpCodeTarget.TARGET_5XX_COUNT,
+                    statistic = 'Sum',
+                    period = Duration.minutes(1)
+                ),
+                comparison_operator = cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+                threshold = policy['rollback_5xx_threshold'],
+                evaluation_periods = 2,
+                treat_missing_data = cloudwatch.TreatMissingData.NOT_BREACHING
+            )
+        ]
+
+    preferences = {
+        'MinHealthyPercentage': policy['min_healthy_percentage'],
+        'MaxHealthyPercentage': policy['max_healthy_percentage'],
+        'InstanceWarmup': estimated_instance_warmup.to_seconds(),
+        # instances already running the desired configuration are left alone
+        'SkipMatching': True,
+        'AutoRollback': policy['auto_rollback']
+    }
+    if policy['checkpoint_percentages']:
+        preferences['CheckpointPercentages'] = policy['checkpoint_percentages']
+        preferences['CheckpointDelay'] = pause.to_seconds()
+    if alarms:
+        preferences['AlarmSpecification'] = {'Alarms': [alarm.alarm_name for alarm in alarms]}
+
+    stack = Stack.of(scope)
+    # the group already points at the new launch template version when the refresh starts,
+    # on create there is nothing to refresh
+    cr.AwsCustomResource(scope, owner+'-instance-refresh',
+        on_create = cr.AwsSdkCall(
+            service = 'AutoScaling',
+            action = 'describeInstanceRefreshes',
+            parameters = {
+                'AutoScalingGroupName': asg.auto_scaling_group_name,
+                'MaxRecords': 1
+            },
+            physical_resource_id = cr.PhysicalResourceId.of(owner+'-instance-refresh')
+        ),
+        on_update = cr.AwsSdkCall(
+            service = 'AutoScaling',
+            action = 'startInstanceRefresh',
+            parameters = {
+                'AutoScalingGroupName': asg.auto_scaling_group_name,
+                'Strategy': 'Rolling',
+                'DesiredConfiguration': desired_configuration(lt, mixed_instances),
+                'Preferences': preferences
+            },
+            # a refresh started by an earlier deployment keeps running, see the docstring
+            ignore_error_codes_matching = 'InstanceRefreshInProgress',
+            physical_resource_id = cr.PhysicalResourceId.of(owner+'-instance-refresh')
+        ),
+        policy = cr.AwsCustomResourcePolicy.from_statements([
+            iam.PolicyStatement(
+                actions = ['autoscaling:StartInstanceRefresh', 'autoscaling:DescribeInstanceRefreshes'],
+                resources = ['*']
+            ),
+            # validated against the launch template like UpdateAutoScalingGroup
+            iam.PolicyStatement(
+                actions = ['ec2:DescribeLaunchTemplates', 'ec2:DescribeLaunchTemplateVersions', 'ec2:RunInstances', 'ec2:CreateTags'],
+                resources = ['*']
+            ),
+            iam.PolicyStatement(
+                actions = ['iam:PassRole'],
+                resources = [stack.format_arn(service='iam', region='', resource='role', resource_name='*')],
+                conditions = {'StringEquals': {'iam:PassedToService': 'ec2.amazonaws.com'}}
+            )
+        ])
+    )
+    return alarms
@@ -8,11 +8,20 @@ from constructs import Construct
 
 class RimVpcStack(Stack):
 
+    @property
+    def availability_zones(self) -> list:
+        # pre-seeded "AvailabilityZones" ({region: [zones]}) skip the lookup for offline synths
+        zones = (self.node.try_get_context("AvailabilityZones") or {}).get(self.region)
+        return zones or super().availability_zones
+
     def __init__(self, scope: Construct, construct_id: str, owner: str,  **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
         
         max_azs = 2
         nat_gateways = 0
+        # the isolated web fleet reaches S3 and SSM through the endpoints only
+        web_app_isolated = self.node.try_get_context("WebAppIsolatedSubnets") or False
+        vpc_endpoints = self.node.try_get_context("VpcEndpoints") or web_app_isolated
         subnet_configuration=[
             ec2.SubnetConfiguration(name=owner.capitalize()+'Public', subnet_type=ec2.SubnetType.PUBLIC, cidr_mask=24),
             ec2.SubnetConfiguration(name=owner.capitalize()+'Isolated', subnet_type=ec2.SubnetType.PRIVATE_ISOLATED, cidr_mask=24)
@@ -31,17 +40,18 @@ class RimVpcStack(Stack):
             allow_all_outbound=True
         )
         
-        self.web_srv_sec_grp.add_ingress_rule(
-            peer=ec2.Peer.ipv4('0.0.0.0/0'), 
-            description='SSH access', 
-            connection=ec2.Port.tcp(22)    
-        )     
-        
-        self.web_srv_sec_grp.add_ingress_rule(
-            peer=ec2.Peer.ipv4('0.0.0.0/0'), 
-            description='HTTP access', 
-            connection=ec2.Port.tcp(80)
-        )
+        if not web_app_isolated:
+            self.web_srv_sec_grp.add_ingress_rule(
+                peer=ec2.Peer.ipv4('0.0.0.0/0'), 
+                description='SSH access', 
+                connection=ec2.Port.tcp(22)    
+            )     
+            
+            self.web_srv_sec_grp.add_ingress_rule(
+                peer=ec2.Peer.ipv4('0.0.0.0/0'), 
+                description='HTTP access', 
+                connection=ec2.Port.tcp(80)
+            )
         
         self.alb_sec_grp = ec2.SecurityGroup(self, owner+'-alb-sg', 
             vpc = self.vpc, 
@@ -69,4 +79,50 @@ class RimVpcStack(Stack):
             peer=ec2.Peer.ipv4('0.0.0.0/0'), 
             description='SSH access', 
             connection=ec2.Port.tcp(22)
-        )    
+        )
+
+        if web_app_isolated:
+            self.web_srv_sec_grp.add_ingress_rule(
+                peer = self.alb_sec_grp,
+                description = 'HTTP access from the ALB',
+                connection = ec2.Port.tcp(80)
+            )
+
+            self.web_srv_sec_grp.add_ingress_rule(
+                peer = self.bastion_sec_grp,
+                description = 'SSH access from the bastion',
+                connection = ec2.Port.tcp(22)
+            )
+
+        if vpc_endpoints:
+            # free, and keeps content pulls off the internet gateway
+            self.vpc.add_gateway_endpoint(owner.capitalize()+'S3Endpoint',
+                service = ec2.GatewayVpcEndpointAwsService.S3,
+                subnets = [
+                    ec2.SubnetSelection(subnet_type=ec2.SubnetType.PUBLIC),
+                    ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_ISOLATED)
+                ]
+            )
+
+            endpoint_sec_grp = ec2.SecurityGroup(self, owner+'-endpoint-sg',
+                vpc = self.vpc,
+                allow_all_outbound = False
+            )
+
+            endpoint_sec_grp.add_ingress_rule(
+                peer = ec2.Peer.ipv4(self.vpc.vpc_cidr_block),
+                description = 'HTTPS from the VPC',
+                connection = ec2.Port.tcp(443)
+            )
+
+            for name, service in [
+                ('Ssm', ec2.InterfaceVpcEndpointAwsService.SSM),
+                ('SsmMessages', ec2.InterfaceVpcEndpointAwsService.SSM_MESSAGES),
+                ('Ec2Messages', ec2.InterfaceVpcEndpointAwsService.EC2_MESSAGES)
+            ]:
+                self.vpc.add_interface_endpoint(owner.capitalize()+name+'Endpoint',
+                    service = service,
+                    subnets = ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_ISOLATED),
+                    security_groups = [endpoint_sec_grp],
+                    private_dns_enabled = True
+                )
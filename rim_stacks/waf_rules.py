@@ -0,0 +1,162 @@
+import re
+
+from aws_cdk import (
+    aws_wafv2 as wafv2,
+)
+
+# Used when the "WafRules" context is not set. Rate limits count requests per IP over five
+# minutes, scopes are "all", "static" (the CloudFront static and S3 path patterns) or "dynamic".
+DEFAULT_WAF_RULES = {
+    "rate_limits": [
+        {"name": "static", "scope": "static", "limit": 10000},
+        {"name": "dynamic", "scope": "dynamic", "limit": 300}
+    ],
+    "managed_rule_groups": [
+        # billed per inspected request, pages are where bots matter
+        {"name": "AWSManagedRulesBotControlRuleSet", "scope": "dynamic"},
+        {"name": "AWSManagedRulesCommonRuleSet", "scope": "all"}
+    ],
+    "max_wcu": 1500
+}
+
+# capacity of the AWS managed rule groups, others need an explicit "wcu"
+MANAGED_RULE_GROUP_WCU = {
+    'AWSManagedRulesBotControlRuleSet': 50,
+    'AWSManagedRulesCommonRuleSet': 700,
+    'AWSManagedRulesKnownBadInputsRuleSet': 200,
+    'AWSManagedRulesAmazonIpReputationList': 25,
+    'AWSManagedRulesAnonymousIpList': 50,
+    'AWSManagedRulesSQLiRuleSet': 200,
+    'AWSManagedRulesLinuxRuleSet': 200,
+}
+MANAGED_RULE_NAMES = {
+    'AWSManagedRulesBotControlRuleSet': 'bot-rule',
+    'AWSManagedRulesCommonRuleSet': 'aws-common-rule',
+}
+RATE_BASED_WCU = 2
+# EXACTLY, STARTS_WITH and ENDS_WITH without text transformations, CONTAINS costs more
+BYTE_MATCH_WCU = {'EXACTLY': 2, 'STARTS_WITH': 2, 'ENDS_WITH': 2, 'CONTAINS': 10}
+REGEX_MATCH_WCU = 3
+
+
+def path_regex(path_pattern: str) -> str:
+    """Anchored regex for a CloudFront path pattern, ``*`` matches any characters and ``?`` exactly one."""
+    return '^'+''.join('.*' if char == '*' else '.' if char == '?' else re.escape(char) for char in path_pattern)+'$'
+
+
+def path_match(path_pattern: str) -> tuple:
+    """Byte match statement and its WCU for a CloudFront path pattern.
+
+    The URI path is matched as sent, a mixed case path falls into the dynamic
+    class and gets the stricter treatment. Patterns with a ``?`` or a ``*``
+    anywhere but at their ends become a regex match.
+    """
+    pattern = path_pattern if path_pattern.startswith(('/', '*')) else '/'+path_pattern
+    if '?' in pattern or '*' in pattern.strip('*'):
+        return wafv2.CfnWebACL.StatementProperty(
+            regex_match_statement = wafv2.CfnWebACL.RegexMatchStatementProperty(
+                field_to_match = wafv2.CfnWebACL.FieldToMatchProperty(uri_path={}),
+                regex_string = path_regex(pattern),
+                text_transformations = [wafv2.CfnWebACL.TextTransformationProperty(priority=0, type='NONE')]
+            )
+        ), REGEX_MATCH_WCU
+    if pattern.startswith('*') and pattern.endswith('*'):
+        positional_constraint, search_string = 'CONTAINS', pattern.strip('*')
+    elif pattern.startswith('*'):
+        positional_constraint, search_string = 'ENDS_WITH', pattern[1:]
+    elif pattern.endswith('*'):
+        positional_constraint, search_string = 'STARTS_WITH', pattern[:-1]
+    else:
+        positional_constraint, search_string = 'EXACTLY', pattern
+    return wafv2.CfnWebACL.StatementProperty(
+        byte_match_statement = wafv2.CfnWebACL.ByteMatchStatementProperty(
+            field_to_match = wafv2.CfnWebACL.FieldToMatchProperty(uri_path={}),
+            positional_constraint = positional_constraint,
+            search_string = search_string,
+            text_transformations = [wafv2.CfnWebACL.TextTransformationProperty(priority=0, type='NONE')]
+        )
+    ), BYTE_MATCH_WCU[positional_constraint]
+
+
+def scope_down(scope: str, static_path_patterns: list) -> tuple:
+    """Scope-down statement and its WCU, None for rules inspecting every request."""
+    if scope == 'all':
+        return None, 0
+    if scope not in ('static', 'dynamic'):
+        raise ValueError('unknown WAF rule scope %s, expected all, static or dynamic'%scope)
+    matches = [path_match(path_pattern) for path_pattern in static_path_patterns]
+    wcu = sum(match_wcu for _, match_wcu in matches)
+    static = matches[0][0] if len(matches) == 1 else wafv2.CfnWebACL.StatementProperty(
+        or_statement = wafv2.CfnWebACL.OrStatementProperty(statements=[statement for statement, _ in matches])
+    )
+    if scope == 'static':
+        return static, wcu
+    return wafv2.CfnWebACL.StatementProperty(
+        not_statement = wafv2.CfnWebACL.NotStatementProperty(statement=static)
+    ), wcu
+
+
+def visibility_config(metric_name: str) -> wafv2.CfnWebACL.VisibilityConfigProperty:
+    return wafv2.CfnWebACL.VisibilityConfigProperty(
+        cloud_watch_metrics_enabled = True,
+        metric_name = metric_name,
+        sampled_requests_enabled = True
+    )
+
+
+def build_waf_rules(owner: str, config: dict, static_path_patterns: list) -> tuple:
+    """Web ACL rules for ``config`` and their total WCU.
+
+    Rate limits come first since they are the cheapest to evaluate. Raises
+    ValueError when the rules need more than ``max_wcu`` capacity units.
+    """
+    rules = []
+    wcu = 0
+
+    for rate_limit in config['rate_limits']:
+        statement, scope_wcu = scope_down(rate_limit.get('scope', 'all'), static_path_patterns)
+        name = owner+'-waf-acl-rate-'+rate_limit['name']
+        rules.append(wafv2.CfnWebACL.RuleProperty(
+            name = name,
+            priority = len(rules),
+            statement = wafv2.CfnWebACL.StatementProperty(
+                rate_based_statement = wafv2.CfnWebACL.RateBasedStatementProperty(
+                    aggregate_key_type = 'IP',
+                    limit = rate_limit['limit'],
+                    scope_down_statement = statement
+                )
+            ),
+            action = wafv2.CfnWebACL.RuleActionProperty(
+                block = wafv2.CfnWebACL.BlockActionProperty(
+                    custom_response = wafv2.CfnWebACL.CustomResponseProperty(
+                        response_code = 403
+                    )
+                ),
+            ),
+            visibility_config = visibility_config(name)
+        ))
+        wcu += RATE_BASED_WCU+scope_wcu
+
+    for group in config['managed_rule_groups']:
+        if 'wcu' not in group and group['name'] not in MANAGED_RULE_GROUP_WCU:
+            raise ValueError('WCU of managed rule group %s unknown, set "wcu"'%group['name'])
+        statement, scope_wcu = scope_down(group.get('scope', 'all'), static_path_patterns)
+        name = owner+'-waf-acl-'+MANAGED_RULE_NAMES.get(group['name'], group['name'].lower())
+        rules.append(wafv2.CfnWebACL.RuleProperty(
+            name = name,
+            priority = len(rules),
+            statement = wafv2.CfnWebACL.StatementProperty(
+                managed_rule_group_statement = wafv2.CfnWebACL.ManagedRuleGroupStatementProperty(
+                    name = group['name'],
+                    vendor_name = group.get('vendor_name', 'AWS'),
+                    scope_down_statement = statement
+                )
+            ),
+            override_action = wafv2.CfnWebACL.OverrideActionProperty(none={}),
+            visibility_config = visibility_config(name)
+        ))
+        wcu += group.get('wcu', MANAGED_RULE_GROUP_WCU.get(group['name']))+scope_wcu
+
+    if wcu > config['max_wcu']:
+        raise ValueError('WAF rules need %d WCU, more than the %d allowed'%(wcu, config['max_wcu']))
+    return rules, wcu
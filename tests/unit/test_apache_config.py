@@ -0,0 +1,91 @@
+import re
+
+import pytest
+
+from rim_stacks import asset_build
+from rim_stacks.apache_config import SYNC_EXCLUDES, mpm_settings, render_apache_config, render_user_data, smallest_instance_type
+
+
+def test_workers_fit_in_a_nano_instance():
+    settings = mpm_settings('t3a.nano')
+    assert settings['server_limit'] == 8
+    assert settings['max_request_workers'] == settings['server_limit']*settings['threads_per_child']
+
+
+def test_workers_grow_with_instance_memory():
+    assert mpm_settings('c7g.xlarge')['max_request_workers'] > mpm_settings('t3a.small')['max_request_workers'] > mpm_settings('t3a.nano')['max_request_workers']
+
+
+def test_unknown_instance_type_is_rejected():
+    with pytest.raises(ValueError):
+        mpm_settings('x1e.32xlarge')
+
+
+def test_rendered_config_enables_keepalive_compression_and_cache_headers():
+    config = render_apache_config('t3a.nano', html_max_age=30, keepalive_timeout=90)
+    assert 'MaxRequestWorkers       200' in config
+    assert 'KeepAliveTimeout 90' in config
+    assert 'AddOutputFilterByType DEFLATE text/html' in config
+    assert 'Header set Cache-Control "public, max-age=30"' in config
+    assert 'Header set Cache-Control "public, max-age=31536000, immutable"' in config
+
+
+def test_only_content_hashed_assets_are_immutable():
+    config = render_apache_config('t3a.nano')
+    pattern = re.search(r'<FilesMatch "(.+)">\s*Header set Cache-Control "public, max-age=31536000, immutable"', config).group(1)
+    assert re.search(pattern, 'css/site.0123456789.css') and re.search(pattern, 'js/app.abcdef0123.js.br')
+    assert not re.search(pattern, 'css/site.css') and not re.search(pattern, 'img/logo.png')
+
+
+def test_user_data_mounts_a_ram_docroot():
+    user_data = render_user_data('t3a.nano', 'content-bucket', docroot_tmpfs_mib=32)
+    assert "tmpfs /var/www/html tmpfs size=32m" in user_data
+    assert "ExecStartPre=-/usr/bin/aws s3 sync --only-show-errors --exclude '.rim-manifest.json' s3://content-bucket/ /var/www/html/\nRIM_EOF" in user_data
+    assert "a2enconf -q rim-tuning" in user_data
+
+
+def test_ram_docroot_is_seeded_from_the_baked_content():
+    unit = render_user_data('t3a.nano', 'content-bucket').split('rim-docroot.conf')[1]
+    seed = unit.index("cp -rpu /var/cache/rim-content/. /var/www/html/")
+    assert seed < unit.index("aws s3 sync")
+
+
+def test_user_data_without_ram_docroot():
+    assert 'tmpfs' not in render_user_data('t3a.nano', 'content-bucket', docroot_tmpfs_mib=0)
+
+
+def test_mixed_fleet_is_sized_for_its_smallest_member():
+    assert smallest_instance_type(['c7g.large', 't4g.small', 't4g.medium']) == 't4g.small'
+
+
+def test_precompressed_variants_are_served_when_accepted():
+    conf = render_apache_config('t3a.nano')
+    assert 'RewriteCond "%{REQUEST_FILENAME}.br" -f' in conf
+    assert 'RewriteRule "\\.css\\.(br|gz)$" "-" [T=text/css,E=no-gzip:1]' in conf
+    assert 'Header set Content-Encoding br' in conf
+    assert 'rewrite' in render_user_data('t3a.nano', 'bucket').split('a2enmod')[1].splitlines()[0]
+
+
+def test_docroot_sync_uses_the_regional_endpoint():
+    assert 'Environment=AWS_DEFAULT_REGION=eu-west-1\nExecStartPre=' in render_user_data('t3a.nano', 'bucket', region='eu-west-1')
+    assert 'AWS_DEFAULT_REGION' not in render_user_data('t3a.nano', 'bucket')
+
+
+def test_health_check_is_served_outside_the_docroot():
+    conf = render_apache_config('t3a.nano', health_check_path='/ping')
+    assert 'Alias "/ping" "/var/www/rim-health/healthz"' in conf
+    assert 'RewriteCond "/var/www/html/index.html" !-f' in conf
+    assert 'RewriteRule "^" "-" [R=503,L]' in conf
+    assert 'echo ok > /var/www/rim-health/healthz' in render_user_data('t3a.nano', 'bucket')
+
+
+
+def test_launch_hook_is_completed_once_healthy():
+    assert 'rim-lifecycle-hook' not in render_user_data('t3a.nano', 'bucket')
+    user_data = render_user_data('t3a.nano', 'bucket', region='eu-west-1', health_check_path='/ping', lifecycle_hook_name='test-launch-hook')
+    assert 'curl -sf -o /dev/null http://localhost/ping' in user_data
+    assert '--lifecycle-hook-name test-launch-hook' in user_data
+    assert user_data.endswith('systemctl enable --now rim-lifecycle-hook\n')
+
+def test_deployment_manifest_stays_out_of_the_docroot():
+    assert asset_build.MANIFEST_KEY in SYNC_EXCLUDES
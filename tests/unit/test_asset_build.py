@@ -0,0 +1,109 @@
+import gzip
+import os
+
+import aws_cdk as core
+import aws_cdk.aws_s3 as s3
+import brotli
+import pytest
+
+from rim_stacks import asset_build
+
+LOGO = b"\x89PNG logo"
+CSS = b"body { background: url('../img/logo.png'); }\n" + b"/* padding */\n"*100
+HTML = (
+    b'<html><head><link rel="stylesheet" href="/css/site.css?v=1"></head>'
+    b'<body><img src="img/logo.png"><a href="https://example.com/img/logo.png">x</a></body></html>\n'
+) + b"<!-- padding -->\n"*100
+
+
+@pytest.fixture
+def site(tmp_path):
+    source = tmp_path/"site"
+    for path, body in {"index.html": HTML, "css/site.css": CSS, "img/logo.png": LOGO, "error404.html": b"404"}.items():
+        (source/path).parent.mkdir(parents=True, exist_ok=True)
+        (source/path).write_bytes(body)
+    return source
+
+
+def build(source, tmp_path):
+    out = tmp_path/"out"
+    return out, asset_build.build_assets(str(source), str(out))
+
+
+def test_assets_get_content_hashed_names(site, tmp_path):
+    out, renamed = build(site, tmp_path)
+    assert set(renamed) == {"css/site.css", "img/logo.png"}
+    assert renamed["img/logo.png"] == "img/logo.%s.png"%asset_build.content_hash(LOGO)
+    assert (out/renamed["img/logo.png"]).read_bytes() == LOGO
+    assert not (out/"img/logo.png").exists()
+    assert (out/"index.html").exists()
+
+
+def test_references_are_rewritten(site, tmp_path):
+    out, renamed = build(site, tmp_path)
+    html = (out/"index.html").read_text()
+    assert 'href="/%s?v=1"'%renamed["css/site.css"] in html
+    assert 'src="%s"'%renamed["img/logo.png"] in html
+    assert 'href="https://example.com/img/logo.png"' in html
+    css = (out/renamed["css/site.css"]).read_text()
+    assert "url('../img/%s')"%renamed["img/logo.png"].split("/")[-1] in css
+
+
+def test_css_hash_follows_the_images_it_references(site, tmp_path):
+    _, before = build(site, tmp_path)
+    (site/"img/logo.png").write_bytes(LOGO+b"v2")
+    _, after = build(site, tmp_path)
+    assert before["css/site.css"] != after["css/site.css"]
+
+
+def test_precompressed_variants(site, tmp_path):
+    out, renamed = build(site, tmp_path)
+    html = (out/"index.html").read_bytes()
+    assert gzip.decompress((out/"index.html.gz").read_bytes()) == html
+    assert brotli.decompress((out/"index.html.br").read_bytes()) == html
+    assert (out/(renamed["css/site.css"]+".br")).exists()
+    # too small to be worth it, and not a text type
+    assert not (out/"error404.html.gz").exists()
+    assert not (out/(renamed["img/logo.png"]+".gz")).exists()
+
+
+def test_deployment_groups(site, tmp_path):
+    out, _ = build(site, tmp_path)
+    groups = asset_build.deployment_groups(str(out), html_max_age=30)
+    assert groups["*.html"] == ("public, max-age=30", None, None)
+    assert groups["*.html.br"] == ("public, max-age=30", "text/html", "br")
+    assert groups["*.css.gz"] == (asset_build.IMMUTABLE_CACHE_CONTROL, "text/css", "gzip")
+    assert groups["*.png"] == (asset_build.IMMUTABLE_CACHE_CONTROL, None, None)
+
+
+def test_manifest_describes_every_built_file(site, tmp_path):
+    out, renamed = build(site, tmp_path)
+    manifest = asset_build.write_manifest(str(out))
+    assert asset_build.MANIFEST_KEY not in manifest
+    assert set(manifest) == set(asset_build.built_files(str(out)))
+    assert manifest["index.html.br"]["content_encoding"] == "br"
+    assert manifest[renamed["img/logo.png"]]["prune"] is False
+    assert (out/asset_build.MANIFEST_KEY).exists()
+
+
+def test_variants_can_be_skipped(site, tmp_path):
+    out = tmp_path/"out"
+    asset_build.build_assets(str(site), str(out), precompress=False)
+    assert (out/"index.html").exists()
+    assert not list(out.rglob("*.gz")) and not list(out.rglob("*.br"))
+
+
+def test_deployments_build_into_their_own_directories(site, tmp_path):
+    other = tmp_path/"other"/"site"
+    other.mkdir(parents=True)
+    (other/"index.html").write_bytes(b"other")
+    app = core.App()
+    stack = core.Stack(app, "TestStack")
+    bucket = s3.Bucket(stack, "Bucket")
+    first = asset_build.RimAssetDeployment(stack, "First", owner="test", bucket=bucket, source_dir=str(site))
+    second = asset_build.RimAssetDeployment(stack, "Second", owner="test", bucket=bucket, source_dir=str(other))
+    assert first.out_dir != second.out_dir
+    assert first.out_dir.startswith(app.outdir)
+    with open(os.path.join(second.out_dir, "index.html"), "rb") as built:
+        assert built.read() == b"other"
+    assert os.path.exists(os.path.join(first.out_dir, "index.html.br"))
@@ -0,0 +1,112 @@
+import aws_cdk as core
+import aws_cdk.assertions as assertions
+import pytest
+
+from rim_stacks.vpc_stack import RimVpcStack
+from rim_stacks.elb_app_stack import RimElbAppStack
+from rim_stacks.bastion_stack import RimBastionStack
+from rim_stacks.backup_stack import RimBackupStack, backup_windows, restore_testing_name
+
+
+def synth_backup_stack(context=None, **kwargs):
+    app = core.App(context=context)
+    env = core.Environment(account='123456789012', region='eu-west-1')
+    vpc_stack = RimVpcStack(app, "TestRimVpcStack",
+        env=env,
+        owner='test'
+    )
+    elb_app_stack = RimElbAppStack(app, "TestRimElbAppStack",
+        env=env,
+        owner='test',
+        vpc=vpc_stack.vpc,
+        web_srv_sec_grp=vpc_stack.web_srv_sec_grp,
+        alb_sec_grp=vpc_stack.alb_sec_grp,
+        webapp_token='token',
+        rim_hosted_zone_name='example.com'
+    )
+    bastion_stack = RimBastionStack(app, "TestRimBastionStack",
+        env=env,
+        owner='test',
+        vpc=vpc_stack.vpc,
+        bastion_sec_grp=vpc_stack.bastion_sec_grp
+    )
+    stack = RimBackupStack(app, "TestRimBackupStack",
+        env=env,
+        owner='test',
+        bastion_host=bastion_stack.bastion_host,
+        bucket=elb_app_stack.bucket,
+        **kwargs
+    )
+    return assertions.Template.from_stack(stack)
+
+
+@pytest.fixture(scope="module")
+def template():
+    return synth_backup_stack(email='ops@example.com')
+
+
+def backup_rules(template):
+    return {
+        plan["Properties"]["BackupPlan"]["BackupPlanName"]: plan["Properties"]["BackupPlan"]["BackupPlanRule"][0]
+        for plan in template.find_resources("AWS::Backup::BackupPlan").values()
+    }
+
+
+def test_default_backup_windows(template):
+    rules = backup_rules(template)
+    assert rules["test-backup-plan"]["ScheduleExpression"] == "cron(10 4 * * ? *)"
+    assert rules["test-s3-backup-plan"]["ScheduleExpression"] == "cron(0 5 * * ? *)"
+    assert rules["test-s3-backup-plan"]["EnableContinuousBackup"] is True
+
+
+def test_backup_windows_are_configurable():
+    template = synth_backup_stack({"BackupWindows": {"ec2": {"hour": "22", "minute": "0", "completion_window_hours": 6}}})
+    rule = backup_rules(template)["test-backup-plan"]
+    assert rule["ScheduleExpression"] == "cron(0 22 * * ? *)"
+    assert rule["StartWindowMinutes"] == 60
+    assert rule["CompletionWindowMinutes"] == 360
+
+
+def test_completion_window_has_to_outlast_the_start_window():
+    with pytest.raises(ValueError):
+        backup_windows({"s3": {"start_window_hours": 4, "completion_window_hours": 4}})
+
+
+def test_restore_testing_covers_both_selections(template):
+    template.has_resource_properties("AWS::Backup::RestoreTestingPlan", {
+        "RestoreTestingPlanName": "test_restore_testing",
+        "ScheduleExpression": "cron(30 2 ? * SUN *)",
+        "RecoveryPointSelection": assertions.Match.object_like({
+            "Algorithm": "LATEST_WITHIN_WINDOW",
+            "RecoveryPointTypes": ["CONTINUOUS", "SNAPSHOT"]
+        })
+    })
+    selections = template.find_resources("AWS::Backup::RestoreTestingSelection")
+    assert sorted(selection["Properties"]["ProtectedResourceType"] for selection in selections.values()) == ["EC2", "S3"]
+
+
+def test_restore_testing_names_are_sanitized():
+    assert restore_testing_name('dw-test.1') == 'dw_test_1_restore_testing'
+
+
+def test_restore_duration_alarms(template):
+    template.has_resource_properties("AWS::Events::Rule", {
+        "EventPattern": {
+            "source": ["aws.backup"],
+            "detail-type": ["Restore Job State Change"],
+            "detail": {"status": ["COMPLETED"]}
+        }
+    })
+    template.has_resource_properties("AWS::CloudWatch::Alarm", {
+        "Namespace": "Rim/Backup",
+        "MetricName": "RestoreDuration",
+        "Dimensions": [{"Name": "ResourceType", "Value": "S3"}],
+        "Threshold": 3600
+    })
+    template.resource_count_is("AWS::SNS::Subscription", 1)
+
+
+def test_restore_testing_can_be_disabled():
+    template = synth_backup_stack({"RestoreTesting": {"enabled": False}})
+    template.resource_count_is("AWS::Backup::RestoreTestingPlan", 0)
+    template.resource_count_is("AWS::CloudWatch::Alarm", 0)
@@ -0,0 +1,252 @@
+import json
+
+import aws_cdk as core
+import aws_cdk.assertions as assertions
+import pytest
+
+from rim_stacks.cloudfront_stack import RimCloudFrontStack, origin_render_order
+
+
+def synth_cloudfront_stack(context=None):
+    app = core.App(context=context)
+    stack = RimCloudFrontStack(app, "TestRimCloudFrontStack",
+        env=core.Environment(account='123456789012', region='us-east-1'),
+        owner='test',
+        webapp_token='token',
+        rim_hosted_zone_name='example.com',
+        origin_region='eu-west-1'
+    )
+    return assertions.Template.from_stack(stack)
+
+
+def distribution_config(template):
+    distribution = list(template.find_resources("AWS::CloudFront::Distribution").values())[0]
+    return distribution["Properties"]["DistributionConfig"]
+
+
+@pytest.fixture(scope="module")
+def template():
+    return synth_cloudfront_stack()
+
+
+def test_static_cache_policy_is_long_lived_and_compressed(template):
+    template.has_resource_properties("AWS::CloudFront::CachePolicy", {
+        "CachePolicyConfig": assertions.Match.object_like({
+            "Name": "test-static-cache-policy",
+            "DefaultTTL": 365*24*3600,
+            "ParametersInCacheKeyAndForwardedToOrigin": {
+                "EnableAcceptEncodingGzip": True,
+                "EnableAcceptEncodingBrotli": True,
+                "HeadersConfig": {"HeaderBehavior": "none"},
+                "CookiesConfig": {"CookieBehavior": "none"},
+                "QueryStringsConfig": {"QueryStringBehavior": "none"},
+            }
+        })
+    })
+
+
+def test_html_cache_policy_is_short_lived(template):
+    template.has_resource_properties("AWS::CloudFront::CachePolicy", {
+        "CachePolicyConfig": assertions.Match.object_like({
+            "Name": "test-html-cache-policy",
+            "DefaultTTL": 60,
+            "MaxTTL": 300,
+        })
+    })
+
+
+def test_static_paths_have_their_own_behaviors(template):
+    distribution = list(template.find_resources("AWS::CloudFront::Distribution").values())[0]
+    config = distribution["Properties"]["DistributionConfig"]
+    assert config["DefaultCacheBehavior"]["Compress"] is True
+    patterns = [behavior["PathPattern"] for behavior in config["CacheBehaviors"]]
+    assert "*.css" in patterns and "*.js" in patterns
+    assert all(behavior["Compress"] for behavior in config["CacheBehaviors"])
+
+
+def test_origins_use_origin_shield_and_tuned_connections(template):
+    distribution = list(template.find_resources("AWS::CloudFront::Distribution").values())[0]
+    origins = distribution["Properties"]["DistributionConfig"]["Origins"]
+    assert len(origins) == 2
+    for origin in origins:
+        assert origin["OriginShield"] == {"Enabled": True, "OriginShieldRegion": "eu-west-1"}
+        assert origin["ConnectionAttempts"] == 2
+        assert origin["ConnectionTimeout"] == 5
+    http_origin = [origin for origin in origins if "CustomOriginConfig" in origin][0]
+    assert http_origin["CustomOriginConfig"]["OriginKeepaliveTimeout"] == 60
+    assert http_origin["CustomOriginConfig"]["OriginReadTimeout"] == 30
+
+
+def test_s3_paths_bypass_the_alb_through_oac():
+    template = synth_cloudfront_stack({"CloudFrontS3PathPatterns": ["*.css", "/static/*"]})
+    template.resource_count_is("AWS::CloudFront::OriginAccessControl", 1)
+    config = distribution_config(template)
+    s3_origins = [origin for origin in config["Origins"] if "OriginAccessControlId" in origin]
+    assert len(s3_origins) == 1
+    assert s3_origins[0]["S3OriginConfig"]["OriginAccessIdentity"] == ""
+    assert s3_origins[0]["DomainName"]["Fn::Join"][1][0] == "test-webapp-content-123456789012-eu-west-1.s3.eu-west-1."
+    behaviors = {behavior["PathPattern"]: behavior["TargetOriginId"] for behavior in config["CacheBehaviors"]}
+    assert behaviors["*.css"] == s3_origins[0]["Id"]
+    assert behaviors["/static/*"] == s3_origins[0]["Id"]
+    assert behaviors["*.js"] != s3_origins[0]["Id"]
+
+
+def test_full_static_mode_moves_default_behavior_to_s3():
+    template = synth_cloudfront_stack({"CloudFrontS3PathPatterns": ["*"]})
+    config = distribution_config(template)
+    assert "OriginAccessControlId" in config["Origins"][0]
+    assert config["DefaultCacheBehavior"]["TargetOriginId"] == config["Origins"][0]["Id"]
+
+
+def test_origin_render_order_follows_first_use():
+    alb, alt, content, standby, alb_group, content_group = (object() for _ in range(6))
+    groups = [(alb_group, alb, alt), (content_group, content, standby)]
+    assert origin_render_order([alb_group, content_group, alb_group, content_group], groups) == [alb, alt, content, standby]
+    assert origin_render_order([content, alb_group, content], groups[:1]) == [content, alb, alt]
+
+
+def test_content_standby_is_the_fallback_s3_origin():
+    template = synth_cloudfront_stack({"CloudFrontS3PathPatterns": ["*.css"], "WebAppContentStandby": True})
+    config = distribution_config(template)
+    s3_origins = {origin["DomainName"]["Fn::Join"][1][0].split('.')[0]: origin for origin in config["Origins"] if "OriginAccessControlId" in origin}
+    assert sorted(s3_origins) == ["test-webapp-content-123456789012-eu-west-1", "test-webapp-standby-123456789012-eu-west-1"]
+    group = [group for group in config["OriginGroups"]["Items"]
+        if group["Members"]["Items"][0]["OriginId"] == s3_origins["test-webapp-content-123456789012-eu-west-1"]["Id"]][0]
+    assert group["Members"]["Items"][1]["OriginId"] == s3_origins["test-webapp-standby-123456789012-eu-west-1"]["Id"]
+    behaviors = {behavior["PathPattern"]: behavior["TargetOriginId"] for behavior in config["CacheBehaviors"]}
+    assert behaviors["*.css"] == group["Id"]
+
+
+def test_distribution_id_is_copied_to_the_origin_region(template):
+    copy = list(template.find_resources("Custom::AWS").values())[0]["Properties"]
+    update = json.dumps(copy["Update"])
+    # the call changes, and runs again, whenever the distribution is replaced
+    assert 'putParameter' in update and '"Ref": "testdistribution' in update
+    assert 'region\\":\\"eu-west-1' in update
+    assert "deleteParameter" in json.dumps(copy["Delete"])
+
+
+def test_distribution_id_is_copied_to_every_parameter_region():
+    app = core.App()
+    stack = RimCloudFrontStack(app, "TestRimCloudFrontStack",
+        env=core.Environment(account='123456789012', region='us-east-1'),
+        owner='test',
+        webapp_token='token',
+        rim_hosted_zone_name='example.com',
+        origin_region='eu-west-1',
+        parameter_regions=['eu-west-1', 'eu-central-1', 'us-east-1']
+    )
+    updates = [json.dumps(copy["Properties"]["Update"]) for copy in assertions.Template.from_stack(stack).find_resources("Custom::AWS").values()]
+    assert sorted(region for region in ['eu-west-1', 'eu-central-1', 'us-east-1'] if any('region\\":\\"'+region in update for update in updates)) == ['eu-central-1', 'eu-west-1']
+    assert len(updates) == 2
+
+
+def test_multi_region_origins_skip_origin_shield():
+    app = core.App()
+    stack = RimCloudFrontStack(app, "TestRimCloudFrontStack",
+        env=core.Environment(account='123456789012', region='us-east-1'),
+        owner='test',
+        webapp_token='token',
+        rim_hosted_zone_name='example.com',
+        origin_region='eu-west-1',
+        multi_region=True
+    )
+    config = distribution_config(assertions.Template.from_stack(stack))
+    assert all("OriginShield" not in origin for origin in config["Origins"])
+
+
+def test_additional_metrics_and_edge_alarms(template):
+    template.has_resource_properties("AWS::CloudFront::MonitoringSubscription", {
+        "MonitoringSubscription": {
+            "RealtimeMetricsSubscriptionConfig": {"RealtimeMetricsSubscriptionStatus": "Enabled"}
+        }
+    })
+    template.has_resource_properties("AWS::SSM::Parameter", {
+        "Name": "/test/cloudfront/distribution-id"
+    })
+    template.has_resource_properties("AWS::CloudWatch::Alarm", {
+        "MetricName": "CacheHitRate",
+        "ComparisonOperator": "LessThanThreshold",
+        "Threshold": 70
+    })
+    template.has_resource_properties("AWS::CloudWatch::Alarm", {
+        "MetricName": "OriginLatency",
+        "ExtendedStatistic": "p90"
+    })
+    template.resource_count_is("AWS::CloudWatch::Alarm", 4)
+
+
+def test_access_logs_are_optional(template):
+    assert "Logging" not in distribution_config(template)
+
+    logged = synth_cloudfront_stack({"AccessLogs": True})
+    logging = distribution_config(logged)["Logging"]
+    assert logging["Prefix"] == "cloudfront/"
+    logged.has_resource_properties("AWS::S3::Bucket", {
+        "OwnershipControls": {"Rules": [{"ObjectOwnership": "BucketOwnerPreferred"}]},
+        "LifecycleConfiguration": {"Rules": [{"ExpirationInDays": 30, "Status": "Enabled"}]}
+    })
+
+
+def test_failover_content_is_deployed_per_file_type(template):
+    deployments = template.find_resources("Custom::CDKBucketDeployment")
+    metadata = {
+        deployment["Properties"]["Include"][0]: deployment["Properties"]["SystemMetadata"]
+        for deployment in deployments.values()
+    }
+    assert metadata["*.html"] == {"cache-control": "public, max-age=60"}
+    # the pages are too small for precompressed variants
+    assert list(metadata) == ["*.html"]
+
+
+def test_incremental_failover_deployment_invalidates_the_distribution():
+    template = synth_cloudfront_stack({"AssetDeployment": {"incremental": True}})
+    template.resource_count_is("Custom::CDKBucketDeployment", 0)
+    template.has_resource_properties("Custom::RimIncrementalDeployment", {
+        "DistributionId": {"Ref": assertions.Match.string_like_regexp("distribution")}
+    })
+
+
+def test_viewer_requests_are_normalized(template):
+    template.has_resource_properties("AWS::CloudFront::Function", {
+        "AutoPublish": True,
+        "FunctionConfig": {"Runtime": "cloudfront-js-1.0"}
+    })
+    config = distribution_config(template)
+    for behavior in [config["DefaultCacheBehavior"]]+config["CacheBehaviors"]:
+        assert behavior["FunctionAssociations"][0]["EventType"] == "viewer-request"
+
+    disabled = synth_cloudfront_stack({"CloudFrontUrlNormalization": {"enabled": False}})
+    disabled.resource_count_is("AWS::CloudFront::Function", 0)
+
+
+def test_waf_rules_are_scoped_and_tiered(template):
+    acl = list(template.find_resources("AWS::WAFv2::WebACL").values())[0]["Properties"]
+    rules = {rule["Name"]: rule for rule in acl["Rules"]}
+    static = rules["test-waf-acl-rate-static"]["Statement"]["RateBasedStatement"]
+    dynamic = rules["test-waf-acl-rate-dynamic"]["Statement"]["RateBasedStatement"]
+    assert static["Limit"] > dynamic["Limit"]
+    assert "OrStatement" in static["ScopeDownStatement"]
+    assert "NotStatement" in dynamic["ScopeDownStatement"]
+    bot = rules["test-waf-acl-bot-rule"]["Statement"]["ManagedRuleGroupStatement"]
+    assert "NotStatement" in bot["ScopeDownStatement"]
+
+
+def test_s3_paths_are_static_for_the_waf():
+    template = synth_cloudfront_stack({"CloudFrontS3PathPatterns": ["*", "*.css", "/docs/*"]})
+    acl = list(template.find_resources("AWS::WAFv2::WebACL").values())[0]["Properties"]
+    static = [rule for rule in acl["Rules"] if rule["Name"] == "test-waf-acl-rate-static"][0]
+    statements = static["Statement"]["RateBasedStatement"]["ScopeDownStatement"]["OrStatement"]["Statements"]
+    search_strings = [statement["ByteMatchStatement"]["SearchString"] for statement in statements]
+    assert search_strings.count(".css") == 1 and search_strings[-1] == "/docs/"
+
+
+def test_s3_paths_need_the_origin_region():
+    app = core.App(context={"CloudFrontS3PathPatterns": ["*.css"]})
+    with pytest.raises(ValueError):
+        RimCloudFrontStack(app, "TestRimCloudFrontStack",
+            env=core.Environment(account='123456789012', region='us-east-1'),
+            owner='test',
+            webapp_token='token',
+            rim_hosted_zone_name='example.com'
+        )
@@ -0,0 +1,55 @@
+import importlib.util
+import json
+
+spec = importlib.util.spec_from_file_location("content_sync", "files/lambda/content_sync/index.py")
+content_sync = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(content_sync)
+
+
+def s3_record(event_name, key, sequencer, bucket='content'):
+    return {
+        "eventSource": "aws:s3",
+        "eventName": event_name,
+        "s3": {"bucket": {"name": bucket}, "object": {"key": key, "sequencer": sequencer}}
+    }
+
+
+def test_last_event_per_key_wins():
+    changes = content_sync.change_set([
+        s3_record("ObjectCreated:Put", "index.html", "0A"),
+        s3_record("ObjectRemoved:DeleteMarkerCreated", "index.html", "0B"),
+        s3_record("ObjectCreated:Put", "about.html", "0F"),
+        s3_record("ObjectRemoved:Delete", "about.html", "0E"),
+    ])
+    assert changes == {"index.html": ("delete", "content"), "about.html": ("put", "content")}
+
+
+def test_keys_are_url_decoded():
+    changes = content_sync.change_set([s3_record("ObjectCreated:Put", "img/my+photo%281%29.png", "01")])
+    assert list(changes) == ["img/my photo(1).png"]
+
+
+def test_commands_copy_and_remove_inside_docroot():
+    commands = content_sync.commands({
+        "index.html": ("put", "content"),
+        "old page.html": ("delete", "content"),
+        "../etc/passwd": ("put", "content"),
+        ".rim-manifest.json": ("put", "content"),
+    }, docroot='/var/www/html')
+    assert commands == [
+        "aws s3 cp s3://content/index.html /var/www/html/index.html",
+        "rm -f '/var/www/html/old page.html'",
+    ]
+
+
+def test_sqs_messages_are_unwrapped():
+    event = {"Records": [
+        {"body": json.dumps({"Records": [s3_record("ObjectCreated:Put", "index.html", "01")]})},
+        {"body": json.dumps({"Event": "s3:TestEvent"})},
+    ]}
+    assert [record["s3"]["object"]["key"] for record in content_sync.s3_records(event)] == ["index.html"]
+
+
+def test_commands_pin_the_regional_s3_endpoint():
+    commands = content_sync.commands({"index.html": ("put", "content")}, docroot='/var/www/html', region='eu-west-1')
+    assert commands == ["aws s3 cp --region eu-west-1 s3://content/index.html /var/www/html/index.html"]
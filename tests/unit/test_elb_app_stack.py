@@ -0,0 +1,443 @@
+import json
+
+import aws_cdk as core
+import aws_cdk.assertions as assertions
+import pytest
+
+from rim_stacks.vpc_stack import RimVpcStack
+from rim_stacks.elb_app_stack import RimElbAppStack
+
+
+def synth_elb_app_stack(context=None, region='eu-west-1', **kwargs):
+    app = core.App(context=context)
+    env = core.Environment(account='123456789012', region=region)
+    vpc_stack = RimVpcStack(app, "TestRimVpcStack",
+        env=env,
+        owner='test'
+    )
+    stack = RimElbAppStack(app, "TestRimElbAppStack",
+        env=env,
+        owner='test',
+        vpc=vpc_stack.vpc,
+        web_srv_sec_grp=vpc_stack.web_srv_sec_grp,
+        alb_sec_grp=vpc_stack.alb_sec_grp,
+        webapp_token='token',
+        rim_hosted_zone_name='example.com',
+        **kwargs
+    )
+    return assertions.Template.from_stack(stack)
+
+
+@pytest.fixture(scope="module")
+def template():
+    return synth_elb_app_stack()
+
+
+def test_launch_template_uses_golden_ami(template):
+    template.resource_count_is("AWS::ImageBuilder::Image", 1)
+    image_id = list(template.find_resources("AWS::ImageBuilder::Image").keys())[0]
+    template.has_resource_properties("AWS::EC2::LaunchTemplate", {
+        "LaunchTemplateData": assertions.Match.object_like({
+            "ImageId": {"Fn::GetAtt": [image_id, "ImageId"]}
+        })
+    })
+
+    # baked outside the docroot, which the user data may mount a tmpfs over
+    component = list(template.find_resources("AWS::ImageBuilder::Component").values())[0]["Properties"]
+    assert "/var/cache/rim-content/" in str(component["Data"]) and "/var/www/html" not in str(component["Data"])
+    assert component["Version"] == "1.1.0"
+
+
+def test_golden_ami_shortens_warmup(template):
+    template.has_resource_properties("AWS::AutoScaling::ScalingPolicy", {
+        "PolicyType": "TargetTrackingScaling",
+        "EstimatedInstanceWarmup": 60
+    })
+
+
+def test_boot_time_install_without_golden_ami():
+    template = synth_elb_app_stack({"WebAppGoldenAmi": False})
+    template.resource_count_is("AWS::ImageBuilder::Image", 0)
+    template.has_resource_properties("AWS::AutoScaling::ScalingPolicy", {
+        "EstimatedInstanceWarmup": 240
+    })
+
+
+def test_warm_pool_is_optional():
+    template = synth_elb_app_stack({"WebAppWarmPool": {"min_size": 2, "max_group_prepared_capacity": 3, "pool_state": "HIBERNATED"}})
+    template.has_resource_properties("AWS::AutoScaling::WarmPool", {
+        "MinSize": 2,
+        "MaxGroupPreparedCapacity": 3,
+        "PoolState": "Hibernated",
+        "InstanceReusePolicy": {"ReuseOnScaleIn": True}
+    })
+    template.has_resource_properties("AWS::EC2::LaunchTemplate", {
+        "LaunchTemplateData": assertions.Match.object_like({
+            "HibernationOptions": {"Configured": True}
+        })
+    })
+    template.has_resource_properties("AWS::AutoScaling::ScalingPolicy", {
+        "PolicyType": "TargetTrackingScaling",
+        "EstimatedInstanceWarmup": 30
+    })
+
+
+def test_warm_pool_keeps_the_boot_warmup_for_cold_launches():
+    template = synth_elb_app_stack({"WebAppWarmPool": {"min_size": 2}, "WebAppScalingPolicies": {
+        "cpu": {"target_utilization_percent": 30},
+        "response_time": {"steps": [{"upper": 0.2, "change": -1}, {"lower": 0.5, "change": 1}]}
+    }})
+    template.has_resource_properties("AWS::AutoScaling::ScalingPolicy", {
+        "PolicyType": "StepScaling",
+        "EstimatedInstanceWarmup": 60
+    })
+    template.has_resource_properties("AWS::AutoScaling::AutoScalingGroup", {"HealthCheckGracePeriod": 60})
+    refresh = str(template.find_resources("Custom::AWS"))
+    assert '"InstanceWarmup":60' in refresh and '"CheckpointDelay":60' in refresh
+
+
+
+def test_warm_pool_instances_report_ready_through_a_launch_hook():
+    template = synth_elb_app_stack({"WebAppWarmPool": {"min_size": 2}})
+    group = list(template.find_resources("AWS::AutoScaling::AutoScalingGroup").values())[0]["Properties"]
+    assert group["LifecycleHookSpecificationList"] == [{
+        "LifecycleHookName": "test-launch-hook",
+        "LifecycleTransition": "autoscaling:EC2_INSTANCE_LAUNCHING",
+        "DefaultResult": "ABANDON",
+        "HeartbeatTimeout": 600
+    }]
+    user_data = str(list(template.find_resources("AWS::EC2::LaunchTemplate").values())[0]["Properties"]["LaunchTemplateData"]["UserData"])
+    assert "--lifecycle-hook-name test-launch-hook" in user_data
+    template.has_resource_properties("AWS::IAM::Policy", {
+        "PolicyDocument": {"Statement": assertions.Match.array_with([
+            assertions.Match.object_like({"Action": "autoscaling:CompleteLifecycleAction"})
+        ])}
+    })
+
+def test_no_warm_pool_by_default(template):
+    template.resource_count_is("AWS::AutoScaling::WarmPool", 0)
+    assert "LifecycleHookSpecificationList" not in list(template.find_resources("AWS::AutoScaling::AutoScalingGroup").values())[0]["Properties"]
+
+
+def test_cpu_tracking_is_the_default_scaling_policy(template):
+    template.resource_count_is("AWS::AutoScaling::ScalingPolicy", 1)
+    template.has_resource_properties("AWS::AutoScaling::ScalingPolicy", {
+        "TargetTrackingConfiguration": assertions.Match.object_like({
+            "PredefinedMetricSpecification": {"PredefinedMetricType": "ASGAverageCPUUtilization"},
+            "TargetValue": 30
+        })
+    })
+
+
+def test_scaling_policies_are_selectable():
+    template = synth_elb_app_stack({"WebAppScalingPolicies": {
+        "request_count": {"target_requests_per_minute": 600},
+        "response_time": {"steps": [{"upper": 0.2, "change": -1}, {"lower": 0.5, "change": 2}]},
+        "schedule": [{"cron": {"hour": "7", "minute": "30"}, "min_capacity": 2}],
+        "predictive": {"target_requests_per_target": 600}
+    }})
+    template.has_resource_properties("AWS::AutoScaling::ScalingPolicy", {
+        "TargetTrackingConfiguration": assertions.Match.object_like({
+            "PredefinedMetricSpecification": assertions.Match.object_like({"PredefinedMetricType": "ALBRequestCountPerTarget"}),
+            "TargetValue": 600
+        })
+    })
+    template.has_resource_properties("AWS::AutoScaling::ScalingPolicy", {
+        "PolicyType": "StepScaling",
+        "StepAdjustments": assertions.Match.any_value()
+    })
+    template.has_resource_properties("AWS::CloudWatch::Alarm", {
+        "MetricName": "TargetResponseTime",
+        "ExtendedStatistic": "p90"
+    })
+    template.has_resource_properties("AWS::AutoScaling::ScheduledAction", {
+        "Recurrence": "30 7 * * *",
+        "MinSize": 2
+    })
+    template.has_resource_properties("AWS::AutoScaling::ScalingPolicy", {
+        "PolicyType": "PredictiveScaling",
+        "PredictiveScalingConfiguration": assertions.Match.object_like({"Mode": "ForecastOnly"})
+    })
+
+
+def test_content_bucket_is_readable_by_cloudfront_when_serving_from_s3():
+    template = synth_elb_app_stack({"CloudFrontS3PathPatterns": ["*.css"]})
+    template.has_resource_properties("AWS::S3::Bucket", {
+        "BucketName": "test-webapp-content-123456789012-eu-west-1"
+    })
+    template.has_resource_properties("AWS::S3::BucketPolicy", {
+        "PolicyDocument": {
+            "Statement": assertions.Match.array_with([
+                assertions.Match.object_like({
+                    "Principal": {"Service": "cloudfront.amazonaws.com"},
+                    "Action": "s3:GetObject"
+                })
+            ])
+        }
+    })
+    policy = json.dumps(template.find_resources("AWS::S3::BucketPolicy"))
+    assert "distribution/*" not in policy and "StringEquals" in policy
+    parameters = template.to_json()["Parameters"]
+    assert "/test/cloudfront/distribution-id" in [parameter["Default"] for parameter in parameters.values()]
+
+
+def test_content_changes_are_pushed_to_running_instances(template):
+    template.has_resource_properties("Custom::S3BucketNotifications", {
+        "NotificationConfiguration": {
+            "QueueConfigurations": assertions.Match.array_with([
+                assertions.Match.object_like({"Events": ["s3:ObjectCreated:*"]}),
+                assertions.Match.object_like({"Events": ["s3:ObjectRemoved:*"]})
+            ])
+        }
+    })
+    template.has_resource_properties("AWS::Lambda::EventSourceMapping", {
+        "BatchSize": 100,
+        "MaximumBatchingWindowInSeconds": 10
+    })
+    template.has_resource_properties("AWS::IAM::Policy", {
+        "PolicyDocument": {
+            "Statement": assertions.Match.array_with([
+                assertions.Match.object_like({"Action": "ssm:SendCommand"})
+            ])
+        }
+    })
+
+
+def test_load_balancer_profile(template):
+    template.has_resource_properties("AWS::ElasticLoadBalancingV2::TargetGroup", {
+        "TargetGroupAttributes": assertions.Match.array_with([
+            {"Key": "deregistration_delay.timeout_seconds", "Value": "30"},
+            {"Key": "load_balancing.algorithm.type", "Value": "least_outstanding_requests"}
+        ])
+    })
+    template.has_resource_properties("AWS::ElasticLoadBalancingV2::LoadBalancer", {
+        "LoadBalancerAttributes": assertions.Match.array_with([
+            {"Key": "idle_timeout.timeout_seconds", "Value": "75"},
+            {"Key": "routing.http2.enabled", "Value": "true"}
+        ])
+    })
+    template.has_resource_properties("AWS::ElasticLoadBalancingV2::Listener", {
+        "Port": 443,
+        "SslPolicy": "ELBSecurityPolicy-TLS13-1-2-Res-2021-06"
+    })
+
+
+def test_slow_start_with_round_robin():
+    template = synth_elb_app_stack({"WebAppLoadBalancerProfile": {"algorithm": "ROUND_ROBIN", "slow_start_seconds": 60}})
+    template.has_resource_properties("AWS::ElasticLoadBalancingV2::TargetGroup", {
+        "TargetGroupAttributes": assertions.Match.array_with([
+            {"Key": "slow_start.duration_seconds", "Value": "60"},
+            {"Key": "load_balancing.algorithm.type", "Value": "round_robin"}
+        ])
+    })
+
+
+def test_slow_start_is_rejected_with_least_outstanding_requests():
+    with pytest.raises(ValueError):
+        synth_elb_app_stack({"WebAppLoadBalancerProfile": {"slow_start_seconds": 60}})
+
+
+def test_launch_template_embeds_the_apache_config(template):
+    launch_template = list(template.find_resources("AWS::EC2::LaunchTemplate").values())[0]
+    parts = launch_template["Properties"]["LaunchTemplateData"]["UserData"]["Fn::Base64"]["Fn::Join"][1]
+    user_data = "".join(part for part in parts if isinstance(part, str))
+    assert "/etc/apache2/conf-available/rim-tuning.conf" in user_data
+
+
+def test_latency_routing_with_health_check():
+    template = synth_elb_app_stack(region='eu-central-1', latency_routing=True)
+    template.has_resource_properties("AWS::Route53::RecordSet", {
+        "Name": "test.elb.aws.example.com",
+        "Type": "A",
+        "Region": "eu-central-1",
+        "SetIdentifier": "eu-central-1",
+        "HealthCheckId": assertions.Match.any_value(),
+        "AliasTarget": assertions.Match.object_like({"EvaluateTargetHealth": True})
+    })
+    template.has_resource_properties("AWS::Route53::HealthCheck", {
+        "HealthCheckConfig": assertions.Match.object_like({"Type": "CLOUDWATCH_METRIC"})
+    })
+
+
+def test_mixed_graviton_spot_fleet():
+    template = synth_elb_app_stack({"WebAppMixedInstances": {
+        "instance_types": {"t4g.small": 1, "c7g.medium": 2},
+        "on_demand_base_capacity": 1,
+        "on_demand_percentage_above_base_capacity": 0
+    }})
+    template.has_resource_properties("AWS::AutoScaling::AutoScalingGroup", {
+        "CapacityRebalance": True,
+        "MixedInstancesPolicy": {
+            "InstancesDistribution": {
+                "OnDemandBaseCapacity": 1,
+                "OnDemandPercentageAboveBaseCapacity": 0,
+                "SpotAllocationStrategy": "capacity-optimized"
+            },
+            "LaunchTemplate": assertions.Match.object_like({
+                "Overrides": [
+                    {"InstanceType": "t4g.small", "WeightedCapacity": "1"},
+                    {"InstanceType": "c7g.medium", "WeightedCapacity": "2"}
+                ]
+            })
+        }
+    })
+    template.has_resource_properties("AWS::ImageBuilder::ImageRecipe", {
+        "Name": "test-webapp-recipe-arm64",
+        "ParentImage": "arn:aws:imagebuilder:eu-west-1:aws:image/ubuntu-server-22-lts-arm64/x.x.x"
+    })
+
+
+def test_instance_refresh_keeps_the_instances_distribution():
+    template = synth_elb_app_stack({"WebAppMixedInstances": {"instance_types": {"t4g.small": 1}}})
+    group = list(template.find_resources("AWS::AutoScaling::AutoScalingGroup").values())[0]
+    distribution = group["Properties"]["MixedInstancesPolicy"]["InstancesDistribution"]
+    assert distribution == {"OnDemandBaseCapacity": 1, "OnDemandPercentageAboveBaseCapacity": 0, "SpotAllocationStrategy": "capacity-optimized"}
+    refresh = str(template.find_resources("Custom::AWS"))
+    assert '"InstancesDistribution":{"OnDemandBaseCapacity":1,"OnDemandPercentageAboveBaseCapacity":0,"SpotAllocationStrategy":"capacity-optimized"}' in refresh
+
+
+def test_mixed_architectures_are_rejected():
+    with pytest.raises(ValueError):
+        synth_elb_app_stack({"WebAppMixedInstances": {"instance_types": {"t3a.small": 1, "t4g.small": 1}}})
+
+
+def test_alb_access_logs_are_optional(template):
+    attributes = template.find_resources("AWS::ElasticLoadBalancingV2::LoadBalancer")
+    assert "access_logs.s3.enabled" not in str(attributes)
+
+    logged = synth_elb_app_stack({"AccessLogs": True, "AccessLogsRetentionDays": 7})
+    logged.has_resource_properties("AWS::ElasticLoadBalancingV2::LoadBalancer", {
+        "LoadBalancerAttributes": assertions.Match.array_with([
+            {"Key": "access_logs.s3.enabled", "Value": "true"},
+            {"Key": "access_logs.s3.prefix", "Value": "alb"}
+        ])
+    })
+    logged.has_resource_properties("AWS::S3::Bucket", {
+        "LifecycleConfiguration": {"Rules": [{"ExpirationInDays": 7, "Status": "Enabled"}]}
+    })
+
+
+def test_incremental_asset_deployment():
+    template = synth_elb_app_stack({"AssetDeployment": {"incremental": True, "memory_limit_mib": 512, "ephemeral_storage_mib": 4096}})
+    template.resource_count_is("Custom::CDKBucketDeployment", 0)
+    template.has_resource_properties("Custom::RimIncrementalDeployment", {
+        "DistributionIdParameter": "/test/cloudfront/distribution-id",
+        "DistributionIdParameterRegion": "us-east-1"
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "index.handler",
+        "MemorySize": 512,
+        "EphemeralStorage": {"Size": 4096},
+        "Timeout": 900
+    })
+    template.has_resource_properties("AWS::S3::BucketPolicy", {
+        "PolicyDocument": {"Statement": assertions.Match.array_with([assertions.Match.object_like({
+            "Effect": "Deny",
+            "Action": "s3:GetObject",
+            # AWS Backup and replication still read it
+            "Principal": {"Service": "cloudfront.amazonaws.com"},
+            "Resource": {"Fn::Join": ["", [assertions.Match.any_value(), "/.rim-manifest.json"]]}
+        })])}
+    })
+
+
+def test_efs_is_rejected_for_incremental_deployments():
+    with pytest.raises(ValueError):
+        synth_elb_app_stack({"AssetDeployment": {"incremental": True, "use_efs": True}})
+
+
+def test_web_fleet_in_isolated_subnets():
+    template = synth_elb_app_stack({"WebAppIsolatedSubnets": True})
+    subnets = list(template.find_resources("AWS::AutoScaling::AutoScalingGroup").values())[0]["Properties"]["VPCZoneIdentifier"]
+    assert all("IsolatedSubnet" in subnet["Fn::ImportValue"] for subnet in subnets)
+    with pytest.raises(ValueError):
+        synth_elb_app_stack({"WebAppIsolatedSubnets": True, "WebAppGoldenAmi": False})
+
+
+def test_content_standby_replication():
+    template = synth_elb_app_stack({"WebAppContentStandby": True})
+    template.resource_count_is("AWS::S3::Bucket", 2)
+    template.has_resource_properties("AWS::S3::Bucket", {
+        "ReplicationConfiguration": {
+            "Rules": [assertions.Match.object_like({
+                "Status": "Enabled",
+                "DeleteMarkerReplication": {"Status": "Enabled"},
+                "Destination": assertions.Match.object_like({
+                    "ReplicationTime": {"Status": "Enabled", "Time": {"Minutes": 15}}
+                })
+            })]
+        }
+    })
+
+    template.has_output("*", {"Value": {"Ref": assertions.Match.string_like_regexp("standbybucket")}})
+
+
+def test_content_standby_serves_cloudfront():
+    template = synth_elb_app_stack({"WebAppContentStandby": True, "CloudFrontS3PathPatterns": ["*.css"]})
+    template.has_resource_properties("AWS::S3::Bucket", {"BucketName": "test-webapp-standby-123456789012-eu-west-1"})
+    template.has_resource_properties("AWS::S3::BucketPolicy", {
+        "Bucket": {"Ref": assertions.Match.string_like_regexp("standbybucket")},
+        "PolicyDocument": {"Statement": assertions.Match.array_with([
+            assertions.Match.object_like({"Effect": "Deny", "Resource": assertions.Match.object_like({
+                "Fn::Join": ["", assertions.Match.array_with(["/.rim-manifest.json"])]
+            })}),
+            assertions.Match.object_like({"Effect": "Allow", "Principal": {"Service": "cloudfront.amazonaws.com"}})
+        ])}
+    })
+
+
+def test_asg_replaces_instances_failing_the_health_check(template):
+    template.has_resource_properties("AWS::ElasticLoadBalancingV2::TargetGroup", {
+        "HealthCheckPath": "/healthz",
+        "HealthCheckIntervalSeconds": 10,
+        "UnhealthyThresholdCount": 2
+    })
+    # the grace period follows the golden AMI warmup
+    template.has_resource_properties("AWS::AutoScaling::AutoScalingGroup", {
+        "HealthCheckType": "ELB",
+        "HealthCheckGracePeriod": 60
+    })
+
+
+def test_health_check_is_configurable():
+    template = synth_elb_app_stack({"WebAppHealthCheck": {"path": "/ping", "interval_seconds": 5, "timeout_seconds": 2, "grace_seconds": 90}})
+    template.has_resource_properties("AWS::ElasticLoadBalancingV2::TargetGroup", {
+        "HealthCheckPath": "/ping",
+        "HealthCheckIntervalSeconds": 5,
+        "HealthCheckTimeoutSeconds": 2
+    })
+    template.has_resource_properties("AWS::AutoScaling::AutoScalingGroup", {"HealthCheckGracePeriod": 90})
+    with pytest.raises(ValueError):
+        synth_elb_app_stack({"WebAppHealthCheck": {"interval_seconds": 5}})
+
+
+def test_instance_refresh_keeps_full_capacity(template):
+    refresh = list(template.find_resources("Custom::AWS").values())
+    calls = [resource["Properties"]["Update"] for resource in refresh if "startInstanceRefresh" in str(resource["Properties"]["Update"])]
+    assert len(calls) == 1
+    for fragment in ('"MinHealthyPercentage":100', '"MaxHealthyPercentage":200', '"CheckpointPercentages":[50,100]', '"AutoRollback":true', '"AlarmSpecification"'):
+        assert fragment in str(calls[0])
+    assert "AutoScalingRollingUpdate" not in list(template.find_resources("AWS::AutoScaling::AutoScalingGroup").values())[0]["UpdatePolicy"]
+    # a deployment during a running refresh does not fail
+    assert '"ignoreErrorCodesMatching":"InstanceRefreshInProgress"' in str(calls[0])
+
+
+def test_rolling_update_policy():
+    template = synth_elb_app_stack({"WebAppUpdatePolicy": {"type": "rolling", "min_healthy_percentage": 50, "max_batch_size": 2}})
+    group = list(template.find_resources("AWS::AutoScaling::AutoScalingGroup").values())[0]
+    assert group["UpdatePolicy"]["AutoScalingRollingUpdate"]["MaxBatchSize"] == 2
+    assert group["UpdatePolicy"]["AutoScalingRollingUpdate"]["MinInstancesInService"] == 1
+    assert group["UpdatePolicy"]["AutoScalingRollingUpdate"]["PauseTime"] == "PT1M"
+    assert "startInstanceRefresh" not in str(template.find_resources("Custom::AWS"))
+
+
+@pytest.mark.parametrize("policy", [
+    {"type": "blue_green"},
+    {"min_healthy_percentage": 100, "max_healthy_percentage": 100},
+    {"checkpoint_percentages": [50, 90]},
+    # a rolling update cannot hold the running capacity at peak
+    {"type": "rolling"},
+])
+def test_invalid_update_policies_are_rejected(policy):
+    with pytest.raises(ValueError):
+        synth_elb_app_stack({"WebAppUpdatePolicy": policy})
@@ -0,0 +1,67 @@
+import importlib.util
+
+spec = importlib.util.spec_from_file_location("incremental_deploy", "files/lambda/incremental_deploy/index.py")
+incremental_deploy = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(incremental_deploy)
+
+
+def entry(sha, prune=True, **kwargs):
+    return {"sha256": sha, "cache_control": "public, max-age=60", "prune": prune, **kwargs}
+
+
+OLD = {
+    "index.html": entry("1"),
+    "index.html.br": entry("2", content_type="text/html", content_encoding="br"),
+    "about.html": entry("3"),
+    "css/site.0123456789.css": entry("4", prune=False),
+    "old.html": entry("5"),
+}
+NEW = {
+    "index.html": entry("1b"),
+    "index.html.br": entry("2b", content_type="text/html", content_encoding="br"),
+    "about.html": entry("3"),
+    "css/site.abcdef0123.css": entry("6", prune=False),
+    "contact.html": entry("7"),
+}
+
+
+def test_only_changed_keys_are_uploaded_and_pruned():
+    changed, removed = incremental_deploy.diff(OLD, NEW)
+    assert changed == ["contact.html", "css/site.abcdef0123.css", "index.html", "index.html.br"]
+    # the superseded hashed asset stays for pages still cached with the old reference
+    assert removed == ["old.html"]
+
+
+def test_metadata_change_counts_as_change():
+    changed, _ = incremental_deploy.diff({"a.html": entry("1")}, {"a.html": {**entry("1"), "cache_control": "no-cache"}})
+    assert changed == ["a.html"]
+
+
+def test_first_deployment_uploads_and_invalidates_everything():
+    changed, removed = incremental_deploy.diff({}, NEW)
+    assert changed == sorted(NEW) and removed == []
+    # 404s cached before the first deployment
+    assert incremental_deploy.invalidation_paths(changed, removed) == ["/", "/about.html", "/contact.html", "/css/site.abcdef0123.css", "/index.html"]
+
+
+def test_invalidation_covers_exactly_the_stale_urls():
+    changed, removed = incremental_deploy.diff(OLD, NEW)
+    assert incremental_deploy.invalidation_paths(changed, removed) == ["/", "/contact.html", "/css/site.abcdef0123.css", "/index.html", "/old.html"]
+
+
+def test_directory_indexes_invalidate_the_directory_url():
+    paths = incremental_deploy.invalidation_paths(["docs/index.html", "docs/index.html.gz", "docs/guide.html"], ["blog/index.html"])
+    assert paths == ["/blog/", "/blog/index.html", "/docs/", "/docs/guide.html", "/docs/index.html"]
+
+
+def test_large_changes_fall_back_to_a_wildcard(monkeypatch):
+    monkeypatch.setattr(incremental_deploy, "MAX_INVALIDATION_PATHS", 1)
+    changed, removed = incremental_deploy.diff(OLD, NEW)
+    assert incremental_deploy.invalidation_paths(changed, removed) == ["/*"]
+
+
+def test_put_args_carry_the_metadata():
+    assert incremental_deploy.put_args(NEW["index.html.br"], "index.html.br") == {
+        "CacheControl": "public, max-age=60", "ContentType": "text/html", "ContentEncoding": "br"
+    }
+    assert incremental_deploy.put_args(NEW["about.html"], "about.html")["ContentType"] == "text/html"
@@ -0,0 +1,89 @@
+import gzip
+import json
+import shutil
+
+import pytest
+
+from rim_stacks import log_analyzer
+
+FIXTURES = "tests/unit/fixtures/"
+
+
+def report_of(*file_names, **kwargs):
+    report = log_analyzer.AccessLogReport(**kwargs)
+    for file_name in file_names:
+        log_analyzer.read_file(FIXTURES+file_name, report)
+    return report
+
+
+def test_cloudfront_hit_ratio_per_path():
+    paths = report_of("cloudfront_sample.log").summary()["paths"]
+    assert paths["/index.html"]["requests"] == 4
+    assert paths["/index.html"]["hit_ratio"] == 0.75
+    assert paths["/about.html"]["hit_ratio"] == 0.0
+
+
+def test_top_uncached_urls():
+    summary = report_of("cloudfront_sample.log").summary(top=2)
+    assert summary["top_uncached"][0] == ("/about.html", 3)
+    assert len(summary["top_uncached"]) == 2
+
+
+def test_alb_origin_time_skips_unanswered_requests():
+    paths = report_of("alb_sample.log").summary()["paths"]
+    # the query string is dropped and the -1 record only counts as a request
+    assert paths["/about.html"]["requests"] == 2
+    assert paths["/about.html"]["origin_time_p99"] == pytest.approx(0.25, rel=0.05)
+    assert paths["/about.html"]["hit_ratio"] is None
+    assert paths["/index.html"]["origin_time_p50"] == pytest.approx(0.010, rel=0.05)
+    assert paths["/index.html"]["origin_time_p99"] == pytest.approx(0.030, rel=0.05)
+
+
+def test_alb_time_takes_precedence_over_cloudfront_miss_ttfb():
+    paths = report_of("cloudfront_sample.log", "alb_sample.log").summary()["paths"]
+    assert paths["/about.html"]["requests"] == 3
+    assert paths["/about.html"]["origin_time_p50"] == pytest.approx(0.25, rel=0.05)
+    assert paths["/css/site.css"]["origin_time_p50"] == pytest.approx(0.080, rel=0.05)
+
+
+def test_paths_beyond_max_paths_are_folded():
+    report = report_of("cloudfront_sample.log", max_paths=1)
+    assert set(report.paths) == {"/index.html", log_analyzer.OTHER_PATHS}
+    assert report.paths[log_analyzer.OTHER_PATHS].edge_requests == 5
+
+
+def test_histogram_percentiles_within_growth():
+    histogram = log_analyzer.LogHistogram()
+    for value in range(1, 1001):
+        histogram.add(value/1000)
+    assert histogram.percentile(50) == pytest.approx(0.5, rel=0.05)
+    assert histogram.percentile(99) == pytest.approx(0.99, rel=0.05)
+    assert len(histogram.buckets) < 200
+
+
+def test_space_saving_keeps_heavy_hitters():
+    counter = log_analyzer.SpaceSaving(3)
+    for key in ["a"]*10+["b"]*5+list("cdefgh"):
+        counter.add(key)
+    assert len(counter.counts) == 3
+    assert counter.top(2)[0] == ("a", 10)
+
+
+def test_space_saving_evicts_the_oldest_smallest_counter():
+    counter = log_analyzer.SpaceSaving(3)
+    for key in ["a", "a", "b", "c", "d"]:
+        counter.add(key)
+    # b and c share the minimum, b got there first
+    assert counter.counts == {"a": 2, "c": 1, "d": 2}
+    assert counter.buckets == {2: {"a": None, "d": None}, 1: {"c": None}} and counter.min_count == 1
+    counter.add("c")
+    assert counter.min_count == 2 and counter.buckets == {2: {"a": None, "d": None, "c": None}}
+
+
+def test_main_reads_gzip_directories(tmp_path, capsys):
+    with open(FIXTURES+"cloudfront_sample.log", "rb") as source, gzip.open(tmp_path/"E123.2024-01-01-00.abcd.gz", "wb") as target:
+        shutil.copyfileobj(source, target)
+    assert log_analyzer.main([str(tmp_path), "--json"]) == 0
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["records"] == 9
+    assert summary["top_uncached"][0] == ["/about.html", 3]
@@ -0,0 +1,63 @@
+import json
+import os
+
+import aws_cdk as core
+import pytest
+
+from rim_stacks.lookups import RimLookups
+from rim_stacks.stack_selection import STACK_NAMES, parse_selection
+from rim_stacks.vpc_stack import RimVpcStack
+
+AMI_NAME = "ubuntu/images/hvm-ssd/ubuntu-jammy-22.04-amd64-server-20220420"
+
+
+def stacks(context=None):
+    app = core.App(context=context)
+    return app, [
+        core.Stack(app, "Stack%d"%index, env=core.Environment(account="123456789012", region=region))
+        for index, region in enumerate(["eu-west-1", "eu-west-1", "us-east-1"])
+    ]
+
+
+def missing_providers(app):
+    with open(os.path.join(app.synth().directory, "manifest.json")) as manifest:
+        return sorted(missing["provider"] for missing in json.load(manifest).get("missing", []))
+
+
+def test_hosted_zone_is_looked_up_once_per_app():
+    app, (first, second, us_east) = stacks()
+    for stack in (first, us_east):
+        RimLookups.of(stack).hosted_zone(stack, "zone", "example.com")
+    assert missing_providers(app) == ["hosted-zone"]
+
+
+def test_ami_is_looked_up_once_per_region():
+    app, (first, second, us_east) = stacks()
+    lookups = RimLookups.of(first)
+    assert RimLookups.of(second) is lookups
+    for stack in (first, second, us_east):
+        lookups.machine_image(stack, AMI_NAME)
+    assert sorted(lookups.ami_ids[AMI_NAME]) == ["eu-west-1", "us-east-1"]
+
+
+def test_seeded_context_synthesizes_offline():
+    app, (first, second, us_east) = stacks({
+        "HostedZoneIds": {"example.com": "Z123"},
+        "AmiIds": {AMI_NAME: {"eu-west-1": "ami-1", "us-east-1": "ami-2"}},
+        "AvailabilityZones": {"eu-west-1": ["eu-west-1a", "eu-west-1b"]},
+    })
+    for stack in (first, us_east):
+        zone = RimLookups.of(stack).hosted_zone(stack, "zone", "example.com")
+        image = RimLookups.of(stack).machine_image(stack, AMI_NAME).get_image(stack)
+    assert zone.hosted_zone_id == "Z123"
+    assert image.image_id == "ami-2"
+    RimVpcStack(app, "TestRimVpcStack", env=core.Environment(account="123456789012", region="eu-west-1"), owner="test")
+    assert missing_providers(app) == []
+
+
+def test_stack_selection():
+    assert parse_selection(None) == STACK_NAMES
+    assert parse_selection("cloudfront, elb") == ["elb", "cloudfront"]
+    assert parse_selection(["backup"]) == ["backup"]
+    with pytest.raises(ValueError):
+        parse_selection("elb,cdn")
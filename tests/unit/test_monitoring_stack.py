@@ -0,0 +1,100 @@
+import json
+
+import aws_cdk as core
+import aws_cdk.assertions as assertions
+import pytest
+
+from rim_stacks.vpc_stack import RimVpcStack
+from rim_stacks.elb_app_stack import RimElbAppStack
+from rim_stacks.monitoring_stack import RimMonitoringStack
+
+
+def synth_monitoring_stack(context=None):
+    app = core.App(context=context)
+    env = core.Environment(account='123456789012', region='eu-west-1')
+    vpc_stack = RimVpcStack(app, "TestRimVpcStack",
+        env=env,
+        owner='test'
+    )
+    elb_app_stack = RimElbAppStack(app, "TestRimElbAppStack",
+        env=env,
+        owner='test',
+        vpc=vpc_stack.vpc,
+        web_srv_sec_grp=vpc_stack.web_srv_sec_grp,
+        alb_sec_grp=vpc_stack.alb_sec_grp,
+        webapp_token='token',
+        rim_hosted_zone_name='example.com'
+    )
+    stack = RimMonitoringStack(app, "TestRimMonitoringStack",
+        env=env,
+        owner='test',
+        alb=elb_app_stack.alb,
+        asg=elb_app_stack.asg,
+        email='test@example.com'
+    )
+    return assertions.Template.from_stack(stack)
+
+
+@pytest.fixture(scope="module")
+def template():
+    return synth_monitoring_stack()
+
+
+def dashboard_body(template):
+    dashboard = list(template.find_resources("AWS::CloudWatch::Dashboard").values())[0]
+    return json.dumps(dashboard["Properties"]["DashboardBody"])
+
+
+def test_distribution_id_is_resolved_on_every_deployment(template):
+    parameters = template.find_parameters("*", {"Type": "AWS::SSM::Parameter::Value<String>"})
+    assert "/test/cloudfront/distribution-id" in [parameter["Default"] for parameter in parameters.values()]
+    template.resource_count_is("Custom::AWS", 0)
+
+
+def test_dashboard_graphs_cloudfront_edge_metrics(template):
+    body = dashboard_body(template)
+    for metric_name in ["CacheHitRate", "OriginLatency", "4xxErrorRate", "5xxErrorRate", "BytesDownloaded"]:
+        assert metric_name in body
+    assert '\\"region\\":\\"us-east-1\\"' in body
+
+
+def test_dashboard_graphs_alb_latency_percentiles_and_rates(template):
+    body = dashboard_body(template)
+    assert "TargetResponseTime" in body
+    for statistic in ["p50", "p90", "p99"]:
+        assert '\\"stat\\":\\"%s\\"'%statistic in body
+    assert "requests / hosts" in body
+    assert "100 * (FILL(target5xx, 0) + FILL(elb5xx, 0)) / requests" in body
+
+
+def test_static_cpu_alarm_is_replaced_by_latency_slo_alarms(template):
+    assert not template.find_resources("AWS::CloudWatch::Alarm", {"Properties": {"MetricName": "CPUUtilization"}})
+    template.has_resource_properties("AWS::CloudWatch::Alarm", {
+        "ComparisonOperator": "GreaterThanUpperThreshold",
+        "ThresholdMetricId": "band",
+        "AlarmActions": [assertions.Match.object_like({"Ref": assertions.Match.string_like_regexp("testCdnTopic")})]
+    })
+    template.has_resource_properties("AWS::CloudWatch::Alarm", {
+        "ExtendedStatistic": "PR(:0.5)",
+        "Period": 3600,
+        "Threshold": 85.6
+    })
+    template.has_resource_properties("AWS::CloudWatch::Alarm", {
+        "ExtendedStatistic": "PR(:0.5)",
+        "Period": 300,
+        "Threshold": 85.6
+    })
+    template.resource_count_is("AWS::CloudWatch::CompositeAlarm", 2)
+    template.has_resource_properties("AWS::CloudWatch::CompositeAlarm", {
+        "AlarmActions": [assertions.Match.object_like({"Ref": assertions.Match.string_like_regexp("testCdnTopic")})]
+    })
+
+
+def test_burn_rate_pairs_may_share_a_window():
+    template = synth_monitoring_stack({"WebAppLatencySlo": {"burn_rate_windows": [
+        {"long_minutes": 60, "short_minutes": 5, "burn_rate": 14.4},
+        {"long_minutes": 360, "short_minutes": 60, "burn_rate": 6}
+    ]}})
+    hourly = template.find_resources("AWS::CloudWatch::Alarm", {"Properties": {"Period": 3600}})
+    assert sorted(alarm["Properties"]["Threshold"] for alarm in hourly.values()) == [85.6, 94]
+    template.resource_count_is("AWS::CloudWatch::CompositeAlarm", 2)
@@ -0,0 +1,63 @@
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from rim_stacks.cloudfront_stack import DEFAULT_URL_NORMALIZATION, render_url_normalization
+
+pytestmark = pytest.mark.skipif(shutil.which("node") is None, reason="node is needed to run the CloudFront Function")
+
+RUNNER = """
+var fs = require('fs');
+eval(fs.readFileSync(process.argv[1], 'utf8'));
+var cases = JSON.parse(fs.readFileSync(process.argv[2], 'utf8'));
+console.log(JSON.stringify(cases.map(function (request) {
+    var result = handler({request: request});
+    return {uri: result.uri, querystring: Object.keys(result.querystring)};
+})));
+"""
+
+
+def qs(*names):
+    return {name: {"value": "1"} for name in names}
+
+
+# uri, query string names in arrival order -> expected uri, expected query string names in order
+CASES = [
+    ("/", [], "/index.html", []),
+    ("/index.html", [], "/index.html", []),
+    ("/docs/", [], "/docs/index.html", []),
+    ("/docs/index.html", [], "/docs/index.html", []),
+    ("/docs", [], "/docs", []),
+    ("/About.HTML", [], "/about.html", []),
+    ("//css///site.abc.css", [], "/css/site.abc.css", []),
+    ("/search", ["q", "lang"], "/search", ["lang", "q"]),
+    ("/search", ["lang", "q"], "/search", ["lang", "q"]),
+    ("/", ["utm_source", "utm_medium", "fbclid", "page"], "/index.html", ["page"]),
+    ("/", ["UTM_Campaign", "gclid", "msclkid"], "/index.html", []),
+    ("/", ["utm", "page_utm_source"], "/index.html", ["page_utm_source", "utm"]),
+]
+
+
+def run(tmp_path, config, cases):
+    function_file = tmp_path/"function.js"
+    function_file.write_text(render_url_normalization(config))
+    cases_file = tmp_path/"cases.json"
+    cases_file.write_text(json.dumps([{"uri": uri, "querystring": qs(*names), "headers": {}} for uri, names in cases]))
+    output = subprocess.run(["node", "-e", RUNNER, str(function_file), str(cases_file)], check=True, capture_output=True, text=True).stdout
+    return [(result["uri"], result["querystring"]) for result in json.loads(output)]
+
+
+def test_normalization_rules(tmp_path):
+    results = run(tmp_path, DEFAULT_URL_NORMALIZATION, [(uri, names) for uri, names, _, _ in CASES])
+    assert results == [(uri, names) for _, _, uri, names in CASES]
+
+
+def test_rules_are_configurable(tmp_path):
+    config = {**DEFAULT_URL_NORMALIZATION, "lowercase_paths": False, "directory_index": "default.htm", "strip_query_params": ["ref"]}
+    assert run(tmp_path, config, [("/Docs/", ["utm_source", "ref"])]) == [("/Docs/default.htm", ["utm_source"])]
+
+
+def test_function_fits_the_cloudfront_size_limit():
+    assert len(render_url_normalization(DEFAULT_URL_NORMALIZATION).encode("utf-8")) < 10*1024
@@ -0,0 +1,31 @@
+import datetime
+import importlib.util
+
+spec = importlib.util.spec_from_file_location("restore_metrics", "files/lambda/restore_metrics/index.py")
+restore_metrics = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(restore_metrics)
+
+
+def restore_job(**kwargs):
+    created = datetime.datetime(2024, 5, 5, 2, 30, tzinfo=datetime.timezone.utc)
+    return {
+        'RestoreJobId': 'job',
+        'Status': 'COMPLETED',
+        'ResourceType': 'S3',
+        'BackupSizeInBytes': 2048,
+        'CreationDate': created,
+        'CompletionDate': created+datetime.timedelta(minutes=42, seconds=5),
+        **kwargs
+    }
+
+
+def test_restore_duration():
+    assert restore_metrics.restore_duration(restore_job()) == 42*60+5
+
+
+def test_metrics_are_dimensioned_by_resource_type():
+    data = {metric['MetricName']: metric for metric in restore_metrics.metric_data(restore_job(ResourceType='EC2'))}
+    assert data['RestoreDuration']['Value'] == 42*60+5
+    assert data['RestoreDuration']['Unit'] == 'Seconds'
+    assert data['RestoreDuration']['Dimensions'] == [{'Name': 'ResourceType', 'Value': 'EC2'}]
+    assert data['RestoredBytes']['Value'] == 2048
@@ -0,0 +1,187 @@
+"""Synth benchmark and regression suite for every Rim*Stack.
+
+Each stack is built in a fresh app with pre-seeded lookups, so the suite runs
+offline. Template size and resource counts are compared with
+``fixtures/synth_baseline.json``; after an intended change refresh it with::
+
+    UPDATE_SYNTH_BASELINE=1 python -m pytest tests/unit/test_synth_benchmark.py
+
+Wall time depends on the box and is only reported, ``CHECK_SYNTH_TIME=1``
+also fails stacks that synthesize much slower than the baseline.
+"""
+import collections
+import json
+import os
+import time
+
+import aws_cdk as core
+import pytest
+
+from rim_stacks.vpc_stack import RimVpcStack
+from rim_stacks.elb_app_stack import RimElbAppStack
+from rim_stacks.bastion_stack import RimBastionStack
+from rim_stacks.cloudfront_stack import RimCloudFrontStack
+from rim_stacks.monitoring_stack import RimMonitoringStack
+from rim_stacks.backup_stack import RimBackupStack
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "fixtures", "synth_baseline.json")
+CDK_JSON = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "cdk.json")
+UPDATE_BASELINE = os.getenv("UPDATE_SYNTH_BASELINE") == "1"
+CHECK_SYNTH_TIME = os.getenv("CHECK_SYNTH_TIME") == "1"
+# only a large slowdown fails the opt-in check
+SYNTH_TIME_TOLERANCE = float(os.getenv("SYNTH_TIME_TOLERANCE", "3"))
+TEMPLATE_SIZE_TOLERANCE = 1.1
+
+STACKS = ["vpc", "elb", "bastion", "cloudfront", "monitoring", "backup"]
+
+ACCOUNT = "123456789012"
+REGION = "eu-west-1"
+AMI_NAME = "ubuntu/images/hvm-ssd/ubuntu-jammy-22.04-amd64-server-20220420"
+CONTEXT = {
+    "Creator": "benchmark",
+    "Project": "benchmark",
+    "HostedZoneIds": {"example.com": "Z0000000000000"},
+    "AmiIds": {AMI_NAME: {REGION: "ami-00000000000000000"}},
+    "AvailabilityZones": {REGION: ["eu-west-1a", "eu-west-1b"]},
+}
+
+
+def build(app, name):
+    """Builds stack ``name`` and what it needs, the same way app.py does."""
+    env = core.Environment(account=ACCOUNT, region=REGION)
+    vpc = RimVpcStack(app, "TestRimVpcStack", env=env, owner="test")
+    if name == "vpc":
+        return vpc
+    if name == "cloudfront":
+        return RimCloudFrontStack(app, "TestRimCloudFrontStack",
+            env=core.Environment(account=ACCOUNT, region="us-east-1"),
+            owner="test", webapp_token="token", rim_hosted_zone_name="example.com", origin_region=REGION
+        )
+    if name in ("bastion", "backup"):
+        bastion = RimBastionStack(app, "TestRimBastionStack", env=env, owner="test", vpc=vpc.vpc, bastion_sec_grp=vpc.bastion_sec_grp)
+        if name == "bastion":
+            return bastion
+    elb = RimElbAppStack(app, "TestRimElbAppStack", env=env, owner="test", vpc=vpc.vpc,
+        web_srv_sec_grp=vpc.web_srv_sec_grp, alb_sec_grp=vpc.alb_sec_grp,
+        webapp_token="token", rim_hosted_zone_name="example.com"
+    )
+    if name == "elb":
+        return elb
+    if name == "monitoring":
+        return RimMonitoringStack(app, "TestRimMonitoringStack", env=env, owner="test", alb=elb.alb, asg=elb.asg, email="ops@example.com")
+    return RimBackupStack(app, "TestRimBackupStack", env=env, owner="test", bastion_host=bastion.bastion_host, bucket=elb.bucket)
+
+
+def synth(name, context=CONTEXT):
+    started = time.perf_counter()
+    app = core.App(context=context)
+    stack = build(app, name)
+    assembly = app.synth()
+    synth_seconds = time.perf_counter()-started
+    with open(os.path.join(assembly.directory, stack.template_file)) as template_file:
+        template_body = template_file.read()
+    with open(os.path.join(assembly.directory, "manifest.json")) as manifest:
+        missing = json.load(manifest).get("missing", [])
+    return {
+        "synth_seconds": round(synth_seconds, 3),
+        "template_bytes": len(template_body),
+        "resources": dict(sorted(collections.Counter(
+            resource["Type"] for resource in json.loads(template_body)["Resources"].values()
+        ).items())),
+        "missing_context": [item["key"] for item in missing],
+    }, json.loads(template_body)
+
+
+@pytest.fixture(scope="module")
+def results():
+    # the first app pays for starting the jsii runtime
+    core.App()
+    results = {name: synth(name) for name in STACKS}
+    if UPDATE_BASELINE:
+        with open(BASELINE_FILE, "w") as baseline_file:
+            json.dump({name: measured for name, (measured, _) in results.items()}, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+    return results
+
+
+@pytest.fixture(scope="module")
+def baseline():
+    with open(BASELINE_FILE) as baseline_file:
+        return json.load(baseline_file)
+
+
+@pytest.mark.parametrize("name", STACKS)
+def test_synth_is_offline(results, name):
+    assert results[name][0]["missing_context"] == []
+
+
+@pytest.mark.parametrize("name", STACKS)
+def test_resource_counts_match_baseline(results, baseline, name, record_property):
+    measured = results[name][0]
+    for key, value in measured.items():
+        record_property(key, value)
+    assert measured["resources"] == baseline[name]["resources"]
+
+
+@pytest.mark.parametrize("name", STACKS)
+def test_template_size_within_baseline(results, baseline, name):
+    assert results[name][0]["template_bytes"] <= baseline[name]["template_bytes"]*TEMPLATE_SIZE_TOLERANCE
+
+
+@pytest.mark.parametrize("name", STACKS)
+def test_synth_time_within_baseline(results, baseline, name, record_property):
+    record_property("baseline_synth_seconds", baseline[name]["synth_seconds"])
+    if not CHECK_SYNTH_TIME:
+        pytest.skip("synth time is only reported, set CHECK_SYNTH_TIME=1 to compare it")
+    # at least a second of headroom, tiny stacks are dominated by noise
+    allowed = max(baseline[name]["synth_seconds"]*SYNTH_TIME_TOLERANCE, baseline[name]["synth_seconds"]+1)
+    assert results[name][0]["synth_seconds"] <= allowed
+
+
+def resources(template, resource_type):
+    return [resource["Properties"] for resource in template["Resources"].values() if resource["Type"] == resource_type]
+
+
+def test_cloudfront_compresses_and_caches(results):
+    template = results["cloudfront"][1]
+    ttls = {}
+    for policy in resources(template, "AWS::CloudFront::CachePolicy"):
+        config = policy["CachePolicyConfig"]
+        assert config["ParametersInCacheKeyAndForwardedToOrigin"]["EnableAcceptEncodingGzip"]
+        assert config["ParametersInCacheKeyAndForwardedToOrigin"]["EnableAcceptEncodingBrotli"]
+        ttls[config["Name"]] = config["DefaultTTL"]
+    assert sorted(ttls.values()) == [60, 365*24*3600]
+    distribution = resources(template, "AWS::CloudFront::Distribution")[0]["DistributionConfig"]
+    behaviors = [distribution["DefaultCacheBehavior"]]+distribution["CacheBehaviors"]
+    assert all(behavior["Compress"] for behavior in behaviors)
+
+
+def test_web_fleet_warmup_and_scaling(results):
+    template = results["elb"][1]
+    policies = resources(template, "AWS::AutoScaling::ScalingPolicy")
+    assert {policy["PolicyType"] for policy in policies} == {"TargetTrackingScaling"}
+    assert all(policy["EstimatedInstanceWarmup"] == 60 for policy in policies)
+    target_group = resources(template, "AWS::ElasticLoadBalancingV2::TargetGroup")[0]
+    attributes = {attribute["Key"]: attribute["Value"] for attribute in target_group["TargetGroupAttributes"]}
+    assert attributes["load_balancing.algorithm.type"] == "least_outstanding_requests"
+    assert int(attributes["deregistration_delay.timeout_seconds"]) <= 30
+
+
+def test_cdk_json_scaling_policies_synthesize():
+    # the deployed configuration, on top of the offline lookups
+    with open(CDK_JSON) as cdk_json:
+        context = {**json.load(cdk_json)["context"], **CONTEXT}
+    measured, template = synth("elb", context)
+    assert measured["missing_context"] == []
+    policies = resources(template, "AWS::AutoScaling::ScalingPolicy")
+    assert sorted(policy["PolicyType"] for policy in policies) == ["PredictiveScaling", "StepScaling", "StepScaling", "TargetTrackingScaling", "TargetTrackingScaling"]
+    predictive = [policy for policy in policies if policy["PolicyType"] == "PredictiveScaling"][0]
+    assert predictive["PredictiveScalingConfiguration"]["Mode"] == "ForecastOnly"
+    step_metrics = [alarm["ExtendedStatistic"] for alarm in resources(template, "AWS::CloudWatch::Alarm") if alarm.get("MetricName") == "TargetResponseTime"]
+    assert step_metrics and set(step_metrics) == {"p90"}
+
+
+def test_monitoring_has_latency_alarms(results):
+    template = results["monitoring"][1]
+    assert resources(template, "AWS::CloudWatch::CompositeAlarm")
+    assert resources(template, "AWS::CloudWatch::Dashboard")
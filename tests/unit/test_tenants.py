@@ -0,0 +1,82 @@
+import glob
+import json
+import os
+
+import pytest
+
+from rim_stacks.asset_build import built_files
+from rim_stacks.tenants import Tenant, base_context, load_tenants, synth_tenants
+
+AMI_NAME = "ubuntu/images/hvm-ssd/ubuntu-jammy-22.04-amd64-server-20220420"
+CONTEXT = {
+    "Creator": "test",
+    "Project": "test",
+    "HostedZoneIds": {"example.com": "Z0000000000000"},
+    "AmiIds": {AMI_NAME: {"eu-west-1": "ami-00000000000000000", "eu-central-1": "ami-00000000000000001"}},
+    "AvailabilityZones": {"eu-west-1": ["eu-west-1a", "eu-west-1b"], "eu-central-1": ["eu-central-1a", "eu-central-1b"]},
+}
+
+
+def write_tenants(tmp_path, tenants):
+    tenants_file = tmp_path/"tenants.json"
+    tenants_file.write_text(json.dumps(tenants))
+    return str(tenants_file)
+
+
+def test_tenants_are_typed(tmp_path):
+    tenants = load_tenants(write_tenants(tmp_path, [
+        {"owner": "alpha", "hosted_zone_name": "example.com", "region": "eu-west-1", "email": "alpha@example.com"},
+        {"owner": "beta", "hosted_zone_name": "example.com", "region": "eu-central-1", "max_capacity": 8},
+    ]))
+    assert tenants[0] == Tenant("alpha", "example.com", "eu-west-1", email="alpha@example.com")
+    assert tenants[1].max_capacity == 8
+    assert tenants[1].app_context({"Creator": "test"})["WebAppMaxCapacity"] == 8
+
+
+@pytest.mark.parametrize("values", [
+    {"owner": "alpha", "hosted_zone_name": "example.com"},
+    {"owner": "alpha", "hosted_zone_name": "example.com", "region": "eu-west-1", "zone": "example.com"},
+    {"owner": "alpha", "hosted_zone_name": "example.com", "region": "eu-west-1", "max_capacity": "4"},
+    {"owner": "alpha", "hosted_zone_name": "example.com", "region": "eu-west-1", "min_capacity": True},
+    {"owner": "alpha", "hosted_zone_name": "example.com", "region": "eu-west-1", "min_capacity": 5},
+])
+def test_invalid_tenants_are_rejected(values):
+    with pytest.raises(ValueError):
+        Tenant.from_dict(values)
+
+
+def test_duplicate_tenants_are_rejected(tmp_path):
+    tenant = {"owner": "alpha", "hosted_zone_name": "example.com", "region": "eu-west-1"}
+    with pytest.raises(ValueError):
+        load_tenants(write_tenants(tmp_path, [tenant, tenant]))
+
+
+def test_base_context_prefers_cached_lookups(tmp_path):
+    (tmp_path/"cdk.json").write_text(json.dumps({"app": "python3 app.py", "context": {"Creator": "a", "HostedZoneIds": {}}}))
+    (tmp_path/"cdk.context.json").write_text(json.dumps({"HostedZoneIds": {"example.com": "Z1"}}))
+    assert base_context(str(tmp_path)) == {"Creator": "a", "HostedZoneIds": {"example.com": "Z1"}}
+
+
+def test_every_tenant_gets_its_own_assembly(tmp_path, monkeypatch):
+    monkeypatch.setenv("WEBAPP_TOKEN", "token")
+    tenants = [
+        Tenant("alpha", "example.com", "eu-west-1", account="123456789012"),
+        Tenant("beta", "example.com", "eu-central-1", account="123456789012", max_capacity=8),
+    ]
+    results = synth_tenants(tenants, CONTEXT, str(tmp_path), jobs=2, selection="elb")
+    assert [(owner, stack_names) for owner, stack_names, _ in results] == [
+        ("alpha", ["AlphaRimElbAppStack", "AlphaRimVpcStack"]),
+        ("beta", ["BetaRimElbAppStack", "BetaRimVpcStack"]),
+    ]
+    with open(os.path.join(str(tmp_path), "beta", "BetaRimElbAppStack.template.json")) as template_file:
+        groups = [resource for resource in json.load(template_file)["Resources"].values() if resource["Type"] == "AWS::AutoScaling::AutoScalingGroup"]
+    assert groups[0]["Properties"]["MaxSize"] == "8"
+    # the content is built into each assembly, parallel synths never share a build directory
+    for owner in ("alpha", "beta"):
+        asset_dirs = glob.glob(os.path.join(str(tmp_path), owner, "rim-assets", "s3-*"))
+        assert len(asset_dirs) == 1
+        built = built_files(asset_dirs[0])
+        for file_name in os.listdir("files/s3"):
+            assert file_name in built
+            with open(os.path.join("files/s3", file_name), "rb") as source, open(os.path.join(asset_dirs[0], file_name), "rb") as copy:
+                assert source.read() == copy.read()
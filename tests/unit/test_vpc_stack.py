@@ -0,0 +1,45 @@
+import aws_cdk as core
+import aws_cdk.assertions as assertions
+
+from rim_stacks.vpc_stack import RimVpcStack
+
+
+def synth_vpc_stack(context=None):
+    app = core.App(context=context)
+    stack = RimVpcStack(app, "TestRimVpcStack",
+        env=core.Environment(account='123456789012', region='eu-west-1'),
+        owner='test'
+    )
+    return assertions.Template.from_stack(stack)
+
+
+def web_ingress(template):
+    groups = template.find_resources("AWS::EC2::SecurityGroup")
+    web = [logical_id for logical_id, group in groups.items() if logical_id.startswith("testwebappsg")][0]
+    inline = groups[web]["Properties"].get("SecurityGroupIngress", [])
+    standalone = [
+        ingress["Properties"] for ingress in template.find_resources("AWS::EC2::SecurityGroupIngress").values()
+        if ingress["Properties"]["GroupId"]["Fn::GetAtt"][0] == web
+    ]
+    return inline+standalone
+
+
+def test_no_endpoints_by_default():
+    template = synth_vpc_stack()
+    template.resource_count_is("AWS::EC2::VPCEndpoint", 0)
+    assert {ingress.get("CidrIp") for ingress in web_ingress(template)} == {"0.0.0.0/0"}
+
+
+def test_s3_gateway_and_ssm_interface_endpoints():
+    template = synth_vpc_stack({"VpcEndpoints": True})
+    template.has_resource_properties("AWS::EC2::VPCEndpoint", {"VpcEndpointType": "Gateway"})
+    interface = template.find_resources("AWS::EC2::VPCEndpoint", {"Properties": {"VpcEndpointType": "Interface", "PrivateDnsEnabled": True}})
+    assert len(interface) == 3
+
+
+def test_isolated_web_fleet_only_accepts_alb_and_bastion_traffic():
+    template = synth_vpc_stack({"WebAppIsolatedSubnets": True})
+    template.resource_count_is("AWS::EC2::VPCEndpoint", 4)
+    ingress = web_ingress(template)
+    assert all("CidrIp" not in rule for rule in ingress)
+    assert sorted(rule["FromPort"] for rule in ingress) == [22, 80]
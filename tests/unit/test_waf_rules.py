@@ -0,0 +1,56 @@
+import re
+
+import pytest
+
+from rim_stacks.waf_rules import DEFAULT_WAF_RULES, build_waf_rules, path_match, scope_down
+
+STATIC = ['*.css', '*.js', '*.png']
+
+
+def test_path_patterns_become_byte_matches():
+    assert path_match('*.css')[0].byte_match_statement.positional_constraint == 'ENDS_WITH'
+    statement, wcu = path_match('static/*')
+    assert (statement.byte_match_statement.positional_constraint, statement.byte_match_statement.search_string, wcu) == ('STARTS_WITH', '/static/', 2)
+    assert path_match('*map*')[1] == 10
+    assert path_match('/robots.txt')[0].byte_match_statement.positional_constraint == 'EXACTLY'
+
+
+def test_inner_wildcards_become_regex_matches():
+    statement, wcu = path_match('/static/*.css')
+    assert statement.byte_match_statement is None and wcu == 3
+    regex = statement.regex_match_statement.regex_string
+    assert regex == r'^/static/.*\.css$'
+    assert re.match(regex, '/static/css/site.css') and not re.match(regex, '/static/site.js')
+    regex = path_match('img/logo-?.png')[0].regex_match_statement.regex_string
+    assert re.match(regex, '/img/logo-1.png') and not re.match(regex, '/img/logo-12.png')
+
+
+def test_scopes():
+    assert scope_down('all', STATIC) == (None, 0)
+    static, wcu = scope_down('static', STATIC)
+    assert len(static.or_statement.statements) == 3 and wcu == 6
+    dynamic, wcu = scope_down('dynamic', STATIC)
+    assert dynamic.not_statement.statement.or_statement is not None and wcu == 6
+    with pytest.raises(ValueError):
+        scope_down('api', STATIC)
+
+
+def test_default_rules_and_capacity():
+    rules, wcu = build_waf_rules('test', DEFAULT_WAF_RULES, STATIC)
+    assert [rule.name for rule in rules] == ['test-waf-acl-rate-static', 'test-waf-acl-rate-dynamic', 'test-waf-acl-bot-rule', 'test-waf-acl-aws-common-rule']
+    assert [rule.priority for rule in rules] == [0, 1, 2, 3]
+    # two tiered rate limits, bot control scoped to pages, common rules everywhere
+    assert wcu == (2+6)+(2+6)+(50+6)+700
+    assert rules[2].statement.managed_rule_group_statement.scope_down_statement.not_statement is not None
+    assert rules[3].statement.managed_rule_group_statement.scope_down_statement is None
+
+
+def test_capacity_is_asserted():
+    config = {**DEFAULT_WAF_RULES, "managed_rule_groups": DEFAULT_WAF_RULES["managed_rule_groups"]+[
+        {"name": "AWSManagedRulesKnownBadInputsRuleSet"}, {"name": "AWSManagedRulesSQLiRuleSet"},
+        {"name": "AWSManagedRulesLinuxRuleSet"}, {"name": "VendorRuleSet", "vendor_name": "Vendor", "wcu": 200}
+    ]}
+    with pytest.raises(ValueError, match="1500"):
+        build_waf_rules('test', config, STATIC)
+    with pytest.raises(ValueError, match="unknown"):
+        build_waf_rules('test', {**DEFAULT_WAF_RULES, "managed_rule_groups": [{"name": "VendorRuleSet"}]}, STATIC)